@@ -7,7 +7,7 @@ from . import read_config, get_logger, create_engine, constants, models
 from . import provinces, departments, municipalities
 from . import settlements, localities, census_localities
 from . import streets, intersections, street_blocks
-from . import synonyms, excluding_terms
+from . import synonyms, excluding_terms, tiles, publish
 
 PROCESSES = [
     constants.PROVINCES,
@@ -20,7 +20,15 @@ PROCESSES = [
     constants.INTERSECTIONS,
     constants.STREET_BLOCKS,
     constants.SYNONYMS,
-    constants.EXCLUDING_TERMS
+    constants.EXCLUDING_TERMS,
+    constants.VECTOR_TILES,
+    constants.PUBLISH
+]
+
+# Procesos que no se ejecutan al ejecutar todos los procesos (sin '-p'), a
+# menos que se los incluya en 'optional_processes' (configuración).
+OPTIONAL_PROCESSES = [
+    constants.VECTOR_TILES
 ]
 
 MODULES = [
@@ -34,7 +42,9 @@ MODULES = [
     intersections,
     street_blocks,
     synonyms,
-    excluding_terms
+    excluding_terms,
+    tiles,
+    publish
 ]
 
 COMMANDS = [
@@ -75,11 +85,29 @@ def etl(enabled_processes, start, end, no_mail, ctx):
 
     processes = [module.create_process(ctx.config) for module in MODULES]
 
+    if not enabled_processes:
+        optional_processes = [
+            name.strip() for name in
+            ctx.config.get('etl', 'optional_processes').split(',')
+        ]
+        enabled_processes = [
+            name for name in PROCESSES
+            if name not in OPTIONAL_PROCESSES or name in optional_processes
+        ]
+
+    failed = False
     for process in processes:
-        if not enabled_processes or process.name in enabled_processes:
+        if process.name in enabled_processes:
+            if process.name == constants.PUBLISH and failed:
+                # No publicar una versión con archivos de salida parciales.
+                ctx.report.warn('Ocurrieron errores en procesos anteriores, '
+                                'no se publicarán los archivos de salida.')
+                continue
+
             try:
                 process.run(ctx, start, end)
             except ProcessException:
+                failed = True
                 ctx.report.exception(
                     'Ocurrió un error durante la ejecución del proceso:')
                 ctx.report.info('Continuando...')
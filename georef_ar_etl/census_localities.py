@@ -4,6 +4,8 @@ from .models import Province, Department, Municipality, CensusLocality
 from . import extractors, transformers, loaders, geometry, utils, constants
 from . import patch
 
+CENSUS_LOCALITIES_EXTRACTION_STEP_NAME = 'census_localities_extraction'
+
 
 def create_process(config):
     output_path = config.get('etl', 'output_dest_path')
@@ -51,16 +53,13 @@ def create_process(config):
         utils.ValidateTableSizeStep(
             target_size=config.getint('etl', 'census_localities_target_size'),
             op='ge'),
-        CompositeStep([
-            loaders.CreateJSONFileStep(CensusLocality, constants.ETL_VERSION,
-                                       file_basename + '.json'),
-            loaders.CreateGeoJSONFileStep(CensusLocality,
-                                          constants.ETL_VERSION,
-                                          file_basename + '.geojson'),
-            loaders.CreateCSVFileStep(CensusLocality, constants.ETL_VERSION,
-                                      file_basename + '.csv'),
-            loaders.CreateNDJSONFileStep(CensusLocality, constants.ETL_VERSION,
-                                         file_basename + '.ndjson')
+        loaders.CreateOutputFilesStep(CensusLocality, [
+            loaders.JSONSink(constants.ETL_VERSION, file_basename + '.json'),
+            loaders.GeoJSONSink(constants.ETL_VERSION,
+                                file_basename + '.geojson'),
+            loaders.CSVSink(constants.ETL_VERSION, file_basename + '.csv'),
+            loaders.NDJSONSink(constants.ETL_VERSION,
+                               file_basename + '.ndjson')
         ]),
         CompositeStep([
             utils.CopyFileStep(output_path, file_basename + '.json'),
@@ -68,13 +67,15 @@ def create_process(config):
             utils.CopyFileStep(output_path, file_basename + '.csv'),
             utils.CopyFileStep(output_path, file_basename + '.ndjson')
         ])
-    ])
+    ] + loaders.optional_output_steps(
+        config, CensusLocality, file_basename,
+        extraction_step_name=CENSUS_LOCALITIES_EXTRACTION_STEP_NAME))
 
 
 class CensusLocalitiesExtractionStep(transformers.EntitiesExtractionStep):
     def __init__(self):
-        super().__init__('census_localities_extraction', CensusLocality,
-                         entity_class_pkey='id',
+        super().__init__(CENSUS_LOCALITIES_EXTRACTION_STEP_NAME,
+                         CensusLocality, entity_class_pkey='id',
                          tmp_entity_class_pkey='link')
 
     def _patch_tmp_entities(self, tmp_census_localities, ctx):
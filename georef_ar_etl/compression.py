@@ -0,0 +1,153 @@
+"""Módulo 'compression' de georef-ar-etl.
+
+Define funciones y clases utilizadas para generar versiones comprimidas (gzip
+o zstd) de los archivos de salida del ETL, a medida que los mismos son
+escritos.
+
+"""
+
+import io
+import os
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+
+
+def compression_formats(config):
+    """Retorna los formatos de compresión configurados que se encuentran
+    disponibles.
+
+    Args:
+        config (configparser.ConfigParser): Configuración del ETL.
+
+    Raises:
+        ValueError: Si alguno de los formatos configurados no existe.
+
+    Returns:
+        list: Lista de formatos (claves de COMPRESSION_EXTENSIONS).
+
+    """
+    formats = [
+        fmt.strip()
+        for fmt in config.get('etl', 'output_compression').split(',')
+        if fmt.strip()
+    ]
+
+    for fmt in formats:
+        if fmt not in COMPRESSION_EXTENSIONS:
+            raise ValueError('Invalid compression format: {}.'.format(fmt))
+
+    if zstandard is None and 'zstd' in formats:
+        formats.remove('zstd')
+
+    return formats
+
+
+def compressed_filenames(filename):
+    """Retorna las rutas de todas las versiones comprimidas posibles de un
+    archivo.
+
+    Args:
+        filename (str): Ruta del archivo sin comprimir.
+
+    Returns:
+        list: Rutas de los archivos comprimidos.
+
+    """
+    return [filename + ext for ext in COMPRESSION_EXTENSIONS.values()]
+
+
+def _open_compressed(filename, fmt, fs, level, threads):
+    raw = fs.open(filename + COMPRESSION_EXTENSIONS[fmt], 'wb')
+
+    if fmt == 'gzip':
+        stream = gzip.GzipFile(filename=os.path.basename(filename),
+                               mode='wb', fileobj=raw,
+                               compresslevel=min(level, 9), mtime=0)
+        closeables = [stream, raw]
+    else:
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+        stream = compressor.stream_writer(raw)
+        closeables = [stream]
+
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    return text, closeables
+
+
+class TeeTextFile:
+    """Archivo de texto que escribe sus contenidos a un archivo sin comprimir,
+    y a una o más versiones comprimidas del mismo.
+
+    Attributes:
+        _files (list): Archivos de texto a los que se escriben los datos.
+        _closeables (list): Objetos a cerrar (en orden) al cerrar el archivo.
+
+    """
+
+    def __init__(self, filename, fs, formats, level, threads):
+        # newline='' evita que se traduzcan los saltos de línea, al igual
+        # que en las versiones comprimidas (ver _open_compressed()).
+        self._files = [fs.open(filename, 'w', newline='')]
+        self._closeables = [self._files[0]]
+
+        for fmt in formats:
+            text, closeables = _open_compressed(filename, fmt, fs, level,
+                                                threads)
+            self._files.append(text)
+            self._closeables.append(text)
+            self._closeables.extend(closeables)
+
+    def write(self, text):
+        for f in self._files:
+            f.write(text)
+
+    def close(self):
+        for closeable in self._closeables:
+            if not closeable.closed:
+                closeable.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_output_file(filename, ctx):
+    """Abre un archivo de salida para escritura (texto). Si el ETL está
+    configurado para generar archivos comprimidos, los contenidos escritos
+    también son escritos a un archivo comprimido por cada formato, con la
+    misma ruta y la extensión del formato agregada. Las versiones comprimidas
+    obsoletas de formatos no configurados son eliminadas.
+
+    Args:
+        filename (str): Ruta del archivo.
+        ctx (Context): Contexto de ejecución.
+
+    Returns:
+        TeeTextFile: Archivo abierto.
+
+    """
+    formats = compression_formats(ctx.config)
+    if zstandard is None and 'zstd' in ctx.config.get('etl',
+                                                       'output_compression'):
+        ctx.report.warn('El módulo zstandard no está instalado, no se '
+                        'generará el archivo {}.'.format(
+                            filename + COMPRESSION_EXTENSIONS['zstd']))
+
+    for fmt, ext in COMPRESSION_EXTENSIONS.items():
+        if fmt not in formats and ctx.fs.exists(filename + ext):
+            ctx.fs.remove(filename + ext)
+
+    return TeeTextFile(filename, ctx.fs, formats,
+                       ctx.config.getint('etl', 'output_compression_level'),
+                       ctx.config.getint('etl',
+                                         'output_compression_threads'))
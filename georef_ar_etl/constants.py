@@ -98,6 +98,8 @@ INTERSECTIONS = 'intersecciones'
 STREET_BLOCKS = 'cuadras'
 SYNONYMS = 'sinonimos'
 EXCLUDING_TERMS = 'terminos_excluyentes'
+VECTOR_TILES = 'teselas'
+PUBLISH = 'publicacion'
 
 TMP_TABLE_NAME = 'tmp_{}'
 ETL_TABLE_NAME = 'georef_{}'
@@ -119,6 +121,8 @@ SETTLEMENTS_TMP_TABLE = TMP_TABLE_NAME.format(SETTLEMENTS)
 CENSUS_LOCALITIES_TMP_TABLE = TMP_TABLE_NAME.format(CENSUS_LOCALITIES)
 STREETS_TMP_TABLE = TMP_TABLE_NAME.format(STREETS)
 STREET_BLOCKS_TMP_TABLE = TMP_TABLE_NAME.format(STREET_BLOCKS)
+STREET_BLOCKS_GROUPED_TMP_TABLE = TMP_TABLE_NAME.format(
+    STREET_BLOCKS + '_agrupadas')
 
 PROVINCE_ID_LEN = 2
 DEPARTMENT_ID_LEN = 5
@@ -8,9 +8,11 @@ import os
 import smtplib
 import json
 import time
+from collections import OrderedDict
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import select
 from . import constants
 
 RUN_MODES = ['normal', 'interactive', 'testing']
@@ -64,26 +66,69 @@ class CachedQuery:
     """Imita un objeto Query de SQLAlchemy, pero cacheando los resultados de
     llamadas a 'get()' para lograr mayor performance.
 
+    La cache puede tener un tamaño máximo, en cuyo caso se descartan las
+    entidades usadas menos recientemente (LRU). Opcionalmente, la primera
+    llamada a 'get()' carga la tabla completa en una única consulta (ver
+    'warm()').
+
     Attributes:
-        _cache (dict): Cache de resultados.
+        _cache (collections.OrderedDict): Cache de resultados, ordenada del
+            menos al más recientemente usado.
         _query (sqlalchemy.orm.query.Query): Objeto 'Query' de SQLAlchemy.
+        _max_size (int): Cantidad máxima de entidades a cachear, o None.
+        _warm_pending (bool): Verdadero si se debe cargar la tabla completa
+            en la próxima llamada a 'get()'.
+        hits (int): Cantidad de búsquedas resueltas con la cache.
+        misses (int): Cantidad de búsquedas no resueltas con la cache.
+        evictions (int): Cantidad de entidades descartadas de la cache.
 
     """
 
-    def __init__(self, query):
+    def __init__(self, query, max_size=None, warm=False):
         """Inicializa un objeto de tipo 'CachedQuery'.
 
         Args:
-            _query (sqlalchemy.orm.query.Query): Objeto 'Query' a cachear.
+            query (sqlalchemy.orm.query.Query): Objeto 'Query' a cachear.
+            max_size (int): Ver atributo '_max_size'.
+            warm (bool): Ver atributo '_warm_pending'.
 
         """
-        self._cache = {}
+        self._cache = OrderedDict()
         self._query = query
+        self._max_size = max_size
+        self._warm_pending = warm
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     def __getattr__(self, name):
         # Delegar cualquier método que no sea get() al Query interno
         return getattr(self._query, name)
 
+    def _store(self, key, value):
+        self._cache[key] = value
+
+        if self._max_size is not None and len(self._cache) > self._max_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def warm(self):
+        """Carga todas las entidades de la tabla a la cache, utilizando una
+        única consulta. Si la cache tiene un tamaño máximo, se cargan
+        entidades hasta alcanzarlo.
+
+        """
+        self._warm_pending = False
+        mapper = self._query._mapper_zero()  # pylint: disable=protected-access
+
+        for entity in self._query:
+            if self._max_size is not None and \
+               len(self._cache) >= self._max_size:
+                break
+
+            key = mapper.primary_key_from_instance(entity)
+            self._cache[key[0] if len(key) == 1 else tuple(key)] = entity
+
     def get(self, key):
         """Busca una entidad a partir de su Primary Key (cacheado).
 
@@ -94,10 +139,33 @@ class CachedQuery:
             object, None: La entidad si se encontró, o None si no fue así.
 
         """
-        if key not in self._cache:
-            self._cache[key] = self._query.get(key)
+        if self._warm_pending:
+            self.warm()
+
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        value = self._query.get(key)
+        self._store(key, value)
+        return value
 
-        return self._cache[key]
+    def stats(self):
+        """Retorna las estadísticas de uso de la cache.
+
+        Returns:
+            dict: Cantidad de aciertos, fallos, entidades descartadas y
+                entidades cacheadas.
+
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._cache)
+        }
 
 
 class CachedSession:
@@ -109,18 +177,26 @@ class CachedSession:
             llamados a 'query()'.
         _session (sqlalchemy.orm.session.Session): Objeto 'Session' de
             SQLAlchemy.
+        _max_sizes (dict): Tamaño máximo de la cache de cada tabla, por
+            nombre de tabla. Las tablas no incluidas no tienen límite.
+        _warm_tables (list): Nombres de las tablas a cargar completas en el
+            primer acceso (ver CachedQuery.warm()).
 
     """
 
-    def __init__(self, session):
+    def __init__(self, session, max_sizes=None, warm_tables=None):
         """Inicializa un objeto de tipo 'CachedSession'.
 
         Args:
             session (sqlalchemy.orm.session.Session): Objeto Session a cachear.
+            max_sizes (dict): Ver atributo '_max_sizes'.
+            warm_tables (list): Ver atributo '_warm_tables'.
 
         """
         self._queries = {}
         self._session = session
+        self._max_sizes = max_sizes or {}
+        self._warm_tables = warm_tables or []
 
     def __getattr__(self, name):
         # Delegar cualquier método que no sea query() al Session interno
@@ -140,11 +216,172 @@ class CachedSession:
 
         """
         if query_class not in self._queries:
+            table_name = query_class.__table__.name
             self._queries[query_class] = CachedQuery(
-                self._session.query(query_class))
+                self._session.query(query_class),
+                max_size=self._max_sizes.get(table_name),
+                warm=table_name in self._warm_tables)
 
         return self._queries[query_class]
 
+    def warm(self, *query_classes):
+        """Carga todas las entidades de una o más tablas a la cache,
+        utilizando una consulta por tabla.
+
+        Args:
+            *query_classes (DeclarativeMeta): Clases de modelos a cargar.
+
+        """
+        for query_class in query_classes:
+            self.query(query_class).warm()
+
+    def stats(self):
+        """Retorna las estadísticas de uso de la cache de cada tabla (ver
+        CachedQuery.stats()).
+
+        Returns:
+            dict: Estadísticas, por nombre de tabla.
+
+        """
+        return {
+            query_class.__table__.name: query.stats()
+            for query_class, query in self._queries.items()
+        }
+
+    def report_stats(self, report, creator):
+        """Registra las estadísticas de uso de la cache en un reporte, bajo
+        la clave de datos especificada.
+
+        Args:
+            report (Report): Reporte donde registrar las estadísticas.
+            creator (object): Clave de los datos del reporte.
+
+        """
+        stats = self.stats()
+        for table_name, table_stats in sorted(stats.items()):
+            report.info('Cache {}: {} aciertos, {} fallos, {} descartadas, '
+                        '{} cacheadas.'.format(
+                            table_name, table_stats['hits'],
+                            table_stats['misses'], table_stats['evictions'],
+                            table_stats['size']))
+
+        report.get_data(creator)['cache_stats'] = stats
+
+
+class NameLookup:
+    """Imita un objeto Session de SQLAlchemy, agregando búsquedas de nombres
+    (y otros campos simples) de entidades a partir de sus IDs (ver
+    models.entity_name() y models.street_dict_simple()).
+
+    Los nombres de cada tabla se cargan una única vez, en su primer uso, con
+    una consulta 'SELECT id, nombre'. De la misma forma, los campos pedidos
+    con 'entity_fields()' se cargan una única vez por tabla. De esta forma,
+    al generar archivos no es necesario cargar entidades completas
+    (incluyendo sus geometrías) solo para leer sus nombres.
+
+    Attributes:
+        _names (dict): Mapas de ID a nombre, por modelo.
+        _fields (dict): Mapas de ID a valores de campos, por modelo y lista
+            de campos.
+        _session (sqlalchemy.orm.session.Session, CachedSession): Sesión a
+            utilizar para cualquier otra operación.
+
+    """
+
+    def __init__(self, session):
+        """Inicializa un objeto de tipo 'NameLookup'.
+
+        Args:
+            session (sqlalchemy.orm.session.Session, CachedSession): Ver
+                atributo '_session'.
+
+        """
+        self._names = {}
+        self._fields = {}
+        self._session = session
+
+    def __getattr__(self, name):
+        # Delegar cualquier método que no sea entity_name() o
+        # entity_fields() a la sesión interna
+        return getattr(self._session, name)
+
+    def entity_name(self, model, entity_id):
+        """Retorna el nombre de una entidad a partir de su ID.
+
+        Args:
+            model (DeclarativeMeta): Modelo de la entidad.
+            entity_id (str): ID de la entidad.
+
+        Raises:
+            KeyError: Si no existe la entidad.
+
+        Returns:
+            str: Nombre de la entidad.
+
+        """
+        if model not in self._names:
+            self._names[model] = dict(self._session.execute(
+                select([model.id, model.nombre])).fetchall())
+
+        return self._names[model][entity_id]
+
+    def entity_fields(self, model, entity_id, fields):
+        """Retorna los valores de campos simples de una entidad a partir de
+        su ID.
+
+        Args:
+            model (DeclarativeMeta): Modelo de la entidad.
+            entity_id (str): ID de la entidad.
+            fields (tuple): Nombres de los campos.
+
+        Raises:
+            KeyError: Si no existe la entidad.
+
+        Returns:
+            dict: Valores de los campos.
+
+        """
+        key = (model, fields)
+        if key not in self._fields:
+            columns = [getattr(model, field) for field in fields]
+            self._fields[key] = {
+                row[0]: row[1:]
+                for row in self._session.execute(
+                    select([model.id] + columns))
+            }
+
+        return dict(zip(fields, self._fields[key][entity_id]))
+
+
+def parse_table_sizes(value):
+    """Interpreta una lista de tamaños por tabla, con el formato
+    'tabla:cantidad, tabla:cantidad, ...'.
+
+    Args:
+        value (str): Lista de tamaños.
+
+    Raises:
+        ValueError: Si el formato de algún elemento es inválido.
+
+    Returns:
+        dict: Tamaños, por nombre de tabla.
+
+    """
+    sizes = {}
+
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+
+        try:
+            table_name, size = item.split(':')
+            sizes[table_name.strip()] = int(size)
+        except ValueError:
+            raise ValueError('Invalid table size: {}.'.format(item))
+
+    return sizes
+
 
 class Report:  # pylint: disable=attribute-defined-outside-init
     """Representa un reporte (texto y datos) sobre la ejecución de un proceso.
@@ -418,4 +655,13 @@ class Context:
             CachedSession: Sesión cacheada.
 
         """
-        return CachedSession(self.session)
+        max_sizes = parse_table_sizes(
+            self._config.get('etl', 'cached_session_max_entities'))
+        warm_tables = [
+            table_name.strip() for table_name in self._config.get(
+                'etl', 'cached_session_warm_tables').split(',')
+            if table_name.strip()
+        ]
+
+        return CachedSession(self.session, max_sizes=max_sizes,
+                             warm_tables=warm_tables)
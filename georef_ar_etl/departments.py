@@ -4,6 +4,8 @@ from .models import Province, Department
 from . import extractors, transformers, loaders, geometry, utils, constants
 from . import patch
 
+DEPARTMENTS_EXTRACTION_STEP_NAME = 'departments_extraction'
+
 
 def create_process(config):
     output_path = config.get('etl', 'output_dest_path')
@@ -39,20 +41,22 @@ def create_process(config):
         utils.FirstResultStep,
         utils.ValidateTableSizeStep(
             target_size=config.getint('etl', 'departments_target_size')),
-        CompositeStep([
-            loaders.CreateJSONFileStep(Department, constants.ETL_VERSION,
-                                       constants.DEPARTMENTS + '.json'),
-            loaders.CreateGeoJSONFileStep(
-                Department,
+        loaders.CreateOutputFilesStep(Department, [
+            loaders.JSONSink(constants.ETL_VERSION,
+                             constants.DEPARTMENTS + '.json'),
+            loaders.GeoJSONSink(
                 constants.ETL_VERSION,
                 constants.DEPARTMENTS + '.geojson',
                 tolerance=config.getfloat("etl", "geojson_tolerance"),
-                caba_tolerance=config.getfloat("etl", "geojson_caba_tolerance")
+                caba_tolerance=config.getfloat("etl",
+                                               "geojson_caba_tolerance"),
+                simplify_mode=config.get('etl',
+                                         'geojson_polygons_simplify_mode')
             ),
-            loaders.CreateCSVFileStep(Department, constants.ETL_VERSION,
-                                      constants.DEPARTMENTS + '.csv'),
-            loaders.CreateNDJSONFileStep(Department, constants.ETL_VERSION,
-                                         constants.DEPARTMENTS + '.ndjson')
+            loaders.CSVSink(constants.ETL_VERSION,
+                            constants.DEPARTMENTS + '.csv'),
+            loaders.NDJSONSink(constants.ETL_VERSION,
+                               constants.DEPARTMENTS + '.ndjson')
         ]),
         CompositeStep([
             utils.CopyFileStep(output_path, constants.DEPARTMENTS + '.json'),
@@ -61,13 +65,15 @@ def create_process(config):
             utils.CopyFileStep(output_path, constants.DEPARTMENTS + '.csv'),
             utils.CopyFileStep(output_path, constants.DEPARTMENTS + '.ndjson')
         ])
-    ])
+    ] + loaders.optional_output_steps(
+        config, Department, constants.DEPARTMENTS, flatgeobuf=True,
+        extraction_step_name=DEPARTMENTS_EXTRACTION_STEP_NAME))
 
 
 class DepartmentsExtractionStep(transformers.EntitiesExtractionStep):
 
     def __init__(self):
-        super().__init__('departments_extraction', Department,
+        super().__init__(DEPARTMENTS_EXTRACTION_STEP_NAME, Department,
                          entity_class_pkey='id', tmp_entity_class_pkey='in1')
 
     def _patch_tmp_entities(self, tmp_departments, ctx):
@@ -0,0 +1,160 @@
+"""Módulo 'documents' de georef-ar-etl.
+
+Define funciones y clases utilizadas para generar los documentos JSON de cada
+entidad directamente en la base de datos, a partir de la forma de documento
+declarada por cada modelo (ver 'document_shape()' en models.py).
+
+"""
+
+from sqlalchemy import Text, cast, func, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.sqltypes import NullType
+from sqlalchemy.dialects.postgresql import JSON
+from geoalchemy2 import Geometry
+
+DOCUMENTS_BACKENDS = ['orm', 'db']
+
+GEOMETRY_KEY = 'geometria'
+
+
+class SubDocument:
+    """Representa un subdocumento cuyos campos se toman de otra entidad,
+    referenciada mediante una Foreign Key.
+
+    Attributes:
+        model (type): Modelo de la entidad referenciada.
+        foreign_key (sqlalchemy.Column): Columna que contiene el ID de la
+            entidad referenciada.
+        shape (dict): Forma del subdocumento, cuyas expresiones se refieren a
+            columnas de 'model'.
+
+    """
+
+    def __init__(self, model, foreign_key, shape):
+        self.model = model
+        self.foreign_key = foreign_key
+        self.shape = shape
+
+
+class JSONObject(ColumnElement):
+    """Expresión SQL que construye un objeto JSON a partir de una forma de
+    documento.
+
+    El objeto se construye con row_to_json() sobre una subconsulta, lo cual
+    preserva el orden de las claves y genera JSON sin espacios, equivalente al
+    generado por json.dumps(..., separators=(',', ':')).
+
+    Attributes:
+        shape (dict): Forma del documento.
+
+    """
+
+    type = NullType()
+
+    def __init__(self, shape):
+        self.shape = shape
+
+
+@compiles(JSONObject)
+def _compile_json_object(element, compiler, **kwargs):
+    depth = kwargs.pop('json_object_depth', 0) + 1
+    alias = compiler.preparer.quote('_doc{}'.format(depth))
+
+    fields = []
+    for key, value in element.shape.items():
+        sql = compiler.process(_shape_value_expression(value), **kwargs,
+                               json_object_depth=depth)
+        fields.append('{} AS {}'.format(sql, compiler.preparer.quote(key)))
+
+    return '(SELECT row_to_json({alias}) FROM (SELECT {fields}) AS {alias})'.\
+        format(alias=alias, fields=', '.join(fields))
+
+
+def _shape_value_expression(value):
+    if isinstance(value, dict):
+        return JSONObject(value)
+
+    if isinstance(value, SubDocument):
+        return select([JSONObject(value.shape)]).\
+            select_from(value.model.__table__).\
+            where(value.model.id == value.foreign_key).\
+            as_scalar()
+
+    if isinstance(getattr(value, 'type', None), Geometry):
+        return cast(func.ST_AsGeoJSON(value), JSON)
+
+    return value
+
+
+def without_geometry(shape):
+    """Retorna una copia de una forma de documento, sin su campo de
+    geometría.
+
+    Args:
+        shape (dict): Forma del documento.
+
+    Returns:
+        dict: Forma del documento sin geometría.
+
+    """
+    return {
+        key: value for key, value in shape.items()
+        if key != GEOMETRY_KEY
+    }
+
+
+def build_documents_query(model, shape=None, criterion=None):
+    """Construye una consulta que retorna, por cada entidad de un modelo, su
+    documento JSON como texto.
+
+    Args:
+        model (type): Modelo de las entidades.
+        shape (dict): Forma del documento. Por defecto, se utiliza
+            model.document_shape().
+        criterion (sqlalchemy.sql.expression.ClauseElement): Filtro opcional
+            de entidades.
+
+    Returns:
+        sqlalchemy.sql.expression.Select: Consulta de documentos.
+
+    """
+    if shape is None:
+        shape = model.document_shape()
+
+    query = select([cast(JSONObject(shape), Text)]).\
+        select_from(model.__table__)
+
+    if criterion is not None:
+        query = query.where(criterion)
+
+    return query
+
+
+def stream_documents(model, ctx, shape=None, criterion=None):
+    """Genera los documentos JSON de todas las entidades de un modelo,
+    utilizando un cursor del lado del servidor. Se utiliza la conexión de la
+    sesión actual, por lo que se incluyen entidades aún no persistidas.
+
+    Args:
+        model (type): Modelo de las entidades.
+        ctx (Context): Contexto de ejecución.
+        shape (dict): Forma del documento (ver build_documents_query()).
+        criterion (sqlalchemy.sql.expression.ClauseElement): Filtro opcional
+            de entidades.
+
+    Yields:
+        str: Documento JSON de cada entidad.
+
+    """
+    ctx.session.flush()
+    connection = ctx.session.connection().execution_options(
+        stream_results=True)
+    result = connection.execute(build_documents_query(model, shape,
+                                                      criterion))
+
+    try:
+        for row in result:
+            yield row[0]
+    finally:
+        result.close()
@@ -4,14 +4,155 @@ Define funciones de utilidad para operar con geometrías.
 
 """
 
+import os
 import json
 import math
+import hashlib
 import binascii
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from geoalchemy2.elements import WKBElement
+import shapely
+import shapely.wkb
+import shapely.geometry
+from . import constants, utils
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Radio de la tierra promedio para WGS84
 _MEAN_EARTH_RADIUS_KM = 6371.0088
 
+INTERSECTIONS_BACKENDS = ['db', 'shapely']
+GEOJSON_SERIALIZER_MODES = ['db', 'local']
+# Precisión por defecto de ST_AsGeoJSON()
+DEFAULT_GEOJSON_PRECISION = 9
+GEOJSON_SIMPLIFY_MODES = ['local', 'batch', 'db', 'coverage']
+COVERAGE_CACHE_DIR = 'coverage_cache'
+SRID = 4326
+
+# Versión mínima de PostGIS requerida por el modo de simplificación
+# 'coverage' (ST_CoverageSimplify y ST_CoverageInvalidEdges).
+COVERAGE_MIN_POSTGIS_VERSION = (3, 4)
+
+
+def require_shapely_2():
+    """Verifica que las funciones vectorizadas de Shapely 2 (y NumPy) estén
+    disponibles.
+
+    Raises:
+        RuntimeError: Si la versión instalada de Shapely es anterior a 2.0.
+
+    """
+    if np is None or int(shapely.__version__.split('.')[0]) < 2:
+        raise RuntimeError('Shapely >= 2.0 is not installed.')
+
+
+def geojson_precision(config):
+    """Retorna la cantidad máxima de decimales de las coordenadas de los
+    GeoJSON generados ('geojson_precision').
+
+    Args:
+        config (configparser.ConfigParser): Configuración del ETL.
+
+    Returns:
+        int: Cantidad de decimales (por defecto, la precisión por defecto de
+            ST_AsGeoJSON()).
+
+    """
+    return config.getint('etl', 'geojson_precision',
+                         fallback=DEFAULT_GEOJSON_PRECISION)
+
+
+class GeoJSONSerializer:
+    """Convierte geometrías de GeoAlchemy2 a GeoJSON (como diccionario).
+
+    En modo 'db', cada geometría se convierte en la base de datos utilizando
+    ST_AsGeoJSON(). En modo 'local', el WKB de la geometría (ya leído por
+    GeoAlchemy2) se decodifica con Shapely, sin consultar la base de datos.
+    En ambos casos, las coordenadas se redondean a 'precision' decimales (por
+    defecto, la misma precisión que ST_AsGeoJSON()), por lo que ambos modos
+    generan el mismo GeoJSON.
+
+    Attributes:
+        mode (str): Modo de conversión ('db' o 'local').
+        precision (int): Cantidad máxima de decimales de las coordenadas.
+
+    """
+
+    def __init__(self, mode='db', precision=DEFAULT_GEOJSON_PRECISION):
+        if mode not in GEOJSON_SERIALIZER_MODES:
+            raise ValueError('Invalid GeoJSON serializer mode: {}.'.format(
+                mode))
+
+        self.mode = mode
+        self.precision = precision
+
+    @classmethod
+    def from_config(cls, config):
+        """Crea un GeoJSONSerializer a partir de la configuración del ETL.
+
+        Args:
+            config (configparser.ConfigParser): Configuración del ETL.
+
+        Returns:
+            GeoJSONSerializer: Serializador configurado.
+
+        """
+        return cls(mode=config.get('etl', 'geojson_serializer_mode'),
+                   precision=geojson_precision(config))
+
+    def sql_expression(self, geom):
+        """Retorna una expresión SQL que calcula el GeoJSON (como texto) de
+        una columna de geometría.
+
+        Args:
+            geom (sqlalchemy.sql.expression.ColumnElement): Columna (o
+                expresión) de geometría.
+
+        Returns:
+            sqlalchemy.sql.functions.Function: Expresión ST_AsGeoJSON().
+
+        """
+        return func.ST_AsGeoJSON(geom, self.precision)
+
+    def serialize(self, geom, session):
+        """Convierte una geometría a GeoJSON.
+
+        Args:
+            geom (geoalchemy2.elements.WKBElement): Geometría a convertir.
+            session (sqlalchemy.orm.session.Session): Sesión de base de datos
+                (utilizada solo en modo 'db').
+
+        Returns:
+            dict: Geometría en formato GeoJSON.
+
+        """
+        if self.mode == 'db':
+            return json.loads(session.scalar(self.sql_expression(geom)))
+
+        shapely_geom = shapely.wkb.loads(bytes(geom.data))
+        geojson = shapely.geometry.mapping(shapely_geom)
+
+        return {
+            'type': geojson['type'],
+            'coordinates': self._coordinates(geojson['coordinates'])
+        }
+
+    def _coordinate(self, coord):
+        coord = round(coord, self.precision)
+
+        # ST_AsGeoJSON() representa valores enteros sin decimales.
+        return int(coord) if coord.is_integer() else coord
+
+    def _coordinates(self, coords):
+        if coords and isinstance(coords[0], float):
+            return [self._coordinate(coord) for coord in coords]
+
+        return [self._coordinates(part) for part in coords]
+
 
 def get_centroid_coordinates(geom, ctx):
     centroid_json = ctx.session.scalar(geom.ST_Centroid().ST_AsGeoJSON())
@@ -34,7 +175,8 @@ def distance_to_angle(distance_m):
     return math.degrees(distance_m / (1000 * _MEAN_EARTH_RADIUS_KM))
 
 
-def get_streets_intersections(geom_a, geom_b, ctx, cluster_distance_m=50):
+def get_streets_intersections(geom_a, geom_b, ctx, cluster_distance_m=50,
+                              backend='db'):
     """Dadas las geometrías de dos calles (MultiLineString), retorna todas las
     intersecciones de las mismas, utilizando un criterio razonable.
 
@@ -53,6 +195,9 @@ def get_streets_intersections(geom_a, geom_b, ctx, cluster_distance_m=50):
         ctx (Context): Contexto de ejecución.
         cluster_distance_m (int): Distancia en metros por la cual agrupar
             puntos. El valor por defecto 50 fue elegido experimentalmente.
+        backend (str): 'db' para calcular las intersecciones en la base de
+            datos, o 'shapely' para calcularlas localmente (ver
+            get_streets_intersections_batch()).
 
     Raises:
         ValueError: Si las calles no interseccionan.
@@ -62,6 +207,22 @@ def get_streets_intersections(geom_a, geom_b, ctx, cluster_distance_m=50):
             un WKBElement de GeoAlchemy2.
 
     """
+    if backend not in INTERSECTIONS_BACKENDS:
+        raise ValueError('Invalid backend: {}.'.format(backend))
+
+    if backend == 'shapely':
+        require_shapely_2()
+        geoms = shapely.from_wkb([bytes(geom_a.data), bytes(geom_b.data)])
+        points = get_streets_intersections_batch(geoms[:1], geoms[1:],
+                                                 cluster_distance_m)[0]
+        if not points.size:
+            raise ValueError('Geometries do not intersect.')
+
+        return [
+            WKBElement(wkb, extended=True)
+            for wkb in points_to_ewkb(points)
+        ]
+
     points = [
         # Algunas calles se solapan entre sí, por lo que la intersección entre
         # ellas resulta en una o más líneas, en lugar de puntos. Utilizar
@@ -115,6 +276,261 @@ def get_streets_intersections(geom_a, geom_b, ctx, cluster_distance_m=50):
     ]
 
 
+def get_streets_intersections_batch(geoms_a, geoms_b, cluster_distance_m=50):
+    """Versión vectorizada de get_streets_intersections(), que utiliza Shapely
+    2 y NumPy en lugar de la base de datos. Los puntos de intersección de cada
+    par de calles son calculados con el mismo criterio: los vértices de la
+    intersección (equivalente a ST_DumpPoints()) se agrupan en clusters de
+    puntos separados por no más de 'cluster_distance_m' metros (equivalente a
+    ST_ClusterWithin()), y se toma el centroide de cada cluster.
+
+    Args:
+        geoms_a (numpy.ndarray): Geometrías Shapely de las calles A.
+        geoms_b (numpy.ndarray): Geometrías Shapely de las calles B.
+        cluster_distance_m (int): Distancia en metros por la cual agrupar
+            puntos.
+
+    Returns:
+        list: Por cada par de calles, un numpy.ndarray de forma (N, 2) con las
+            coordenadas de sus N puntos de intersección (N puede ser 0).
+
+    """
+    require_shapely_2()
+    distance = distance_to_angle(cluster_distance_m)
+    intersections = shapely.intersection(geoms_a, geoms_b)
+    coords, index = shapely.get_coordinates(intersections, return_index=True)
+    bounds = np.searchsorted(index, np.arange(len(geoms_a) + 1))
+
+    results = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        points = coords[start:end]
+        if len(points) > 1:
+            points = cluster_points(points, distance)
+
+        results.append(points)
+
+    return results
+
+
+def simplify_geometries_batch(wkbs, tolerances, precision=None):
+    """Simplifica un conjunto de geometrías (preservando su topología) y las
+    convierte a GeoJSON, utilizando las funciones vectorizadas de Shapely 2.
+
+    Args:
+        wkbs (list): WKB de cada geometría (bytes), o None.
+        tolerances (list): Tolerancia de simplificación de cada geometría.
+        precision (int): Cantidad máxima de decimales de las coordenadas. Si
+            es None, no se redondean las coordenadas.
+
+    Returns:
+        numpy.ndarray: GeoJSON (str) de cada geometría, o None.
+
+    """
+    require_shapely_2()
+    geoms = shapely.from_wkb([
+        bytes(wkb) if wkb is not None else None
+        for wkb in wkbs
+    ])
+    geoms = shapely.simplify(geoms, np.asarray(tolerances, dtype=float),
+                             preserve_topology=True)
+
+    if precision is not None:
+        geoms = shapely.transform(
+            geoms, lambda coords: np.round(coords, precision))
+
+    return shapely.to_geojson(geoms)
+
+
+def _coverage_hash(table, tolerance, caba_tolerance, precision, ctx):
+    layer_hash = ctx.session.scalar(select([
+        func.md5(func.string_agg(
+            table.id + ':' + func.md5(func.ST_AsEWKB(table.geometria)),
+            aggregate_order_by(literal(','), table.id)))
+    ]))
+
+    key = '{}:{}:{}:{}:{}'.format(table.__tablename__, layer_hash, tolerance,
+                                  caba_tolerance, precision)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _coverage_simplify(geom, tolerance):
+    return func.ST_CoverageSimplify(geom, tolerance).over()
+
+
+def is_valid_coverage(table, ctx):
+    """Verifica si las geometrías de una capa de polígonos forman una
+    cobertura válida (sin solapamientos ni huecos angostos entre vecinos),
+    utilizando ST_CoverageInvalidEdges() (PostGIS 3.4 o superior).
+
+    Args:
+        table (type): Modelo de la capa de polígonos.
+        ctx (Context): Contexto de ejecución.
+
+    Returns:
+        bool: Verdadero si la capa es una cobertura válida.
+
+    """
+    invalid_edges = select([
+        func.ST_CoverageInvalidEdges(table.geometria).over().label('edges')
+    ]).alias()
+
+    return not ctx.session.scalar(
+        select([func.count()]).
+        select_from(invalid_edges).
+        where(invalid_edges.c.edges.isnot(None)))
+
+
+def get_simplified_coverage(table, tolerance, caba_tolerance, precision,
+                            ctx):
+    """Simplifica las geometrías de una capa de polígonos como una cobertura
+    (utilizando ST_CoverageSimplify(), PostGIS 3.4 o superior), de forma que
+    los límites compartidos entre entidades vecinas se simplifican de la misma
+    forma, sin generar huecos ni solapamientos.
+
+    Las entidades de CABA se toman de una segunda simplificación de toda la
+    capa con 'caba_tolerance'; por lo tanto, solo el límite exterior de CABA
+    puede no coincidir exactamente con el de sus vecinos.
+
+    El resultado de ST_CoverageSimplify() no está definido si la capa no es
+    una cobertura válida (por ejemplo, si contiene entidades solapadas). Por
+    lo tanto, antes de simplificar se verifica la capa con
+    ST_CoverageInvalidEdges(); si no es válida, cada entidad se simplifica
+    por separado con ST_SimplifyPreserveTopology() (equivalente al modo
+    'db').
+
+    Como el cálculo es costoso, y las geometrías de las capas de polígonos
+    cambian con poca frecuencia, el resultado se guarda en el sistema de
+    archivos del ETL (directorio COVERAGE_CACHE_DIR), identificado por un
+    hash de los IDs y geometrías de la capa y de los parámetros utilizados.
+    Si la capa no fue modificada, se reutiliza el resultado de una ejecución
+    anterior.
+
+    Args:
+        table (type): Modelo de la capa de polígonos.
+        tolerance (float): Tolerancia de simplificación.
+        caba_tolerance (float): Tolerancia de simplificación para entidades
+            de CABA.
+        precision (int): Cantidad máxima de decimales de las coordenadas.
+        ctx (Context): Contexto de ejecución.
+
+    Raises:
+        RuntimeError: Si la versión de PostGIS es anterior a
+            COVERAGE_MIN_POSTGIS_VERSION.
+
+    Returns:
+        dict: GeoJSON (dict) de la geometría simplificada de cada entidad,
+            por ID.
+
+    """
+    if utils.postgis_version(ctx.session) < COVERAGE_MIN_POSTGIS_VERSION:
+        raise RuntimeError('PostGIS >= {}.{} is not installed.'.format(
+            *COVERAGE_MIN_POSTGIS_VERSION))
+
+    ctx.session.flush()
+    key = _coverage_hash(table, tolerance, caba_tolerance, precision, ctx)
+    prefix = table.__tablename__ + '_'
+    filename = os.path.join(COVERAGE_CACHE_DIR, prefix + key + '.json')
+
+    utils.ensure_dir(COVERAGE_CACHE_DIR, ctx.fs)
+    if ctx.fs.exists(filename):
+        ctx.report.info('Utilizando geometrías simplificadas de ejecución '
+                        'anterior ({}).'.format(filename))
+        with ctx.fs.open(filename) as f:
+            return json.load(f)
+
+    if is_valid_coverage(table, ctx):
+        ctx.report.info('Simplificando cobertura de {}...'.format(
+            table.__tablename__))
+        simplify = _coverage_simplify
+    else:
+        ctx.report.warn('La capa {} no es una cobertura válida, se '
+                        'simplificará cada entidad por separado.'.format(
+                            table.__tablename__))
+        simplify = func.ST_SimplifyPreserveTopology
+
+    simplified = select([
+        table.id.label('id'),
+        simplify(table.geometria, tolerance).label('geom'),
+        simplify(table.geometria, caba_tolerance).label('caba_geom')
+    ]).alias()
+
+    geom = case([
+        (simplified.c.id.startswith(constants.CABA_PROV_ID),
+         simplified.c.caba_geom)
+    ], else_=simplified.c.geom)
+
+    serializer = GeoJSONSerializer(precision=precision)
+    query = select([simplified.c.id, serializer.sql_expression(geom)])
+
+    coverage = {
+        entity_id: json.loads(geojson)
+        for entity_id, geojson in ctx.session.execute(query)
+    }
+
+    # Eliminar resultados anteriores de la misma capa.
+    for name in ctx.fs.listdir(COVERAGE_CACHE_DIR):
+        if name.startswith(prefix):
+            ctx.fs.remove(os.path.join(COVERAGE_CACHE_DIR, name))
+
+    with ctx.fs.open(filename, 'w') as f:
+        json.dump(coverage, f)
+
+    return coverage
+
+
+def cluster_points(coords, distance):
+    """Agrupa puntos en clusters, donde cada cluster contiene puntos separados
+    por no más de 'distance' unidades de algún otro punto del cluster, y
+    retorna el centroide de cada uno. Los clusters se ordenan de acuerdo a la
+    posición de su primer punto en 'coords'.
+
+    Args:
+        coords (numpy.ndarray): Coordenadas de los puntos, de forma (N, 2).
+        distance (float): Distancia máxima entre puntos de un cluster.
+
+    Returns:
+        numpy.ndarray: Coordenadas de los centroides, de forma (M, 2).
+
+    """
+    points = shapely.points(coords)
+    tree = shapely.STRtree(points)
+    # Pares de puntos (i, j) separados por no más de 'distance' unidades,
+    # utilizando el índice espacial para no comparar todos contra todos.
+    pairs = tree.query(points, predicate='dwithin', distance=distance)
+
+    # Propagar la etiqueta mínima de cada componente conexa del grafo de
+    # puntos cercanos, hasta que las etiquetas no cambien. Al finalizar, la
+    # etiqueta de cada punto es el índice del primer punto de su cluster.
+    labels = np.arange(len(coords))
+    while True:
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, pairs[0], labels[pairs[1]])
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    return np.array([
+        coords[labels == label].mean(axis=0)
+        for label in np.unique(labels)
+    ])
+
+
+def points_to_ewkb(coords, hex_output=False):
+    """Convierte coordenadas de puntos a EWKB (con SRID 4326).
+
+    Args:
+        coords (numpy.ndarray): Coordenadas de los puntos, de forma (N, 2).
+        hex_output (bool): Verdadero si se debería retornar EWKB hexadecimal.
+
+    Returns:
+        numpy.ndarray: Valores EWKB de cada punto.
+
+    """
+    points = shapely.set_srid(shapely.points(coords), SRID)
+    return shapely.to_wkb(points, hex=hex_output, include_srid=True)
+
+
 def get_intersection_percentage(geom_a, geom_b, ctx):
     area_a = ctx.session.scalar(geom_a.ST_Area())
     if area_a <= 0:
@@ -1,10 +1,14 @@
+import json
+from sqlalchemy import or_
 from sqlalchemy.orm import aliased
 from .process import Process, Step
 from .models import Province, Department, Street, Intersection
 from .exceptions import ProcessException
+from .streets import STREETS_EXTRACTION_STEP_NAME
 from . import constants, geometry, utils, loaders
 
 MAX_POINTS_PER_INTERSECTION = 99
+PENDING_STREETS_FILENAME = 'intersections_pending_streets.json'
 
 
 def create_process(config):
@@ -12,34 +16,138 @@ def create_process(config):
 
     return Process(constants.INTERSECTIONS, [
         utils.CheckDependenciesStep([Province, Department, Street]),
-        IntersectionsCreationStep(),
+        IntersectionsCreationStep(
+            incremental_threshold=config.getfloat(
+                'etl', 'intersections_incremental_threshold'),
+            backend=config.get('etl', 'intersections_backend')),
         utils.ValidateTableSizeStep(
             target_size=config.getint('etl', 'intersections_target_size'),
             op='ge'),
-        loaders.CreateNDJSONFileStep(Intersection, constants.ETL_VERSION,
-                                     constants.INTERSECTIONS + '.ndjson'),
+        loaders.CreateShardedNDJSONFileStep(
+            Intersection, constants.ETL_VERSION,
+            constants.INTERSECTIONS + '.ndjson',
+            shards=config.getint('etl', 'ndjson_shards')),
+        ClearPendingStreetsStep(),
         utils.CopyFileStep(output_path, constants.INTERSECTIONS + '.ndjson')
-    ])
+    ] + loaders.optional_output_steps(
+        config, Intersection, constants.INTERSECTIONS))
 
 
 class IntersectionsCreationStep(Step):
-    def __init__(self):
+    """Calcula las intersecciones de calles y las almacena en la tabla
+    georef_intersecciones.
+
+    Si se especifica un umbral de recálculo incremental, y el proceso de calles
+    fue ejecutado previamente en el mismo contexto, solo se recalculan las
+    intersecciones de calles nuevas, modificadas o eliminadas (de acuerdo a los
+    datos de reporte del paso StreetsExtractionStep). Si la proporción de
+    calles modificadas supera el umbral, se recalculan todas las
+    intersecciones.
+
+    Las calles a recalcular se persisten en PENDING_STREETS_FILENAME antes de
+    modificar la tabla, y el archivo se elimina solo al finalizar el proceso
+    (ver ClearPendingStreetsStep). De esta forma, si una ejecución falla, la
+    siguiente recalcula también las calles pendientes de la anterior (o todas
+    las intersecciones, si la anterior realizaba un recálculo total), aunque
+    sus calles no hayan sido modificadas nuevamente.
+
+    Las intersecciones pueden calcularse en la base de datos (backend 'db'),
+    o localmente utilizando Shapely 2 (backend 'shapely'). En el segundo caso,
+    las geometrías de las calles se leen una única vez, los pares de calles
+    que se intersectan se obtienen con un STRtree, y los resultados se
+    escriben a la base utilizando COPY (ver utils.BulkWriter).
+
+    Attributes:
+        _incremental_threshold (float): Proporción máxima (entre 0 y 1) de
+            calles modificadas para la cual se realiza un recálculo
+            incremental. Si es None, siempre se recalculan todas las
+            intersecciones.
+        _backend (str): Backend a utilizar para calcular intersecciones.
+
+    """
+
+    def __init__(self, incremental_threshold=None, backend='db'):
         super().__init__('intersections_creation_step', reads_input=False)
+        if backend not in geometry.INTERSECTIONS_BACKENDS:
+            raise ValueError('Invalid backend: {}.'.format(backend))
+
+        self._incremental_threshold = incremental_threshold
+        self._backend = backend
 
     def _run_internal(self, data, ctx):
+        street_ids = self._changed_street_ids(ctx)
+        write_pending_streets(street_ids, ctx)
+
+        if street_ids is None:
+            ctx.report.info('Recalculando todas las intersecciones.')
+            ctx.session.query(Intersection).delete()
+        else:
+            ctx.report.info('Recalculando intersecciones de %s calles.',
+                            len(street_ids))
+            ctx.session.query(Intersection).filter(or_(
+                Intersection.calle_a_id.in_(street_ids),
+                Intersection.calle_b_id.in_(street_ids)
+            )).delete(synchronize_session=False)
+
+            if not street_ids:
+                return Intersection
+
+        if self._backend == 'shapely':
+            self._insert_intersections_shapely(street_ids, ctx)
+            return Intersection
+
         provinces = ctx.session.query(Province).all()
         total = len(provinces)
 
-        ctx.session.query(Intersection).delete()
-
         for i, province in enumerate(provinces):
             self._insert_province_intersections(province, i + 1, total + 1,
-                                                ctx)
-        self._insert_province_intersections(None, total + 1, total + 1, ctx)
+                                                street_ids, ctx)
+        self._insert_province_intersections(None, total + 1, total + 1,
+                                            street_ids, ctx)
 
         return Intersection
 
-    def _build_intersection_query(self, province, bulk_size, ctx):
+    def _changed_street_ids(self, ctx):
+        if self._incremental_threshold is None:
+            return None
+
+        pending_ids = read_pending_streets(ctx)
+        if pending_ids is None:
+            ctx.report.info('La ejecución anterior no finalizó el recálculo '
+                            'total de intersecciones.')
+            return None
+
+        report_data = ctx.report.get_data(STREETS_EXTRACTION_STEP_NAME)
+        if 'changed_entities_ids' not in report_data:
+            ctx.report.info('No se encontraron datos de calles modificadas '
+                            'en esta ejecución.')
+            return None
+
+        if not ctx.session.query(Intersection).first():
+            ctx.report.info('No existen intersecciones calculadas '
+                            'previamente.')
+            return None
+
+        street_ids = set(pending_ids)
+        if street_ids:
+            ctx.report.info('Calles pendientes de una ejecución anterior: '
+                            '%s.', len(street_ids))
+
+        street_ids.update(report_data['new_entities_ids'])
+        street_ids.update(report_data['changed_entities_ids'])
+        street_ids.update(report_data['deleted_entities_ids'])
+
+        streets_count = ctx.session.query(Street).count()
+        if len(street_ids) > streets_count * self._incremental_threshold:
+            ctx.report.info('Cantidad de calles modificadas (%s) supera el '
+                            'umbral de recálculo incremental.',
+                            len(street_ids))
+            return None
+
+        return street_ids
+
+    def _build_intersection_query(self, province, bulk_size, street_ids,
+                                  ctx):
         StreetA = aliased(Street)
         StreetB = aliased(Street)
         query = ctx.session.query(StreetA, StreetB)
@@ -60,41 +168,169 @@ class IntersectionsCreationStep(Step):
                 filter(StreetA.provincia_id == province.id).\
                 filter(StreetB.provincia_id == province.id)
 
+        if street_ids is not None:
+            query = query.filter(or_(StreetA.id.in_(street_ids),
+                                     StreetB.id.in_(street_ids)))
+
         return query.yield_per(bulk_size)
 
-    def _insert_province_intersections(self, province, i, total, ctx):
+    def _insert_province_intersections(self, province, i, total, street_ids,
+                                       ctx):
         province_name = province.iso_nombre if province else 'interprovincial'
         ctx.report.info('Creando intersecciones para: %s [%s/%s]',
                         province_name, i, total)
         ctx.report.info('Procesando...')
 
         bulk_size = ctx.config.getint('etl', 'bulk_size')
+        query = self._build_intersection_query(province, bulk_size,
+                                               street_ids, ctx)
+
+        with utils.BulkWriter(Intersection, ctx) as writer:
+            for street_a, street_b in utils.pbar(query, ctx):
+                points = geometry.get_streets_intersections(
+                    street_a.geometria, street_b.geometria, ctx)
+
+                for idx, point in enumerate(points):
+                    if idx + 1 > MAX_POINTS_PER_INTERSECTION:
+                        raise ProcessException(
+                            'Más de {} puntos para intersección de calles con '
+                            'IDs {} y {}'.format(MAX_POINTS_PER_INTERSECTION,
+                                                 street_a.id, street_b.id))
+
+                    isct_num = str(idx + 1).rjust(2, '0')
+                    writer.add({
+                        'id': '{}-{}-{}'.format(street_a.id, street_b.id,
+                                                isct_num),
+                        'calle_a_id': street_a.id,
+                        'calle_b_id': street_b.id,
+                        'geometria': point
+                    })
+
+        ctx.report.info('Intersecciones creadas, cantidad: %s.\n',
+                        writer.count)
+
+    def _insert_intersections_shapely(self, street_ids, ctx):
+        geometry.require_shapely_2()
+        np = geometry.np
+        bulk_size = ctx.config.getint('etl', 'bulk_size')
+
+        ctx.report.info('Leyendo geometrías de calles...')
+        query = ctx.session.query(Street.id, Street.provincia_id,
+                                  Street.geometria).\
+            order_by(Street.id).\
+            yield_per(bulk_size)
+
+        ids, province_ids, wkbs = [], [], []
+        for street_id, province_id, geom in utils.pbar(query, ctx):
+            ids.append(street_id)
+            province_ids.append(province_id)
+            wkbs.append(bytes(geom.data))
+
+        ids = np.array(ids, dtype=object)
+        province_ids = np.array(province_ids, dtype=object)
+        geoms = geometry.shapely.from_wkb(wkbs)
+        tree = geometry.shapely.STRtree(geoms)
+
+        ctx.report.info('Buscando pares de calles que se intersectan...')
+        if street_ids is None:
+            idx_a, idx_b = tree.query(geoms, predicate='intersects')
+        else:
+            changed = np.flatnonzero(np.isin(ids, list(street_ids)))
+            idx_a, idx_b = tree.query(geoms[changed], predicate='intersects')
+            idx_a = changed[idx_a]
+            idx_a, idx_b = np.minimum(idx_a, idx_b), np.maximum(idx_a, idx_b)
+
+        # Las calles están ordenadas por ID, por lo que comparar índices es
+        # equivalente a comparar IDs.
+        pairs = np.unique(np.stack([idx_a, idx_b], axis=1)[idx_a < idx_b],
+                          axis=0)
+        ctx.report.info('Pares de calles a procesar: %s', len(pairs))
+        ctx.report.info('Pares de calles interprovinciales: %s',
+                        np.count_nonzero(province_ids[pairs[:, 0]] !=
+                                         province_ids[pairs[:, 1]]))
+        ctx.report.info('Procesando...')
+
+        with utils.BulkWriter(Intersection, ctx, method='copy') as writer:
+            for start in utils.pbar(range(0, len(pairs), bulk_size), ctx):
+                chunk_a, chunk_b = pairs[start:start + bulk_size].T
+                results = geometry.get_streets_intersections_batch(
+                    geoms[chunk_a], geoms[chunk_b])
+
+                for street_a_id, street_b_id, points in zip(ids[chunk_a],
+                                                            ids[chunk_b],
+                                                            results):
+                    if len(points) > MAX_POINTS_PER_INTERSECTION:
+                        raise ProcessException(
+                            'Más de {} puntos para intersección de calles con '
+                            'IDs {} y {}'.format(MAX_POINTS_PER_INTERSECTION,
+                                                 street_a_id, street_b_id))
+
+                    ewkbs = geometry.points_to_ewkb(points, hex_output=True)
+                    for idx, ewkb in enumerate(ewkbs):
+                        isct_num = str(idx + 1).rjust(2, '0')
+                        writer.add({
+                            'id': '{}-{}-{}'.format(street_a_id, street_b_id,
+                                                    isct_num),
+                            'calle_a_id': street_a_id,
+                            'calle_b_id': street_b_id,
+                            'geometria': ewkb
+                        })
+
+        ctx.report.info('Intersecciones creadas, cantidad: %s.\n',
+                        writer.count)
+
+
+class ClearPendingStreetsStep(Step):
+    """Elimina el archivo de calles pendientes de recálculo de intersecciones
+    (ver IntersectionsCreationStep). Debe ser ejecutado una vez que la tabla
+    de intersecciones fue almacenada (commit) en la base de datos. Retorna el
+    valor de entrada sin modificarlo.
+
+    """
+
+    def __init__(self):
+        super().__init__('clear_pending_streets')
+
+    def _run_internal(self, data, ctx):
+        if ctx.fs.exists(PENDING_STREETS_FILENAME):
+            ctx.fs.remove(PENDING_STREETS_FILENAME)
+
+        return data
+
+
+def read_pending_streets(ctx):
+    """Lee las calles pendientes de recálculo de intersecciones, persistidas
+    por una ejecución anterior que no finalizó.
+
+    Args:
+        ctx (Context): Contexto de ejecución.
+
+    Returns:
+        list: IDs de calles pendientes (vacía si no hay ninguna), o None si la
+            ejecución anterior realizaba un recálculo total.
+
+    """
+    if not ctx.fs.exists(PENDING_STREETS_FILENAME):
+        return []
+
+    with ctx.fs.open(PENDING_STREETS_FILENAME) as f:
+        return json.load(f)['street_ids']
+
+
+def write_pending_streets(street_ids, ctx):
+    """Persiste las calles pendientes de recálculo de intersecciones.
+
+    Args:
+        street_ids (set): IDs de calles, o None para indicar un recálculo
+            total.
+        ctx (Context): Contexto de ejecución.
+
+    """
+    if street_ids is not None:
+        street_ids = sorted(street_ids)
+
+    tmp_filename = PENDING_STREETS_FILENAME + '.tmp'
+    with ctx.fs.open(tmp_filename, 'w') as f:
+        json.dump({'street_ids': street_ids}, f)
 
-        count = 0
-        query = self._build_intersection_query(province, bulk_size, ctx)
-
-        for street_a, street_b in utils.pbar(query, ctx):
-            points = geometry.get_streets_intersections(street_a.geometria,
-                                                        street_b.geometria,
-                                                        ctx)
-
-            for idx, point in enumerate(points):
-                if idx + 1 > MAX_POINTS_PER_INTERSECTION:
-                    raise ProcessException('Más de {} puntos para intersección'
-                                           ' de calles con IDs {} y {}'.format(
-                                               MAX_POINTS_PER_INTERSECTION,
-                                               street_a.id, street_b.id
-                                           ))
-
-                isct_num = str(idx + 1).rjust(2, '0')
-                intersection = Intersection(
-                    id='{}-{}-{}'.format(street_a.id, street_b.id, isct_num),
-                    calle_a_id=street_a.id,
-                    calle_b_id=street_b.id,
-                    geometria=point
-                )
-
-                utils.add_maybe_flush(intersection, ctx, bulk_size)
-                count += 1
-
-        ctx.report.info('Intersecciones creadas, cantidad: %s.\n', count)
+    ctx.fs.move(tmp_filename, PENDING_STREETS_FILENAME, overwrite=True)
@@ -1,4 +1,77 @@
+import re
 import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Opciones de json.dumps() para las cuales orjson genera el mismo resultado.
+_ORJSON_COMPATIBLE_KWARGS = {
+    'ensure_ascii': False,
+    'separators': (',', ':')
+}
+
+# Los tipos no soportados por json (fechas, dataclasses) son rechazados
+# también por orjson, para luego utilizar json y obtener el mismo error.
+_ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME |
+                   orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else None
+
+# orjson no utiliza notación exponencial como json para valores menores a
+# 1e-4 (escribe '0.00001' en lugar de '1e-05'), y omite el '+' del exponente
+# en valores mayores a 1e16. Si el texto generado contiene alguno de estos
+# patrones (incluso dentro de un string), se utiliza json.
+_ORJSON_MISMATCH_REGEX = re.compile(r'0\.0000|\de')
+
+
+def _has_non_finite(obj):
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+
+    if isinstance(obj, dict):
+        return any(_has_non_finite(value) for value in obj.values())
+
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(value) for value in obj)
+
+    return False
+
+
+class JSONEncoder:
+    """Codificador de objetos a JSON. Si el módulo orjson está instalado, y
+    las opciones especificadas son compatibles, se lo utiliza en lugar de
+    json. En ambos casos, el texto generado es idéntico.
+
+    Los valores NaN e Infinity son codificados por json como 'NaN' e
+    'Infinity', mientras que orjson los codifica como 'null': si el texto
+    generado por orjson contiene 'null' y el objeto contiene alguno de estos
+    valores, se utiliza json.
+
+    Attributes:
+        _kwargs (dict): Opciones de json.dumps().
+        _fast (bool): Verdadero si se utiliza orjson.
+
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._fast = orjson is not None and \
+            kwargs == _ORJSON_COMPATIBLE_KWARGS
+
+    def dumps(self, obj):
+        if self._fast:
+            try:
+                text = orjson.dumps(obj, option=_ORJSON_OPTIONS).\
+                    decode('utf-8')
+            except TypeError:
+                pass
+            else:
+                if not _ORJSON_MISMATCH_REGEX.search(text) and \
+                   ('null' not in text or not _has_non_finite(obj)):
+                    return text
+
+        return json.dumps(obj, **self._kwargs)
 
 
 class JSONArrayPlaceholder:
@@ -13,7 +86,27 @@ def default_json_encode(obj):
 
 
 class JSONStreamWriter:
-    def __init__(self, fp, template=None, bufsize=1024, **kwargs):
+    """Escribe un objeto JSON que contiene un array, agregando los elementos
+    del array de a uno.
+
+    Los elementos agregados son serializados inmediatamente, y acumulados en
+    un buffer. Cuando el buffer alcanza 'bufsize' elementos, o
+    'buffer_chars' caracteres, sus contenidos se escriben al archivo con una
+    única llamada a write().
+
+    Attributes:
+        _fp (io.TextIOBase): Archivo de salida.
+        _first (bool): Verdadero si todavía no se escribió ningún elemento.
+        _buffer (list): Elementos serializados pendientes de escritura.
+        _buffer_len (int): Cantidad de caracteres en '_buffer'.
+        _bufsize (int): Cantidad máxima de elementos en '_buffer'.
+        _buffer_chars (int): Cantidad máxima de caracteres en '_buffer'.
+        _encoder (JSONEncoder): Codificador de elementos.
+
+    """
+
+    def __init__(self, fp, template=None, bufsize=1024,
+                 buffer_chars=1024 * 1024, **kwargs):
         if template is None:
             template = JSONArrayPlaceholder()
 
@@ -29,28 +122,44 @@ class JSONStreamWriter:
 
         self._fp = fp
         self._first = True
-        self._objects = []
+        self._buffer = []
+        self._buffer_len = 0
         self._bufsize = bufsize
-        self._kwargs = kwargs
+        self._buffer_chars = buffer_chars
+        self._encoder = JSONEncoder(**kwargs)
         self._template_part_a = template_str_parts[0]
         self._template_part_b = template_str_parts[1]
 
     def append(self, obj):
-        self._objects.append(obj)
+        self.append_raw(self._encoder.dumps(obj))
+
+    def append_raw(self, text):
+        """Agrega un elemento al array, ya serializado como JSON. El texto se
+        escribe sin modificaciones.
+
+        Args:
+            text (str): Elemento serializado como JSON.
+
+        """
+        self._buffer.append(text)
+        self._buffer_len += len(text)
 
-        if len(self._objects) == self._bufsize:
-            for o in self._objects:
-                self._write_object(o)
+        if len(self._buffer) >= self._bufsize or \
+           self._buffer_len >= self._buffer_chars:
+            self._flush()
 
-            self._objects.clear()
+    def _flush(self):
+        if not self._buffer:
+            return
 
-    def _write_object(self, obj):
         if self._first:
             self._first = False
         else:
             self._fp.write(',')
 
-        json.dump(obj, self._fp, **self._kwargs)
+        self._fp.write(','.join(self._buffer))
+        self._buffer.clear()
+        self._buffer_len = 0
 
     def __enter__(self):
         self._fp.write(self._template_part_a)
@@ -58,9 +167,7 @@ class JSONStreamWriter:
         return self
 
     def __exit__(self, *args):
-        for o in self._objects:
-            self._write_object(o)
-        self._objects.clear()
+        self._flush()
 
         self._fp.write(']')
         self._fp.write(self._template_part_b)
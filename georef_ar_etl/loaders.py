@@ -1,22 +1,67 @@
 import os
 import json
+import logging
 import subprocess
 import shutil
 import csv
-from abc import abstractmethod
+import operator
+import functools
+import configparser
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from abc import ABC, abstractmethod
 from datetime import datetime
 from datetime import timezone
-from sqlalchemy import MetaData
+import sqlalchemy
+from sqlalchemy import MetaData, Text, and_, any_, bindparam, case, cast, \
+    func, literal
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.orm import defer
+from sqlalchemy.sql import sqltypes
+from fs.osfs import OSFS
 from shapely.geometry import shape
 import shapely
 import geojson
-from . import constants, utils
+from . import constants, utils, documents, compression
+from .geometry import GeoJSONSerializer, GEOJSON_SIMPLIFY_MODES, \
+    require_shapely_2, simplify_geometries_batch, get_simplified_coverage, \
+    geojson_precision
 from .process import Step, ProcessException
-from .json_stream_writer import JSONStreamWriter, JSONArrayPlaceholder
+from .context import Context, Report, NameLookup
+from .json_stream_writer import JSONStreamWriter, JSONArrayPlaceholder, \
+    JSONEncoder
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 OGR2OGR_CMD = 'ogr2ogr'
 OUTPUT_EPSG = 'EPSG:4326'
 NDJSON_LINE_SEPARATOR = '\n'
+NDJSON_ENCODER = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+# Operaciones de los archivos NDJSON de cambios (ver DeltaNDJSONSink).
+DELTA_UPSERT = 'upsert'
+DELTA_DELETE = 'delete'
+
+
+def pg_connection_string(db_config):
+    """Retorna la cadena de conexión a PostgreSQL utilizada por ogr2ogr.
+
+    Args:
+        db_config (dict): Configuración de la base de datos.
+
+    Returns:
+        str: Cadena de conexión ('PG:...').
+
+    """
+    return ('PG:host={host} ' +
+            'user={user} ' +
+            'password={password} ' +
+            'dbname={database}').format(**db_config)
 
 
 class Ogr2ogrStep(Step):
@@ -51,10 +96,7 @@ class Ogr2ogrStep(Step):
         ctx.report.info('Ejecutando ogr2ogr sobre %s.', filepath)
         args = [
             OGR2OGR_CMD, '-f', 'PostgreSQL',
-            ('PG:host={host} ' +
-             'user={user} ' +
-             'password={password} ' +
-             'dbname={database}').format(**db_config),
+            pg_connection_string(db_config),
             '-nln', self._table_name,
             '-nlt', self._geom_type,
             '-t_srs', OUTPUT_EPSG
@@ -99,38 +141,129 @@ class Ogr2ogrStep(Step):
         self._overwrite = val
 
 
-class CreateOutputFileStep(Step):
+class OutputSink(ABC):
+    """Formato de archivo de salida utilizado por CreateOutputFilesStep.
 
-    def __init__(self, name, table, *filename_parts):
-        super().__init__(name, reads_input=False)
-        self._table = table
-        self._filename = os.path.join(*filename_parts)
+    Cada sink recibe el diccionario (to_dict()) de cada entidad, y lo escribe
+    en su propio archivo. El diccionario es compartido entre todos los sinks
+    de un mismo paso, por lo que los sinks no deben modificarlo.
 
-    @abstractmethod
-    def _write_file(self, query, count, cached_session, ctx):
-        pass
+    Attributes:
+        format_name (str): Nombre del formato (para reportes).
+        uses_geometry (bool): Verdadero si el sink utiliza el campo
+            'geometria' de cada entidad.
+        filename (str): Ruta del archivo a crear.
+        _file (compression.TeeTextFile): Archivo abierto durante la
+            escritura (ver compression.open_output_file()).
 
-    def _run_internal(self, data, ctx):
-        bulk_size = ctx.config.getint('etl', 'bulk_size')
-        query = ctx.session.query(self._table).yield_per(bulk_size)
-        count = query.count()
-        cached_session = ctx.cached_session()
+    """
 
-        dirname = os.path.dirname(self._filename)
+    format_name = None
+    uses_geometry = True
+
+    def __init__(self, *filename_parts):
+        self.filename = os.path.join(*filename_parts)
+        self._file = None
+
+    def configure(self, ctx):
+        """Configura el sink antes de que el paso construya sus consultas (y
+        antes de utilizar 'uses_geometry', extra_columns() y
+        document_shape()).
+
+        Args:
+            ctx (Context): Contexto de ejecución.
+
+        """
+
+    def extra_columns(self, table):
+        """Retorna expresiones SQL adicionales a seleccionar junto a cada
+        entidad. Sus valores son pasados a write() en el diccionario 'extra'.
+
+        Args:
+            table (type): Modelo de las entidades.
+
+        Returns:
+            dict: Expresiones SQL, por nombre.
+
+        """
+        return {}
+
+    def document_shape(self, table):
+        """Retorna la forma de los documentos JSON a generar en la base de
+        datos para este sink, si el mismo puede escribirlos directamente (ver
+        documents.py). Si no, retorna None.
+
+        Args:
+            table (type): Modelo de las entidades.
+
+        Returns:
+            dict: Forma de los documentos, o None.
+
+        """
+        return None
+
+    def open(self, table, count, ctx):
+        dirname = os.path.dirname(self.filename)
         if dirname:
             utils.ensure_dir(dirname, ctx.fs)
 
-        self._write_file(query, count, cached_session, ctx)
-        return self._filename
+        self._file = compression.open_output_file(self.filename, ctx)
+        self._begin(table, count, ctx)
 
+    def close(self):
+        self._end()
+        self._file.close()
+        self._file = None
 
-class CreateJSONFileStep(CreateOutputFileStep):
+    def _begin(self, table, count, ctx):
+        pass
 
-    def __init__(self, table, *filename_parts):
-        super().__init__('create_json_file', table, *filename_parts)
+    def _end(self):
+        pass
+
+    @abstractmethod
+    def write(self, entity_dict, extra):
+        """Escribe una entidad.
+
+        Args:
+            entity_dict (dict): Entidad en forma de diccionario.
+            extra (dict): Valores de las columnas adicionales (ver
+                extra_columns()).
+
+        """
+
+    def write_raw(self, doc):
+        """Escribe un documento JSON generado en la base de datos (ver
+        document_shape()). Por defecto, el documento se decodifica y se
+        escribe con write(), sin columnas adicionales.
+
+        Args:
+            doc (str): Documento JSON.
+
+        """
+        self.write(json.loads(doc), {})
+
+
+def without_geometry(entity_dict):
+    return {
+        key: value for key, value in entity_dict.items()
+        if key != 'geometria'
+    }
 
-    def _write_file(self, query, count, cached_session, ctx):
-        entity_name = os.path.basename(os.path.splitext(self._filename)[0])
+
+class JSONSink(OutputSink):
+    format_name = 'JSON'
+    uses_geometry = False
+
+    def __init__(self, *filename_parts):
+        super().__init__(*filename_parts)
+        self._writer = None
+
+    def document_shape(self, table):
+        return documents.without_geometry(table.document_shape())
+
+    def _begin(self, table, count, ctx):
+        entity_name = os.path.basename(os.path.splitext(self.filename)[0])
 
         contents = {
             'cantidad': count,
@@ -140,150 +273,1267 @@ class CreateJSONFileStep(CreateOutputFileStep):
             entity_name: JSONArrayPlaceholder()
         }
 
-        ctx.report.info('Transformando entidades a JSON...')
+        self._writer = JSONStreamWriter(self._file, template=contents,
+                                        ensure_ascii=False,
+                                        separators=(',', ':'))
+        self._writer.__enter__()
 
-        with ctx.fs.open(self._filename, 'w') as f:
-            stream_writer = JSONStreamWriter(f, template=contents,
-                                             ensure_ascii=False,
-                                             separators=(',', ':'))
+    def _end(self):
+        self._writer.__exit__(None, None, None)
+        self._writer = None
 
-            with stream_writer:
-                for entity in utils.pbar(query, ctx, total=count):
-                    entity_dict = entity.to_dict(cached_session)
-                    del entity_dict['geometria']
+    def write(self, entity_dict, extra):
+        self._writer.append(without_geometry(entity_dict))
 
-                    stream_writer.append(entity_dict)
+    def write_raw(self, doc):
+        self._writer.append_raw(doc)
 
 
-class CreateNDJSONFileStep(CreateOutputFileStep):
+def ndjson_metadata(count):
+    now = datetime.now(timezone.utc)
+    return {
+        'fecha_creacion': str(now),
+        'timestamp': int(now.timestamp()),
+        'version': constants.ETL_VERSION,
+        'cantidad': count
+    }
 
-    def __init__(self, table, *filename_parts):
-        super().__init__('create_ndjson_file', table, *filename_parts)
-
-    def _write_json_line(self, obj, f):
-        json.dump(obj, f, ensure_ascii=False, separators=(',', ':'))
-        f.write(NDJSON_LINE_SEPARATOR)
-
-    def _write_file(self, query, count, cached_session, ctx):
-        now = datetime.now(timezone.utc)
-        metadata = {
-            'fecha_creacion': str(now),
-            'timestamp': int(now.timestamp()),
-            'version': constants.ETL_VERSION,
-            'cantidad': count
-        }
 
-        ctx.report.info('Transformando entidades a NDJSON...')
+class NDJSONSink(OutputSink):
+    """Sink de archivos NDJSON.
 
-        with ctx.fs.open(self._filename, 'w') as f:
-            self._write_json_line(metadata, f)
+    Attributes:
+        lines_written (int): Cantidad de entidades escritas.
+        _metadata (bool): Verdadero si se debe escribir la línea de metadatos
+            al comienzo del archivo.
 
-            for entity in utils.pbar(query, ctx, total=count):
-                self._write_json_line(entity.to_dict(cached_session), f)
+    """
 
+    format_name = 'NDJSON'
 
-class CreateGeoJSONFileStep(CreateOutputFileStep):
+    def __init__(self, *filename_parts, metadata=True):
+        super().__init__(*filename_parts)
+        self.lines_written = 0
+        self._metadata = metadata
 
-    def __init__(self, table, *filename_parts,
-                 tolerance=None, caba_tolerance=None):
-        super().__init__('create_geojson_file', table, *filename_parts)
+    def document_shape(self, table):
+        return table.document_shape()
+
+    def _write_json_line(self, obj):
+        self._file.write(NDJSON_ENCODER.dumps(obj))
+        self._file.write(NDJSON_LINE_SEPARATOR)
+
+    def _begin(self, table, count, ctx):
+        self.lines_written = 0
+        if self._metadata:
+            self._write_json_line(ndjson_metadata(count))
+
+    def write(self, entity_dict, extra):
+        self._write_json_line(entity_dict)
+        self.lines_written += 1
+
+    def write_raw(self, doc):
+        self._file.write(doc)
+        self._file.write(NDJSON_LINE_SEPARATOR)
+        self.lines_written += 1
+
+
+class DeltaNDJSONSink(NDJSONSink):
+    """Sink de archivos NDJSON de cambios. Luego de la línea de metadatos,
+    cada línea representa una entidad nueva o modificada (operación
+    'upsert', con el documento completo de la entidad), o una entidad
+    eliminada (operación 'delete', solo con su ID).
+
+    Attributes:
+        deleted_ids (list): IDs de las entidades eliminadas, escritos al
+            final del archivo.
+
+    """
+
+    format_name = 'NDJSON (cambios)'
+
+    def __init__(self, *filename_parts):
+        super().__init__(*filename_parts)
+        self.deleted_ids = []
+
+    def document_shape(self, table):
+        return {
+            'operacion': cast(literal(DELTA_UPSERT), Text),
+            'id': table.id,
+            'documento': table.document_shape()
+        }
+
+    def _begin(self, table, count, ctx):
+        self.lines_written = 0
+        metadata = ndjson_metadata(count)
+        metadata['cantidad_eliminadas'] = len(self.deleted_ids)
+        self._write_json_line(metadata)
+
+    def _end(self):
+        for entity_id in self.deleted_ids:
+            self._write_json_line({
+                'operacion': DELTA_DELETE,
+                'id': entity_id
+            })
+
+    def write(self, entity_dict, extra):
+        super().write({
+            'operacion': DELTA_UPSERT,
+            'id': entity_dict['id'],
+            'documento': entity_dict
+        }, extra)
+
+
+class GeoJSONSink(OutputSink):
+    """Sink de archivos GeoJSON. Las geometrías de las entidades se
+    simplifican (preservando su topología) antes de ser escritas, utilizando
+    una tolerancia menor para las entidades de CABA.
+
+    Las geometrías pueden simplificarse de a una con Shapely (modo 'local'),
+    en lotes con las funciones vectorizadas de Shapely 2 (modo 'batch'), o en
+    la base de datos con ST_SimplifyPreserveTopology() (modo 'db'). Para
+    capas de polígonos, también pueden simplificarse como una cobertura, de
+    forma que los límites entre entidades vecinas sigan coincidiendo (modo
+    'coverage', ver geometry.get_simplified_coverage()).
+
+    Attributes:
+        tolerance (float): Tolerancia de simplificación.
+        caba_tolerance (float): Tolerancia de simplificación para entidades
+            de CABA.
+        _simplify_mode (str): Modo de simplificación. Si es None, se utiliza
+            el valor de la configuración ('geojson_simplify_mode').
+        _precision (int): Cantidad máxima de decimales de las coordenadas
+            (modo 'batch').
+        _batch_size (int): Cantidad de entidades por lote (modo 'batch').
+        _pending (list): Entidades pendientes de simplificación (modo
+            'batch').
+        _coverage (dict): Geometrías simplificadas, por ID (modo
+            'coverage').
+
+    """
+
+    format_name = 'GeoJSON'
+
+    def __init__(self, *filename_parts, tolerance=None, caba_tolerance=None,
+                 simplify_mode=None):
+        super().__init__(*filename_parts)
         self.tolerance = tolerance or 0.0085
         self.caba_tolerance = caba_tolerance or 0.001
+        self._simplify_mode = simplify_mode
+        self._precision = None
+        self._batch_size = None
+        self._pending = []
+        self._coverage = None
+        self._writer = None
+
+    def configure(self, ctx):
+        if self._simplify_mode is None:
+            self._simplify_mode = ctx.config.get('etl',
+                                                 'geojson_simplify_mode')
+
+        if self._simplify_mode not in GEOJSON_SIMPLIFY_MODES:
+            raise ValueError('Invalid simplify mode: {}.'.format(
+                self._simplify_mode))
+
+        if self._simplify_mode == 'batch':
+            require_shapely_2()
+
+        # En los modos 'batch', 'db' y 'coverage', la geometría no se lee
+        # como parte de to_dict().
+        self.uses_geometry = self._simplify_mode == 'local'
+        self._precision = geojson_precision(ctx.config)
+        self._batch_size = ctx.config.getint('etl', 'bulk_size')
+
+    def extra_columns(self, table):
+        if self._simplify_mode == 'batch':
+            return {'geometria_wkb': func.ST_AsBinary(table.geometria)}
+
+        if self._simplify_mode == 'db':
+            tolerance = case([
+                (table.id.startswith(constants.CABA_PROV_ID),
+                 self.caba_tolerance)
+            ], else_=self.tolerance)
+
+            serializer = GeoJSONSerializer(precision=self._precision)
+            return {
+                'geometria_simplificada': serializer.sql_expression(
+                    func.ST_SimplifyPreserveTopology(table.geometria,
+                                                     tolerance))
+            }
+
+        return {}
+
+    def _entity_tolerance(self, entity_dict):
+        if str(entity_dict['id']).startswith(constants.CABA_PROV_ID):
+            return self.caba_tolerance
+
+        return self.tolerance
+
+    def _begin(self, table, count, ctx):
+        if self._simplify_mode == 'coverage':
+            if table.geometria.type.geometry_type not in ['POLYGON',
+                                                          'MULTIPOLYGON']:
+                raise ValueError('Coverage simplification requires a polygon '
+                                 'layer.')
+
+            self._coverage = get_simplified_coverage(
+                table, self.tolerance, self.caba_tolerance, self._precision,
+                ctx)
 
-    def _write_file(self, query, count, cached_session, ctx):
         collection = geojson.FeatureCollection(JSONArrayPlaceholder())
-        ctx.report.info('Transformando entidades a GeoJSON...')
-
-        with ctx.fs.open(self._filename, 'w') as f:
-            stream_writer = JSONStreamWriter(f, template=collection,
-                                             ensure_ascii=False)
-
-            with stream_writer as w:
-                for entity in utils.pbar(query, ctx, total=count):
-                    entity_dict = entity.to_dict(cached_session)
-
-                    # conserva la geometría simplificada para GEOJSON
-                    shapely_geom = shape(entity_dict['geometria'])
-                    if shapely_geom:
-                        if str(entity_dict["id"]).startswith("02"):
-                            shapely_geom_simplified = shapely_geom.simplify(
-                                tolerance=self.caba_tolerance,
-                                preserve_topology=True)
-                        else:
-                            shapely_geom_simplified = shapely_geom.simplify(
-                                tolerance=self.tolerance,
-                                preserve_topology=True)
-                        geometry = shapely.geometry.mapping(
-                            shapely_geom_simplified)
-                    else:
-                        geometry = entity_dict['geometria']
-
-                    del entity_dict['geometria']
-
-                    # DEPRECADO: convierte centroide en la geometría
-                    # del entity_dict['geometria']
-                    # centroid = entity_dict.pop('centroide')
-                    # point = geojson.Point((centroid['lon'], centroid['lat']))
-
-                    feature = geojson.Feature(geometry=geometry,
-                                              properties=entity_dict)
-                    w.append(feature)
-
-
-def flatten_dict(d, max_depth=3, sep='_'):
-    """Aplana un diccionario recursivamente. Modifica el diccionario original.
-    Lanza un RuntimeError si no se pudo aplanar el diccionario
-    con el número especificado de profundidad.
+        self._writer = JSONStreamWriter(self._file, template=collection,
+                                        ensure_ascii=False)
+        self._writer.__enter__()
+
+    def _end(self):
+        self._flush_pending()
+        self._writer.__exit__(None, None, None)
+        self._writer = None
+        self._coverage = None
+
+    def _append_feature(self, geometry_dict, entity_dict):
+        # DEPRECADO: convierte centroide en la geometría
+        # del entity_dict['geometria']
+        # centroid = entity_dict.pop('centroide')
+        # point = geojson.Point((centroid['lon'], centroid['lat']))
+
+        feature = geojson.Feature(geometry=geometry_dict,
+                                  properties=without_geometry(entity_dict))
+        self._writer.append(feature)
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+
+        entity_dicts, wkbs = zip(*self._pending)
+        geojsons = simplify_geometries_batch(
+            wkbs, [self._entity_tolerance(d) for d in entity_dicts],
+            self._precision)
+
+        for entity_dict, geojson_str in zip(entity_dicts, geojsons):
+            self._append_feature(
+                json.loads(geojson_str) if geojson_str else None,
+                entity_dict)
+
+        self._pending.clear()
+
+    def write(self, entity_dict, extra):
+        if self._simplify_mode == 'batch':
+            self._pending.append((entity_dict, extra['geometria_wkb']))
+            if len(self._pending) >= self._batch_size:
+                self._flush_pending()
+
+            return
+
+        if self._simplify_mode == 'coverage':
+            self._append_feature(self._coverage[entity_dict['id']],
+                                 entity_dict)
+            return
+
+        if self._simplify_mode == 'db':
+            geojson_str = extra['geometria_simplificada']
+            self._append_feature(
+                json.loads(geojson_str) if geojson_str else None,
+                entity_dict)
+            return
+
+        # conserva la geometría simplificada para GEOJSON
+        shapely_geom = shape(entity_dict['geometria'])
+        if shapely_geom:
+            shapely_geom_simplified = shapely_geom.simplify(
+                tolerance=self._entity_tolerance(entity_dict),
+                preserve_topology=True)
+            geometry_dict = shapely.geometry.mapping(shapely_geom_simplified)
+        else:
+            geometry_dict = entity_dict['geometria']
+
+        self._append_feature(geometry_dict, entity_dict)
+
+
+def shape_paths(shape, path=()):
+    """Genera las rutas (tuplas de claves) de todos los campos simples de una
+    forma de documento (ver documents.py), incluyendo los campos de
+    subdocumentos.
+
+    Args:
+        shape (dict): Forma del documento.
+        path (tuple): Ruta de la forma dentro del documento.
+
+    Yields:
+        tuple: Ruta de cada campo.
+
+    """
+    for key, value in shape.items():
+        if isinstance(value, documents.SubDocument):
+            value = value.shape
+
+        if isinstance(value, dict):
+            yield from shape_paths(value, path + (key,))
+        else:
+            yield path + (key,)
+
+
+def _path_getter(path):
+    if len(path) == 1:
+        return operator.itemgetter(path[0])
+
+    if len(path) == 2:
+        first, second = path
+        return lambda d: d[first][second]
+
+    def getter(d):
+        for key in path:
+            d = d[key]
+        return d
+
+    return getter
+
+
+class RowFlattener:
+    """Aplana diccionarios de entidades (resultado de to_dict()) a filas con
+    un orden de campos fijo: los campos de subdocumentos se nombran uniendo
+    las claves con 'sep' (por ejemplo, 'provincia_id'), y se ordenan
+    alfabéticamente. Los campos y la forma de acceder a cada uno se calculan
+    una única vez a partir de la forma de documento del modelo, por lo que
+    aplanar cada entidad no requiere recursión ni construir claves nuevas.
+
+    Attributes:
+        fields (list): Nombres de los campos aplanados, ordenados.
+        _getters (list): Funciones que acceden al valor de cada campo.
+
+    """
+
+    def __init__(self, shape, sep='_'):
+        paths = sorted(shape_paths(shape), key=sep.join)
+        self.fields = [sep.join(path) for path in paths]
+        self._getters = [_path_getter(path) for path in paths]
+
+    def flatten(self, entity_dict):
+        """Aplana un diccionario de entidad.
+
+        Args:
+            entity_dict (dict): Entidad en forma de diccionario.
+
+        Returns:
+            list: Valores de los campos, en el orden de 'fields'.
+
+        """
+        return [getter(entity_dict) for getter in self._getters]
+
+
+@functools.lru_cache(maxsize=None)
+def row_flattener(table):
+    """Retorna el RowFlattener (sin geometría) de un modelo, calculado una
+    única vez por modelo.
+
+    Args:
+        table (type): Modelo de las entidades.
+
+    Returns:
+        RowFlattener: Aplanador de entidades del modelo.
+
+    """
+    return RowFlattener(documents.without_geometry(table.document_shape()))
+
+
+class CSVSink(OutputSink):
+    format_name = 'CSV'
+    uses_geometry = False
+
+    def __init__(self, *filename_parts):
+        super().__init__(*filename_parts)
+        self._writer = None
+        self._flattener = None
+
+    def _begin(self, table, count, ctx):
+        self._flattener = row_flattener(table)
+        self._writer = csv.writer(self._file, quoting=csv.QUOTE_NONNUMERIC)
+        self._writer.writerow(self._flattener.fields)
+
+    def _end(self):
+        self._writer = None
+        self._flattener = None
+
+    def write(self, entity_dict, extra):
+        self._writer.writerow(self._flattener.flatten(entity_dict))
+
+
+class ESBulkSink(OutputSink):
+    """Sink de archivos en formato bulk de Elasticsearch, listos para ser
+    enviados a la API '_bulk'. Cada entidad se escribe como un par de líneas
+    acción/documento, donde el documento es el resultado de to_dict() (igual
+    al de los archivos NDJSON), y el '_id' es el ID de la entidad.
+
+    Los pares se escriben en archivos numerados ('0000.ndjson',
+    '0001.ndjson', ...) dentro del directorio 'filename', de forma que ningún
+    archivo supere 'es_bulk_chunk_bytes' bytes (salvo que un único par los
+    supere).
+
+    Attributes:
+        _index (str): Nombre del índice a incluir en cada acción. Si es None,
+            no se incluye, y el índice debe especificarse en la URL.
+        _chunk_bytes (int): Tamaño máximo (en bytes) de cada archivo.
+        _chunk_size (int): Tamaño (en bytes) del archivo actual.
+        _chunk_count (int): Cantidad de archivos creados.
+        _ctx (Context): Contexto de ejecución (durante la escritura).
+
+    """
+
+    format_name = 'Elasticsearch bulk'
+
+    def __init__(self, *filename_parts, index=None):
+        super().__init__(*filename_parts)
+        self._index = index
+        self._chunk_bytes = None
+        self._chunk_size = 0
+        self._chunk_count = 0
+        self._ctx = None
+
+    def configure(self, ctx):
+        self._chunk_bytes = ctx.config.getint('etl', 'es_bulk_chunk_bytes')
+
+    def open(self, table, count, ctx):
+        if ctx.fs.exists(self.filename):
+            ctx.fs.removetree(self.filename)
+
+        utils.ensure_dir(self.filename, ctx.fs)
+        self._ctx = ctx
+        self._chunk_count = 0
+        self._open_chunk()
+
+    def _open_chunk(self):
+        filename = os.path.join(self.filename,
+                                '{:04d}.ndjson'.format(self._chunk_count))
+        self._file = compression.open_output_file(filename, self._ctx)
+        self._chunk_count += 1
+        self._chunk_size = 0
+
+    def close(self):
+        super().close()
+        self._ctx = None
+
+    def write(self, entity_dict, extra):
+        action = {'_index': self._index} if self._index else {}
+        action['_id'] = entity_dict['id']
+
+        text = ''.join([
+            NDJSON_ENCODER.dumps({'index': action}),
+            NDJSON_LINE_SEPARATOR,
+            NDJSON_ENCODER.dumps(entity_dict),
+            NDJSON_LINE_SEPARATOR
+        ])
+        size = len(text.encode('utf-8'))
+
+        if self._chunk_size and self._chunk_size + size > self._chunk_bytes:
+            self._file.close()
+            self._open_chunk()
+
+        self._file.write(text)
+        self._chunk_size += size
+
+
+def flattened_shape(shape, sep='_'):
+    """Aplana una forma de documento (ver documents.py) de la misma forma que
+    RowFlattener aplana el resultado de to_dict(). Los campos de
+    subdocumentos se convierten en subconsultas correlacionadas, por lo que
+    todas las expresiones resultantes pueden seleccionarse desde la tabla de
+    la entidad.
 
     Args:
-        d (dict): Diccionario a aplanar.
-        max_depth (int): Profundidad máxima a alcanzar.
+        shape (dict): Forma del documento.
+        sep (str): Separador de claves.
+
+    Returns:
+        dict: Expresiones SQL de la forma, por clave aplanada.
+
+    """
+    flat = {}
+    for key, value in shape.items():
+        if isinstance(value, documents.SubDocument):
+            subdocument = value
+            value = {
+                subkey: sqlalchemy.select([subval]).
+                where(subdocument.model.id == subdocument.foreign_key).
+                as_scalar()
+                for subkey, subval in flattened_shape(subdocument.shape,
+                                                      sep).items()
+            }
+
+        if isinstance(value, dict):
+            for subkey, subval in flattened_shape(value, sep).items():
+                flat[sep.join([key, subkey])] = subval
+        else:
+            flat[key] = value
+
+    return flat
+
+
+def arrow_type(sql_type):
+    if isinstance(sql_type, sqltypes.Boolean):
+        return pyarrow.bool_()
+    if isinstance(sql_type, sqltypes.Integer):
+        return pyarrow.int64()
+    if isinstance(sql_type, (sqltypes.Float, sqltypes.Numeric)):
+        return pyarrow.float64()
+
+    return pyarrow.string()
+
+
+GEOPARQUET_GEOMETRY_TYPES = {
+    'POINT': 'Point',
+    'MULTIPOINT': 'MultiPoint',
+    'LINESTRING': 'LineString',
+    'MULTILINESTRING': 'MultiLineString',
+    'POLYGON': 'Polygon',
+    'MULTIPOLYGON': 'MultiPolygon'
+}
+
+
+class GeoParquetSink(OutputSink):
+    """Sink de archivos GeoParquet (https://geoparquet.org/). Los campos
+    compuestos se aplanan de la misma forma que en los archivos CSV, y el tipo
+    de cada columna se toma de la forma del documento de la entidad (ver
+    EntityMixin.document_shape()). La geometría se escribe en formato WKB, en
+    la columna 'geometria'. Las entidades se escriben en grupos de filas de
+    'bulk_size' entidades. Requiere el módulo pyarrow.
+
+    Attributes:
+        _schema (pyarrow.Schema): Esquema del archivo.
+        _columns (dict): Valores de las entidades del grupo de filas actual,
+            por columna.
+        _flattener (RowFlattener): Aplanador de entidades del modelo.
+        _row_group_size (int): Cantidad de entidades por grupo de filas.
+        _writer (pyarrow.parquet.ParquetWriter): Escritor de archivos
+            Parquet.
+
+    """
+
+    format_name = 'GeoParquet'
+    uses_geometry = False
+
+    def __init__(self, *filename_parts):
+        super().__init__(*filename_parts)
+        self._schema = None
+        self._columns = None
+        self._flattener = None
+        self._row_group_size = None
+        self._writer = None
+
+    def configure(self, ctx):
+        if pyarrow is None:
+            raise RuntimeError('pyarrow is not installed.')
+
+        self._row_group_size = ctx.config.getint('etl', 'bulk_size')
+
+    def extra_columns(self, table):
+        return {documents.GEOMETRY_KEY: func.ST_AsBinary(table.geometria)}
+
+    def _build_schema(self, table):
+        shape = flattened_shape(documents.without_geometry(
+            table.document_shape()))
+
+        fields = [
+            pyarrow.field(key, arrow_type(shape[key].type))
+            for key in self._flattener.fields
+        ]
+        fields.append(pyarrow.field(documents.GEOMETRY_KEY,
+                                    pyarrow.binary()))
+
+        geo_metadata = {
+            'version': '1.0.0',
+            'primary_column': documents.GEOMETRY_KEY,
+            'columns': {
+                documents.GEOMETRY_KEY: {
+                    'encoding': 'WKB',
+                    'geometry_types': [GEOPARQUET_GEOMETRY_TYPES[
+                        table.geometria.type.geometry_type]]
+                }
+            }
+        }
+
+        return pyarrow.schema(fields, metadata={
+            'geo': json.dumps(geo_metadata)
+        })
+
+    def open(self, table, count, ctx):
+        dirname = os.path.dirname(self.filename)
+        if dirname:
+            utils.ensure_dir(dirname, ctx.fs)
+
+        self._flattener = row_flattener(table)
+        self._schema = self._build_schema(table)
+        self._columns = {name: [] for name in self._schema.names}
+        self._file = ctx.fs.open(self.filename, 'wb')
+        self._writer = pyarrow.parquet.ParquetWriter(self._file, self._schema,
+                                                     compression='zstd')
+
+    def _write_row_group(self):
+        if not self._columns[documents.GEOMETRY_KEY]:
+            return
+
+        self._writer.write_table(pyarrow.Table.from_pydict(
+            self._columns, schema=self._schema))
+
+        for values in self._columns.values():
+            values.clear()
+
+    def _end(self):
+        self._write_row_group()
+        self._writer.close()
+        self._writer = None
+
+    def write(self, entity_dict, extra):
+        wkb = extra[documents.GEOMETRY_KEY]
+
+        for name, value in zip(self._flattener.fields,
+                               self._flattener.flatten(entity_dict)):
+            self._columns[name].append(value)
+
+        self._columns[documents.GEOMETRY_KEY].append(
+            bytes(wkb) if wkb is not None else None)
+
+        if len(self._columns[documents.GEOMETRY_KEY]) >= \
+           self._row_group_size:
+            self._write_row_group()
 
-    Raises:
-        RuntimeError: cuando se alcanza la profundidad máxima. Se agrega esta
-            medida de seguridad en caso de tener un diccionario demasiado
-            profundo, o un diccionario con referencias cíclicas.
+
+class CreateOutputFilesStep(Step):
+    """Crea uno o más archivos con los contenidos de una tabla, recorriendo
+    la tabla una única vez.
+
+    Por cada entidad, se calcula to_dict() una única vez, y el resultado se
+    pasa a cada uno de los sinks (formatos de salida) especificados. La
+    geometría de las entidades solo se lee si algún sink la utiliza, y se
+    convierte a GeoJSON de acuerdo al GeoJSONSerializer configurado: en la
+    misma consulta (modo 'db'), o localmente (modo 'local').
+
+    Si el método de generación de documentos configurado es 'db', los sinks
+    que lo soportan (ver OutputSink.document_shape()) escriben documentos
+    generados directamente en la base de datos, en un recorrido aparte.
+
+    Attributes:
+        _table (type): Modelo de las entidades.
+        _sinks (list): Lista de OutputSink.
+        _criterion (sqlalchemy.sql.expression.ClauseElement): Filtro opcional
+            de entidades a incluir.
+
+    """
+
+    def __init__(self, table, sinks, name=None, criterion=None):
+        super().__init__(name or 'create_output_files', reads_input=False)
+        self._table = table
+        self._sinks = sinks
+        self._criterion = criterion
+
+    def _query(self, *columns, ctx):
+        query = ctx.session.query(*columns)
+        if self._criterion is not None:
+            query = query.filter(self._criterion)
+
+        return query
+
+    def _documents_backend(self, ctx):
+        backend = ctx.config.get('etl', 'documents_backend')
+        if backend not in documents.DOCUMENTS_BACKENDS:
+            raise ValueError('Invalid documents backend: {}.'.format(backend))
+
+        return backend
+
+    def _build_query(self, sinks, ctx):
+        serializer = GeoJSONSerializer.from_config(ctx.config)
+        uses_geometry = any(sink.uses_geometry for sink in sinks)
+        columns = [self._table]
+
+        # 'geometry' es el valor a pasar a to_dict() (ver
+        # models.add_geometry()). Si es None, el GeoJSON de cada entidad se
+        # calcula en la misma consulta (segunda columna). Si no, la segunda
+        # columna es un valor constante: una consulta de una única entidad
+        # retornaría entidades en lugar de tuplas.
+        if not uses_geometry:
+            geometry = False
+        elif serializer.mode == 'db':
+            geometry = None
+        else:
+            geometry = serializer
+
+        if geometry is None:
+            columns.append(serializer.sql_expression(self._table.geometria))
+        else:
+            columns.append(literal(False))
+
+        extra_names = []
+        for sink in sinks:
+            for name, column in sink.extra_columns(self._table).items():
+                if name not in extra_names:
+                    extra_names.append(name)
+                    columns.append(column.label(name))
+
+        query = self._query(*columns, ctx=ctx)
+        if not uses_geometry:
+            query = query.options(defer(self._table.geometria))
+
+        return query, geometry, extra_names
+
+    def _write_documents(self, sink, count, ctx):
+        sink.open(self._table, count, ctx)
+        try:
+            for doc in utils.pbar(documents.stream_documents(
+                    self._table, ctx, sink.document_shape(self._table),
+                    self._criterion), ctx, total=count):
+                sink.write_raw(doc)
+        finally:
+            sink.close()
+
+    def _write_entities(self, sinks, count, ctx):
+        bulk_size = ctx.config.getint('etl', 'bulk_size')
+        cached_session = ctx.cached_session()
+        # Los nombres de provincias, departamentos, etc. (y los campos de las
+        # calles de cuadras e intersecciones) se obtienen de mapas
+        # precalculados (ver context.NameLookup).
+        name_lookup = NameLookup(cached_session)
+        query, geometry, extra_names = self._build_query(sinks, ctx)
+
+        for sink in sinks:
+            sink.open(self._table, count, ctx)
+
+        try:
+            for row in utils.pbar(query.yield_per(bulk_size), ctx,
+                                  total=count):
+                entity_dict = row[0].to_dict(
+                    name_lookup, row[1] if geometry is None else geometry)
+                extra = dict(zip(extra_names, row[2:]))
+
+                for sink in sinks:
+                    sink.write(entity_dict, extra)
+        finally:
+            for sink in sinks:
+                sink.close()
+
+        cached_session.report_stats(ctx.report, self.name)
+
+    def _run_internal(self, data, ctx):
+        for sink in self._sinks:
+            sink.configure(ctx)
+
+        count = self._query(self._table, ctx=ctx).count()
+
+        if self._documents_backend(ctx) == 'db':
+            document_sinks = [
+                sink for sink in self._sinks
+                if sink.document_shape(self._table) is not None
+            ]
+        else:
+            document_sinks = []
+
+        entity_sinks = [
+            sink for sink in self._sinks if sink not in document_sinks
+        ]
+
+        for sink in document_sinks:
+            ctx.report.info('Generando documentos {} en la base de '
+                            'datos...'.format(sink.format_name))
+            self._write_documents(sink, count, ctx)
+
+        if entity_sinks:
+            ctx.report.info('Transformando entidades a {}...'.format(
+                ', '.join(sink.format_name for sink in entity_sinks)))
+            self._write_entities(entity_sinks, count, ctx)
+
+        for sink in self._sinks:
+            utils.set_output_count(sink.filename, count, ctx)
+
+        return [sink.filename for sink in self._sinks]
+
+
+class CreateOutputFileStep(CreateOutputFilesStep):
+    """Crea un archivo con los contenidos de una tabla, utilizando un único
+    sink. Retorna la ruta del archivo creado.
 
     """
-    if max_depth <= 0:
-        raise RuntimeError("Maximum depth reached")
 
-    for key in list(d.keys()):
-        v = d[key]
-        if isinstance(v, dict):
-            flatten_dict(v, max_depth - 1, sep)
+    def __init__(self, name, table, sink):
+        super().__init__(table, [sink], name=name)
+
+    def _run_internal(self, data, ctx):
+        return super()._run_internal(data, ctx)[0]
+
+
+class CreateJSONFileStep(CreateOutputFileStep):
+
+    def __init__(self, table, *filename_parts):
+        super().__init__('create_json_file', table,
+                         JSONSink(*filename_parts))
 
-            for subkey, subval in v.items():
-                flat_key = sep.join([key, subkey])
-                d[flat_key] = subval
 
-            del d[key]
+class CreateNDJSONFileStep(CreateOutputFileStep):
+
+    def __init__(self, table, *filename_parts):
+        super().__init__('create_ndjson_file', table,
+                         NDJSONSink(*filename_parts))
+
+
+class CreateGeoJSONFileStep(CreateOutputFileStep):
+
+    def __init__(self, table, *filename_parts,
+                 tolerance=None, caba_tolerance=None, simplify_mode=None):
+        super().__init__('create_geojson_file', table,
+                         GeoJSONSink(*filename_parts, tolerance=tolerance,
+                                     caba_tolerance=caba_tolerance,
+                                     simplify_mode=simplify_mode))
 
 
 class CreateCSVFileStep(CreateOutputFileStep):
 
     def __init__(self, table, *filename_parts):
-        super().__init__('create_csv_file', table, *filename_parts)
+        super().__init__('create_csv_file', table,
+                         CSVSink(*filename_parts))
+
+
+class CreateGeoParquetFileStep(CreateOutputFileStep):
+
+    def __init__(self, table, *filename_parts):
+        super().__init__('create_geoparquet_file', table,
+                         GeoParquetSink(*filename_parts))
+
+
+@functools.lru_cache(maxsize=None)
+def flatgeobuf_supported():
+    """Verifica si ogr2ogr está instalado y soporta el formato FlatGeobuf
+    (GDAL 3.1 o superior). El resultado se calcula una única vez por
+    proceso.
+
+    Returns:
+        bool: Verdadero si se pueden generar archivos FlatGeobuf.
+
+    """
+    if not shutil.which(OGR2OGR_CMD):
+        return False
+
+    result = subprocess.run([OGR2OGR_CMD, '--formats'],
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    return b'FlatGeobuf' in result.stdout
+
+
+class CreateFlatGeobufFileStep(Step):
+    """Crea un archivo FlatGeobuf (https://flatgeobuf.org/) con los
+    contenidos de una tabla, incluyendo su índice espacial (R-tree
+    empaquetado, ordenado por curva de Hilbert), utilizando ogr2ogr. Los
+    campos compuestos se aplanan de la misma forma que en los archivos CSV.
+
+    Como ogr2ogr utiliza su propia conexión a la base de datos, la
+    transacción actual se confirma (commit) antes de comenzar. Esto es
+    seguro ya que el paso se ubica al final de cada proceso (ver
+    optional_output_steps()), luego de que la tabla fue generada y validada
+    (ValidateTableSizeStep): los pasos siguientes solo generan y copian
+    archivos, por lo que una falla posterior no dejaría la base de datos en
+    un estado parcial.
+
+    Attributes:
+        _table (type): Modelo de las entidades.
+        _filename (str): Ruta del archivo a crear.
+        _db_config (dict): Configuración de la base de datos. Por defecto, se
+            utiliza la sección 'db' de la configuración del ETL.
+
+    """
+
+    def __init__(self, table, *filename_parts, db_config=None):
+        super().__init__('create_flatgeobuf_file', reads_input=False)
+        if not flatgeobuf_supported():
+            raise RuntimeError('ogr2ogr FlatGeobuf driver (GDAL >= 3.1) is '
+                               'not installed.')
+
+        self._table = table
+        self._filename = os.path.join(*filename_parts)
+        self._db_config = db_config
+
+    def _build_sql(self):
+        shape = flattened_shape(documents.without_geometry(
+            self._table.document_shape()))
 
-    def _write_file(self, query, count, cached_session, ctx):
-        first = ctx.session.query(self._table).first().to_dict(ctx.session)
-        del first['geometria']
-        flatten_dict(first)
-        fields = sorted(first.keys())
+        columns = [shape[key].label(key) for key in sorted(shape)]
+        # type_coerce() evita que GeoAlchemy2 convierta la geometría a WKB,
+        # para que ogr2ogr pueda detectar la columna de geometría.
+        columns.append(sqlalchemy.type_coerce(
+            self._table.geometria, sqltypes.NullType()).label(
+                documents.GEOMETRY_KEY))
+
+        query = sqlalchemy.select(columns).select_from(self._table.__table__)
+        return str(query.compile(dialect=postgresql.dialect(),
+                                 compile_kwargs={'literal_binds': True}))
+
+    def _run_internal(self, data, ctx):
+        ctx.session.commit()
 
         dirname = os.path.dirname(self._filename)
         if dirname:
             utils.ensure_dir(dirname, ctx.fs)
 
-        ctx.report.info('Transformando entidades a CSV...')
-        with ctx.fs.open(self._filename, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fields,
-                                    quoting=csv.QUOTE_NONNUMERIC)
-            writer.writeheader()
+        if ctx.fs.exists(self._filename):
+            ctx.fs.remove(self._filename)
+
+        filepath = ctx.fs.getsyspath(self._filename)
+        db_config = self._db_config or ctx.config['db']
+        layer_name = os.path.splitext(os.path.basename(self._filename))[0]
+
+        ctx.report.info('Generando archivo FlatGeobuf {}...'.format(
+            self._filename))
+        result = subprocess.run([
+            OGR2OGR_CMD, '-f', 'FlatGeobuf',
+            '-lco', 'SPATIAL_INDEX=YES',
+            '-nln', layer_name,
+            filepath,
+            pg_connection_string(db_config),
+            '-sql', self._build_sql()
+        ])
+
+        if result.returncode:
+            raise ProcessException(
+                'El comando ogr2ogr retornó codigo {}.'.format(
+                    result.returncode))
+
+        return self._filename
+
+
+class CreateESBulkFileStep(CreateOutputFileStep):
+
+    def __init__(self, table, *filename_parts, index=None):
+        super().__init__('create_es_bulk_file', table,
+                         ESBulkSink(*filename_parts, index=index))
+
+
+class CreateDeltaNDJSONFileStep(CreateOutputFileStep):
+    """Crea un archivo NDJSON de cambios (ver DeltaNDJSONSink) con las
+    entidades nuevas, modificadas y eliminadas por el paso de extracción de
+    entidades de la ejecución actual (ver
+    transformers.EntitiesExtractionStep).
 
-            for entity in utils.pbar(query, ctx, total=count):
-                entity_dict = entity.to_dict(cached_session)
-                del entity_dict['geometria']
-                flatten_dict(entity_dict)
+    Si el paso de extracción no fue ejecutado, la tabla no fue modificada,
+    por lo que se conserva el archivo de cambios anterior (o se crea un
+    archivo sin cambios, si no existe).
 
-                writer.writerow(entity_dict)
+    Notar que solo se incluyen los cambios de las filas de la tabla: si
+    cambia el nombre de una entidad referenciada (por ejemplo, una
+    provincia), los documentos que lo incluyen no se consideran modificados.
+
+    Attributes:
+        _extraction_step_name (str): Nombre del paso de extracción, bajo el
+            cual se encuentran sus datos en el reporte.
+
+    """
+
+    def __init__(self, table, extraction_step_name, *filename_parts):
+        super().__init__('create_delta_ndjson_file', table,
+                         DeltaNDJSONSink(*filename_parts))
+        self._extraction_step_name = extraction_step_name
+
+    def _run_internal(self, data, ctx):
+        sink = self._sinks[0]
+        report_data = ctx.report.get_data(self._extraction_step_name)
+
+        if 'changed_entities_ids' in report_data:
+            ids = report_data['new_entities_ids'] + \
+                report_data['changed_entities_ids']
+            sink.deleted_ids = report_data['deleted_entities_ids']
+        elif ctx.fs.exists(sink.filename):
+            ctx.report.info('No se encontraron datos de entidades '
+                            'modificadas en esta ejecución. Se conserva el '
+                            'archivo de cambios anterior.')
+            return sink.filename
+        else:
+            ids = []
+            sink.deleted_ids = []
+
+        ctx.report.info('Entidades nuevas o modificadas: {}'.format(
+            len(ids)))
+        ctx.report.info('Entidades eliminadas: {}'.format(
+            len(sink.deleted_ids)))
+
+        # Utilizar un único parámetro (array) en lugar de uno por ID.
+        self._criterion = self._table.id == any_(bindparam(
+            'delta_ids', ids, type_=postgresql.ARRAY(sqltypes.String)))
+
+        return super()._run_internal(data, ctx)
+
+
+def delta_steps(config, table, name, extraction_step_name):
+    """Retorna los pasos necesarios para crear y copiar el archivo NDJSON de
+    cambios de una tabla, si su generación está habilitada ('delta_output').
+    Si no, retorna una lista vacía.
+
+    Args:
+        config (configparser.ConfigParser): Configuración del ETL.
+        table (type): Modelo de las entidades.
+        name (str): Nombre base del archivo, sin extensión.
+        extraction_step_name (str): Nombre del paso de extracción de las
+            entidades.
+
+    Returns:
+        list: Lista de pasos.
+
+    """
+    if not config.getboolean('etl', 'delta_output'):
+        return []
+
+    filename = name + '.delta.ndjson'
+    return [
+        CreateDeltaNDJSONFileStep(table, extraction_step_name,
+                                  constants.ETL_VERSION, filename),
+        utils.CopyFileStep(config.get('etl', 'output_dest_path'), filename)
+    ]
+
+
+def es_bulk_steps(config, table, *filename_parts):
+    """Retorna los pasos necesarios para crear y copiar los archivos bulk de
+    Elasticsearch de una tabla, si su generación está habilitada
+    ('es_bulk_output'). Si no, retorna una lista vacía.
+
+    Args:
+        config (configparser.ConfigParser): Configuración del ETL.
+        table (type): Modelo de las entidades.
+        filename_parts (list): Partes de la ruta del directorio, sin sufijo.
+
+    Returns:
+        list: Lista de pasos.
+
+    """
+    if not config.getboolean('etl', 'es_bulk_output'):
+        return []
+
+    dirname = os.path.join(*filename_parts) + '_bulk'
+    return [
+        CreateESBulkFileStep(table, constants.ETL_VERSION, dirname),
+        utils.CopyDirectoryStep(config.get('etl', 'output_dest_path'),
+                                dirname)
+    ]
+
+
+def flatgeobuf_steps(config, table, *filename_parts):
+    """Retorna los pasos necesarios para crear y copiar el archivo FlatGeobuf
+    de una tabla, si la generación de archivos FlatGeobuf está habilitada
+    ('flatgeobuf_output'). Si no, retorna una lista vacía.
+
+    Args:
+        config (configparser.ConfigParser): Configuración del ETL.
+        table (type): Modelo de las entidades.
+        filename_parts (list): Partes de la ruta del archivo, sin extensión.
+
+    Returns:
+        list: Lista de pasos.
+
+    """
+    if not config.getboolean('etl', 'flatgeobuf_output'):
+        return []
+
+    filename = os.path.join(*filename_parts) + '.fgb'
+    return [
+        CreateFlatGeobufFileStep(table, constants.ETL_VERSION, filename),
+        utils.CopyFileStep(config.get('etl', 'output_dest_path'), filename)
+    ]
+
+
+def geoparquet_steps(config, table, *filename_parts):
+    """Retorna los pasos necesarios para crear y copiar el archivo GeoParquet
+    de una tabla, si la generación de archivos GeoParquet está habilitada
+    ('geoparquet_output'). Si no, retorna una lista vacía.
+
+    Args:
+        config (configparser.ConfigParser): Configuración del ETL.
+        table (type): Modelo de las entidades.
+        filename_parts (list): Partes de la ruta del archivo, sin extensión.
+
+    Returns:
+        list: Lista de pasos.
+
+    """
+    if not config.getboolean('etl', 'geoparquet_output'):
+        return []
+
+    filename = os.path.join(*filename_parts) + '.parquet'
+    return [
+        CreateGeoParquetFileStep(table, constants.ETL_VERSION, filename),
+        utils.CopyFileStep(config.get('etl', 'output_dest_path'), filename)
+    ]
+
+
+def optional_output_steps(config, table, name, flatgeobuf=False,
+                          extraction_step_name=None):
+    """Retorna los pasos de creación y copia de los formatos de salida
+    opcionales habilitados en la configuración (GeoParquet, bulk de
+    Elasticsearch, para capas de polígonos y líneas, FlatGeobuf, y para
+    entidades extraídas con transformers.EntitiesExtractionStep, NDJSON de
+    cambios).
+
+    Args:
+        config (configparser.ConfigParser): Configuración del ETL.
+        table (type): Modelo de las entidades.
+        name (str): Nombre base de los archivos, sin extensión.
+        flatgeobuf (bool): Verdadero si se debe incluir el formato
+            FlatGeobuf.
+        extraction_step_name (str): Nombre del paso de extracción de las
+            entidades, si se debe incluir el archivo NDJSON de cambios.
+
+    Returns:
+        list: Lista de pasos.
+
+    """
+    steps = geoparquet_steps(config, table, name)
+    steps.extend(es_bulk_steps(config, table, name))
+
+    if flatgeobuf:
+        steps.extend(flatgeobuf_steps(config, table, name))
+
+    if extraction_step_name:
+        steps.extend(delta_steps(config, table, name, extraction_step_name))
+
+    return steps
+
+
+class CreateShardedNDJSONFileStep(CreateNDJSONFileStep):
+    """Crea un archivo NDJSON utilizando varios procesos en paralelo.
+
+    La tabla se divide en rangos de IDs de tamaño similar (utilizando
+    percentile_disc()). Cada proceso escribe las entidades de un rango a un
+    archivo parcial, utilizando su propia conexión a la base de datos. Luego,
+    los archivos parciales se concatenan, luego de la línea de metadatos.
+
+    Como los procesos utilizan conexiones propias, la transacción actual se
+    confirma (commit) antes de comenzar, para que los datos sean visibles
+    para los mismos. Esto es seguro ya que el paso se ubica luego de que la
+    tabla fue generada y validada (ValidateTableSizeStep): los pasos
+    siguientes solo generan y copian archivos, por lo que una falla
+    posterior no dejaría la base de datos en un estado parcial. Los archivos
+    parciales se eliminan siempre, incluso si el paso falla.
+
+    Attributes:
+        _shards (int): Cantidad de rangos (y procesos) a utilizar. Si es menor
+            a 2, se crea el archivo en el proceso actual.
+
+    """
+
+    def __init__(self, table, *filename_parts, shards=1):
+        super().__init__(table, *filename_parts)
+        self._shards = shards
+
+    def _shard_bounds(self, ctx):
+        fractions = [i / self._shards for i in range(1, self._shards)]
+        bounds = ctx.session.query(
+            func.percentile_disc(array(fractions)).within_group(
+                self._table.id)
+        ).scalar() or []
+
+        bounds = sorted(set(bounds))
+        return list(zip([None] + bounds, bounds + [None]))
+
+    def _run_internal(self, data, ctx):
+        if self._shards < 2:
+            return super()._run_internal(data, ctx)
+
+        ctx.session.commit()
+        count = ctx.session.query(self._table).count()
+        shard_bounds = self._shard_bounds(ctx)
+        filename = self._sinks[0].filename
+
+        dirname = os.path.dirname(filename)
+        if dirname:
+            utils.ensure_dir(dirname, ctx.fs)
+
+        config = {
+            section: dict(ctx.config[section])
+            for section in ctx.config.sections()
+        }
+        part_filenames = [
+            '{}.part{}'.format(filename, i) for i in range(len(shard_bounds))
+        ]
+
+        ctx.report.info('Transformando entidades a NDJSON ({} rangos en '
+                        'paralelo)...'.format(len(shard_bounds)))
+
+        try:
+            shard_counts = self._write_shards(part_filenames, shard_bounds,
+                                              config, ctx)
+            if sum(shard_counts) != count:
+                raise ProcessException(
+                    'Se escribieron {} entidades, pero la tabla contiene '
+                    '{}.'.format(sum(shard_counts), count))
+
+            self._concat_shards(filename, part_filenames, count, ctx)
+        finally:
+            for part_filename in part_filenames:
+                if ctx.fs.exists(part_filename):
+                    ctx.fs.remove(part_filename)
+
+        utils.set_output_count(filename, count, ctx)
+        return filename
+
+    def _write_shards(self, part_filenames, shard_bounds, config, ctx):
+        mp_context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(shard_bounds),
+                                 mp_context=mp_context) as executor:
+            futures = [
+                executor.submit(write_ndjson_shard, self._table,
+                                ctx.engine.url, config,
+                                ctx.fs.getsyspath('/'), ctx.mode,
+                                part_filename, lower, upper)
+                for part_filename, (lower, upper)
+                in zip(part_filenames, shard_bounds)
+            ]
+
+            return [
+                future.result()
+                for future in utils.pbar(futures, ctx, total=len(futures))
+            ]
+
+    def _concat_shards(self, filename, part_filenames, count, ctx):
+        with compression.open_output_file(filename, ctx) as f:
+            f.write(NDJSON_ENCODER.dumps(ndjson_metadata(count)))
+            f.write(NDJSON_LINE_SEPARATOR)
+
+            for part_filename in part_filenames:
+                with ctx.fs.open(part_filename) as part:
+                    shutil.copyfileobj(part, f)
+
+
+def write_ndjson_shard(table, engine_url, config, fs_root, mode, filename,
+                       lower, upper):
+    """Escribe las entidades de un rango de IDs a un archivo NDJSON parcial,
+    sin línea de metadatos. Se ejecuta en un proceso separado (ver
+    CreateShardedNDJSONFileStep).
+
+    Args:
+        table (type): Modelo de las entidades.
+        engine_url (sqlalchemy.engine.url.URL): URL de la base de datos.
+        config (dict): Configuración del ETL, por sección.
+        fs_root (str): Ruta raíz del sistema de archivos del ETL.
+        mode (str): Modo de ejecución.
+        filename (str): Ruta del archivo parcial.
+        lower (str): ID mínimo (inclusivo) del rango, o None.
+        upper (str): ID máximo (exclusivo) del rango, o None.
+
+    Returns:
+        int: Cantidad de entidades escritas.
+
+    """
+    parser = configparser.ConfigParser()
+    parser.read_dict(config)
+    # Solo el archivo final debe ser comprimido.
+    parser.set('etl', 'output_compression', '')
+    engine = sqlalchemy.create_engine(engine_url)
+    report = Report(logging.getLogger('georef-ar-etl'))
+    ctx = Context(parser, OSFS(fs_root), engine, report, mode)
+
+    criteria = []
+    if lower is not None:
+        criteria.append(table.id >= lower)
+    if upper is not None:
+        criteria.append(table.id < upper)
+
+    sink = NDJSONSink(filename, metadata=False)
+    step = CreateOutputFilesStep(table, [sink], criterion=and_(*criteria))
+
+    try:
+        step.run(None, ctx)
+        return sink.lines_written
+    finally:
+        ctx.session.close()
+        engine.dispose()
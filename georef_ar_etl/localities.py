@@ -5,6 +5,8 @@ from .models import Province, Department, Municipality, CensusLocality,\
 from .settlements import SettlementsExtractionStep
 from . import loaders, geometry, utils, constants
 
+LOCALITIES_EXTRACTION_STEP_NAME = 'localities_extraction'
+
 
 def create_process(config):
     output_path = config.get('etl', 'output_dest_path')
@@ -25,15 +27,15 @@ def create_process(config):
         utils.ValidateTableSizeStep(
             target_size=config.getint('etl', 'localities_target_size'),
             op='ge'),
-        CompositeStep([
-            loaders.CreateJSONFileStep(Locality, constants.ETL_VERSION,
-                                       constants.LOCALITIES + '.json'),
-            loaders.CreateGeoJSONFileStep(Locality, constants.ETL_VERSION,
-                                          constants.LOCALITIES + '.geojson'),
-            loaders.CreateCSVFileStep(Locality, constants.ETL_VERSION,
-                                      constants.LOCALITIES + '.csv'),
-            loaders.CreateNDJSONFileStep(Locality, constants.ETL_VERSION,
-                                         constants.LOCALITIES + '.ndjson')
+        loaders.CreateOutputFilesStep(Locality, [
+            loaders.JSONSink(constants.ETL_VERSION,
+                             constants.LOCALITIES + '.json'),
+            loaders.GeoJSONSink(constants.ETL_VERSION,
+                                constants.LOCALITIES + '.geojson'),
+            loaders.CSVSink(constants.ETL_VERSION,
+                            constants.LOCALITIES + '.csv'),
+            loaders.NDJSONSink(constants.ETL_VERSION,
+                               constants.LOCALITIES + '.ndjson')
         ]),
         CompositeStep([
             utils.CopyFileStep(output_path, constants.LOCALITIES + '.json'),
@@ -41,12 +43,14 @@ def create_process(config):
             utils.CopyFileStep(output_path, constants.LOCALITIES + '.csv'),
             utils.CopyFileStep(output_path, constants.LOCALITIES + '.ndjson')
         ])
-    ])
+    ] + loaders.optional_output_steps(
+        config, Locality, constants.LOCALITIES,
+        extraction_step_name=LOCALITIES_EXTRACTION_STEP_NAME))
 
 
 class LocalitiesExtractionStep(SettlementsExtractionStep):
     def __init__(self):
-        super().__init__('localities_extraction', Locality)
+        super().__init__(LOCALITIES_EXTRACTION_STEP_NAME, Locality)
 
     def _patch_tmp_entities(self, tmp_settlements, ctx):
         # No parchear la tabla tmp_localidades de nuevo.
@@ -7,11 +7,14 @@ distintas entidades geográficas.
 
 # pylint: disable=no-self-argument
 import json
-from sqlalchemy import Column, String, Float, Integer, ForeignKey
+from sqlalchemy import Column, String, Float, Integer, ForeignKey, case
+from sqlalchemy.sql import select
 from sqlalchemy.orm import validates, relationship
 from sqlalchemy.ext.declarative import declarative_base, declared_attr
 from geoalchemy2 import Geometry
 from .exceptions import ValidationException
+from .documents import SubDocument
+from .geometry import GeoJSONSerializer
 from . import constants
 
 SRID = 4326
@@ -20,6 +23,8 @@ SRID = 4326
 
 Base = declarative_base()
 
+DEFAULT_GEOJSON_SERIALIZER = GeoJSONSerializer()
+
 
 def get_relationship(model_name, cascade='all, delete', passive_deletes=True,
                      **kwargs):
@@ -45,6 +50,78 @@ def get_relationship(model_name, cascade='all, delete', passive_deletes=True,
                         **kwargs)
 
 
+def name_subquery(model, foreign_key):
+    """Construye una subconsulta SQL correlacionada que retorna el nombre de
+    una entidad referenciada mediante una Foreign Key.
+
+    Args:
+        model (type): Modelo de la entidad referenciada.
+        foreign_key (sqlalchemy.Column): Columna que contiene el ID de la
+            entidad referenciada.
+
+    Returns:
+        sqlalchemy.sql.expression.ScalarSelect: Subconsulta del nombre.
+
+    """
+    return select([model.nombre]).where(model.id == foreign_key).as_scalar()
+
+
+def entity_name(session, model, entity_id):
+    """Retorna el nombre de una entidad referenciada por otra. Si la sesión
+    provee nombres precalculados (ver context.NameLookup), se utilizan los
+    mismos; de lo contrario, se carga la entidad completa.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+        model (type): Modelo de la entidad referenciada.
+        entity_id (str): ID de la entidad referenciada.
+
+    Returns:
+        str: Nombre de la entidad.
+
+    """
+    lookup = getattr(session, 'entity_name', None)
+    if lookup is not None:
+        return lookup(model, entity_id)
+
+    return session.query(model).get(entity_id).nombre
+
+
+def add_geometry(entity_dict, entity, session, geometry=True):
+    """Agrega la geometría de una entidad, en formato GeoJSON, al campo
+    'geometria' de su representación como diccionario.
+
+    Args:
+        entity_dict (dict): Entidad en forma de diccionario.
+        entity (object): Entidad con campo 'geometria'.
+        session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+        geometry (bool, str, GeoJSONSerializer): Si es True, se convierte la
+            geometría utilizando un GeoJSONSerializer por defecto (en la base
+            de datos). Si es un GeoJSONSerializer, se utiliza el mismo para
+            convertir la geometría. Si es False, no se agrega el campo
+            'geometria'. Si es un 'str', se utiliza como GeoJSON ya calculado
+            (por ejemplo, seleccionado con ST_AsGeoJSON() junto a la
+            entidad).
+
+    Returns:
+        dict: Entidad en forma de diccionario.
+
+    """
+    if geometry is False:
+        return entity_dict
+
+    if geometry is True:
+        geometry = DEFAULT_GEOJSON_SERIALIZER
+
+    if isinstance(geometry, GeoJSONSerializer):
+        entity_dict['geometria'] = geometry.serialize(entity.geometria,
+                                                      session)
+    else:
+        entity_dict['geometria'] = json.loads(geometry)
+
+    return entity_dict
+
+
 class EntityMixin:
     """Modelo base para todos los modelos utilizados en el ETL.
 
@@ -101,7 +178,7 @@ class EntityMixin:
 
         return name
 
-    def to_dict(self, session):
+    def to_dict(self, session, geometry=True):
         """Retorna una representación de la entidad como diccionario 'dict'.
         Los campos compuestos (que contienen varios valores) se representan
         también como diccionarios de varios valores. El resultado puede ser
@@ -109,6 +186,8 @@ class EntityMixin:
 
         Args:
             session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+            geometry (bool, str, GeoJSONSerializer): Geometría a incluir en el
+                campo 'geometria' (ver add_geometry()).
 
         Returns:
             dict: Entidad en forma de diccionario.
@@ -116,6 +195,20 @@ class EntityMixin:
         """
         raise NotImplementedError()
 
+    @classmethod
+    def document_shape(cls):
+        """Retorna la forma del documento de la entidad, equivalente al
+        resultado de to_dict(), donde cada valor es una expresión SQL, un
+        diccionario (para campos compuestos) o un SubDocument. Se utiliza para
+        generar los documentos directamente en la base de datos (ver
+        documents.py).
+
+        Returns:
+            dict: Forma del documento.
+
+        """
+        raise NotImplementedError()
+
 
 class InProvinceMixin:
     """Define atributos y funciones de entidades que están contenidas dentro de
@@ -146,7 +239,7 @@ class InProvinceMixin:
             str: Nombre de la provincia.
 
         """
-        return session.query(Province).get(self.provincia_id).nombre
+        return entity_name(session, Province, self.provincia_id)
 
 
 class InNullableDepartmentMixin:
@@ -197,7 +290,7 @@ class InNullableDepartmentMixin:
         if not self.departamento_id:
             return None
 
-        return session.query(Department).get(self.departamento_id).nombre
+        return entity_name(session, Department, self.departamento_id)
 
 
 class InDepartmentMixin:
@@ -230,7 +323,7 @@ class InDepartmentMixin:
             str: Nombre del departamento.
 
         """
-        return session.query(Department).get(self.departamento_id).nombre
+        return entity_name(session, Department, self.departamento_id)
 
 
 class InNullableMunicipalityMixin:
@@ -266,7 +359,7 @@ class InNullableMunicipalityMixin:
         if not self.municipio_id:
             return None
 
-        return session.query(Municipality).get(self.municipio_id).nombre
+        return entity_name(session, Municipality, self.municipio_id)
 
 
 class InCensusLocalityMixin:
@@ -318,8 +411,8 @@ class InCensusLocalityMixin:
             str: Nombre de la localidad censal.
 
         """
-        return session.query(CensusLocality).get(
-            self.localidad_censal_id).nombre
+        return entity_name(session, CensusLocality,
+                           self.localidad_censal_id)
 
 
 class InNullableCensusLocalityMixin:
@@ -355,8 +448,8 @@ class InNullableCensusLocalityMixin:
         if not self.localidad_censal_id:
             return None
 
-        return session.query(CensusLocality).get(
-            self.localidad_censal_id).nombre
+        return entity_name(session, CensusLocality,
+                           self.localidad_censal_id)
 
 
 class Province(Base, EntityMixin):
@@ -392,7 +485,7 @@ class Province(Base, EntityMixin):
     localidades = get_relationship('Locality')
     calles = get_relationship('Street')
 
-    def to_dict(self, session):
+    def to_dict(self, session, geometry=True):
         """Retorna una representación de la entidad como diccionario 'dict'.
         Los campos compuestos (que contienen varios valores) se representan
         también como diccionarios de varios valores. El resultado puede ser
@@ -400,12 +493,14 @@ class Province(Base, EntityMixin):
 
         Args:
             session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+            geometry (bool, str, GeoJSONSerializer): Geometría a incluir en el
+                campo 'geometria' (ver add_geometry()).
 
         Returns:
             dict: Entidad en forma de diccionario.
 
         """
-        return {
+        entity_dict = {
             'id': self.id,
             'nombre': self.nombre,
             'nombre_completo': self.nombre_completo,
@@ -416,9 +511,33 @@ class Province(Base, EntityMixin):
                 'lat': self.lat
             },
             'iso_id': self.iso_id,
-            'iso_nombre': self.iso_nombre,
-            'geometria': json.loads(session.scalar(
-                self.geometria.ST_AsGeoJSON()))
+            'iso_nombre': self.iso_nombre
+        }
+
+        return add_geometry(entity_dict, self, session, geometry)
+
+    @classmethod
+    def document_shape(cls):
+        """Retorna la forma del documento de la entidad (ver
+        EntityMixin.document_shape()).
+
+        Returns:
+            dict: Forma del documento.
+
+        """
+        return {
+            'id': cls.id,
+            'nombre': cls.nombre,
+            'nombre_completo': cls.nombre_completo,
+            'fuente': cls.fuente,
+            'categoria': cls.categoria,
+            'centroide': {
+                'lon': cls.lon,
+                'lat': cls.lat
+            },
+            'iso_id': cls.iso_id,
+            'iso_nombre': cls.iso_nombre,
+            'geometria': cls.geometria
         }
 
 
@@ -453,7 +572,7 @@ class Department(Base, EntityMixin, InProvinceMixin):
     localidades = get_relationship('Locality')
     calles = get_relationship('Street')
 
-    def to_dict(self, session):
+    def to_dict(self, session, geometry=True):
         """Retorna una representación de la entidad como diccionario 'dict'.
         Los campos compuestos (que contienen varios valores) se representan
         también como diccionarios de varios valores. El resultado puede ser
@@ -461,12 +580,14 @@ class Department(Base, EntityMixin, InProvinceMixin):
 
         Args:
             session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+            geometry (bool, str, GeoJSONSerializer): Geometría a incluir en el
+                campo 'geometria' (ver add_geometry()).
 
         Returns:
             dict: Entidad en forma de diccionario.
 
         """
-        return {
+        entity_dict = {
             'id': self.id,
             'nombre': self.nombre,
             'nombre_completo': self.nombre_completo,
@@ -480,9 +601,36 @@ class Department(Base, EntityMixin, InProvinceMixin):
             'centroide': {
                 'lon': self.lon,
                 'lat': self.lat
+            }
+        }
+
+        return add_geometry(entity_dict, self, session, geometry)
+
+    @classmethod
+    def document_shape(cls):
+        """Retorna la forma del documento de la entidad (ver
+        EntityMixin.document_shape()).
+
+        Returns:
+            dict: Forma del documento.
+
+        """
+        return {
+            'id': cls.id,
+            'nombre': cls.nombre,
+            'nombre_completo': cls.nombre_completo,
+            'provincia': {
+                'id': cls.provincia_id,
+                'nombre': name_subquery(Province, cls.provincia_id),
+                'interseccion': cls.provincia_interseccion,
+            },
+            'fuente': cls.fuente,
+            'categoria': cls.categoria,
+            'centroide': {
+                'lon': cls.lon,
+                'lat': cls.lat
             },
-            'geometria': json.loads(session.scalar(
-                self.geometria.ST_AsGeoJSON()))
+            'geometria': cls.geometria
         }
 
 
@@ -515,7 +663,7 @@ class Municipality(Base, EntityMixin, InProvinceMixin):
     asentamientos = get_relationship('Settlement')
     localidades = get_relationship('Locality')
 
-    def to_dict(self, session):
+    def to_dict(self, session, geometry=True):
         """Retorna una representación de la entidad como diccionario 'dict'.
         Los campos compuestos (que contienen varios valores) se representan
         también como diccionarios de varios valores. El resultado puede ser
@@ -523,12 +671,14 @@ class Municipality(Base, EntityMixin, InProvinceMixin):
 
         Args:
             session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+            geometry (bool, str, GeoJSONSerializer): Geometría a incluir en el
+                campo 'geometria' (ver add_geometry()).
 
         Returns:
             dict: Entidad en forma de diccionario.
 
         """
-        return {
+        entity_dict = {
             'id': self.id,
             'nombre': self.nombre,
             'nombre_completo': self.nombre_completo,
@@ -542,9 +692,36 @@ class Municipality(Base, EntityMixin, InProvinceMixin):
             'centroide': {
                 'lon': self.lon,
                 'lat': self.lat
+            }
+        }
+
+        return add_geometry(entity_dict, self, session, geometry)
+
+    @classmethod
+    def document_shape(cls):
+        """Retorna la forma del documento de la entidad (ver
+        EntityMixin.document_shape()).
+
+        Returns:
+            dict: Forma del documento.
+
+        """
+        return {
+            'id': cls.id,
+            'nombre': cls.nombre,
+            'nombre_completo': cls.nombre_completo,
+            'provincia': {
+                'id': cls.provincia_id,
+                'nombre': name_subquery(Province, cls.provincia_id),
+                'interseccion': cls.provincia_interseccion,
             },
-            'geometria': json.loads(session.scalar(
-                self.geometria.ST_AsGeoJSON()))
+            'fuente': cls.fuente,
+            'categoria': cls.categoria,
+            'centroide': {
+                'lon': cls.lon,
+                'lat': cls.lat
+            },
+            'geometria': cls.geometria
         }
 
 
@@ -564,7 +741,7 @@ class SettlementMixin(EntityMixin, InProvinceMixin, InNullableDepartmentMixin,
     lat = Column(Float, nullable=False)
     geometria = Column(Geometry('MULTIPOINT', srid=SRID), nullable=False)
 
-    def to_dict(self, session):
+    def to_dict(self, session, geometry=True):
         """Retorna una representación de la entidad como diccionario 'dict'.
         Los campos compuestos (que contienen varios valores) se representan
         también como diccionarios de varios valores. El resultado puede ser
@@ -572,12 +749,14 @@ class SettlementMixin(EntityMixin, InProvinceMixin, InNullableDepartmentMixin,
 
         Args:
             session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+            geometry (bool, str, GeoJSONSerializer): Geometría a incluir en el
+                campo 'geometria' (ver add_geometry()).
 
         Returns:
             dict: Entidad en forma de diccionario.
 
         """
-        return {
+        entity_dict = {
             'id': self.id,
             'nombre': self.nombre,
             'fuente': self.fuente,
@@ -601,9 +780,47 @@ class SettlementMixin(EntityMixin, InProvinceMixin, InNullableDepartmentMixin,
             'centroide': {
                 'lon': self.lon,
                 'lat': self.lat
+            }
+        }
+
+        return add_geometry(entity_dict, self, session, geometry)
+
+    @classmethod
+    def document_shape(cls):
+        """Retorna la forma del documento de la entidad (ver
+        EntityMixin.document_shape()).
+
+        Returns:
+            dict: Forma del documento.
+
+        """
+        return {
+            'id': cls.id,
+            'nombre': cls.nombre,
+            'fuente': cls.fuente,
+            'provincia': {
+                'id': cls.provincia_id,
+                'nombre': name_subquery(Province, cls.provincia_id)
             },
-            'geometria': json.loads(session.scalar(
-                self.geometria.ST_AsGeoJSON()))
+            'departamento': {
+                'id': cls.departamento_id,
+                'nombre': name_subquery(Department, cls.departamento_id)
+            },
+            'municipio': {
+                'id': cls.municipio_id,
+                'nombre': name_subquery(Municipality, cls.municipio_id)
+            },
+            'localidad_censal': {
+                'id': cls.localidad_censal_id,
+                'nombre': name_subquery(CensusLocality,
+                                        cls.localidad_censal_id)
+            },
+            'categoria': case(constants.BAHRA_TYPES, value=cls.categoria),
+            'centroide': {
+                'lon': cls.lon,
+                'lat': cls.lat
+            },
+            'geometria': cls.geometria
         }
 
 
@@ -743,7 +960,7 @@ class CensusLocality(Base, EntityMixin, InProvinceMixin,
 
         return function
 
-    def to_dict(self, session):
+    def to_dict(self, session, geometry=True):
         """Retorna una representación de la entidad como diccionario 'dict'.
         Los campos compuestos (que contienen varios valores) se representan
         también como diccionarios de varios valores. El resultado puede ser
@@ -751,12 +968,14 @@ class CensusLocality(Base, EntityMixin, InProvinceMixin,
 
         Args:
             session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+            geometry (bool, str, GeoJSONSerializer): Geometría a incluir en el
+                campo 'geometria' (ver add_geometry()).
 
         Returns:
             dict: Entidad en forma de diccionario.
 
         """
-        return {
+        entity_dict = {
             'id': self.id,
             'nombre': self.nombre,
             'fuente': self.fuente,
@@ -777,9 +996,43 @@ class CensusLocality(Base, EntityMixin, InProvinceMixin,
             'centroide': {
                 'lon': self.lon,
                 'lat': self.lat
+            }
+        }
+
+        return add_geometry(entity_dict, self, session, geometry)
+
+    @classmethod
+    def document_shape(cls):
+        """Retorna la forma del documento de la entidad (ver
+        EntityMixin.document_shape()).
+
+        Returns:
+            dict: Forma del documento.
+
+        """
+        return {
+            'id': cls.id,
+            'nombre': cls.nombre,
+            'fuente': cls.fuente,
+            'provincia': {
+                'id': cls.provincia_id,
+                'nombre': name_subquery(Province, cls.provincia_id)
+            },
+            'departamento': {
+                'id': cls.departamento_id,
+                'nombre': name_subquery(Department, cls.departamento_id)
             },
-            'geometria': json.loads(session.scalar(
-                self.geometria.ST_AsGeoJSON()))
+            'municipio': {
+                'id': cls.municipio_id,
+                'nombre': name_subquery(Municipality, cls.municipio_id)
+            },
+            'categoria': case(constants.BAHRA_TYPES, value=cls.categoria),
+            'funcion': cls.funcion,
+            'centroide': {
+                'lon': cls.lon,
+                'lat': cls.lat
+            },
+            'geometria': cls.geometria
         }
 
 
@@ -819,6 +1072,26 @@ class DoorNumberedMixin:
             }
         }
 
+    @classmethod
+    def door_numbers_shape(cls):
+        """Retorna la forma de documento de las alturas (ver
+        door_numbers_dict()).
+
+        Returns:
+            dict: Forma del documento de alturas.
+
+        """
+        return {
+            'inicio': {
+                'derecha': cls.inicio_derecha,
+                'izquierda': cls.inicio_izquierda
+            },
+            'fin': {
+                'derecha': cls.fin_derecha,
+                'izquierda': cls.fin_izquierda
+            }
+        }
+
 
 class Street(Base, EntityMixin, InProvinceMixin, InDepartmentMixin,
              InCensusLocalityMixin, DoorNumberedMixin):
@@ -872,7 +1145,36 @@ class Street(Base, EntityMixin, InProvinceMixin, InDepartmentMixin,
             'categoria': self.categoria
         }
 
-    def to_dict(self, session):
+    @classmethod
+    def document_shape_simple(cls):
+        """Retorna la forma del documento parcial de la entidad (ver
+        to_dict_simple()).
+
+        Returns:
+            dict: Forma del documento parcial.
+
+        """
+        return {
+            'id': cls.id,
+            'nombre': cls.nombre,
+            'fuente': cls.fuente,
+            'provincia': {
+                'id': cls.provincia_id,
+                'nombre': name_subquery(Province, cls.provincia_id)
+            },
+            'departamento': {
+                'id': cls.departamento_id,
+                'nombre': name_subquery(Department, cls.departamento_id)
+            },
+            'localidad_censal': {
+                'id': cls.localidad_censal_id,
+                'nombre': name_subquery(CensusLocality,
+                                        cls.localidad_censal_id)
+            },
+            'categoria': cls.categoria
+        }
+
+    def to_dict(self, session, geometry=True):
         """Retorna una representación de la entidad como diccionario 'dict'.
         Los campos compuestos (que contienen varios valores) se representan
         también como diccionarios de varios valores. El resultado puede ser
@@ -880,6 +1182,8 @@ class Street(Base, EntityMixin, InProvinceMixin, InDepartmentMixin,
 
         Args:
             session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+            geometry (bool, str, GeoJSONSerializer): Geometría a incluir en el
+                campo 'geometria' (ver add_geometry()).
 
         Returns:
             dict: Entidad en forma de diccionario.
@@ -888,10 +1192,52 @@ class Street(Base, EntityMixin, InProvinceMixin, InDepartmentMixin,
         base = self.to_dict_simple(session)
 
         base['altura'] = self.door_numbers_dict()
-        base['geometria'] = json.loads(session.scalar(
-            self.geometria.ST_AsGeoJSON()))
 
-        return base
+        return add_geometry(base, self, session, geometry)
+
+    @classmethod
+    def document_shape(cls):
+        """Retorna la forma del documento de la entidad (ver
+        EntityMixin.document_shape()).
+
+        Returns:
+            dict: Forma del documento.
+
+        """
+        shape = cls.document_shape_simple()
+        shape['altura'] = cls.door_numbers_shape()
+        shape['geometria'] = cls.geometria
+
+        return shape
+
+
+# Campos de Street utilizados por to_dict_simple() (además del ID).
+STREET_SIMPLE_FIELDS = ('nombre', 'fuente', 'categoria', 'provincia_id',
+                        'departamento_id', 'localidad_censal_id')
+
+
+def street_dict_simple(session, street_id):
+    """Retorna la representación parcial de una calle referenciada por otra
+    entidad (ver Street.to_dict_simple()). Si la sesión provee campos
+    precalculados (ver context.NameLookup), se utilizan los mismos; de lo
+    contrario, se carga la calle completa.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+        street_id (str): ID de la calle.
+
+    Returns:
+        dict: Datos de la calle en forma de diccionario.
+
+    """
+    lookup = getattr(session, 'entity_fields', None)
+    if lookup is None:
+        return session.query(Street).get(street_id).to_dict_simple(session)
+
+    # La calle se construye sin geometría y no se agrega a la sesión.
+    street = Street(id=street_id, **lookup(Street, street_id,
+                                           STREET_SIMPLE_FIELDS))
+    return street.to_dict_simple(session)
 
 
 class StreetBlock(Base, DoorNumberedMixin):
@@ -914,7 +1260,7 @@ class StreetBlock(Base, DoorNumberedMixin):
                       nullable=False)
     geometria = Column(Geometry('MULTILINESTRING', srid=SRID), nullable=False)
 
-    def to_dict(self, session):
+    def to_dict(self, session, geometry=True):
         """Retorna una representación de la entidad como diccionario 'dict'.
         Los campos compuestos (que contienen varios valores) se representan
         también como diccionarios de varios valores. El resultado puede ser
@@ -922,19 +1268,36 @@ class StreetBlock(Base, DoorNumberedMixin):
 
         Args:
             session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+            geometry (bool, str, GeoJSONSerializer): Geometría a incluir en el
+                campo 'geometria' (ver add_geometry()).
 
         Returns:
             dict: Entidad en forma de diccionario.
 
         """
-        street = session.query(Street).get(self.calle_id)
+        entity_dict = {
+            'id': self.id,
+            'calle': street_dict_simple(session, self.calle_id),
+            'altura': self.door_numbers_dict()
+        }
+
+        return add_geometry(entity_dict, self, session, geometry)
+
+    @classmethod
+    def document_shape(cls):
+        """Retorna la forma del documento de la entidad (ver
+        EntityMixin.document_shape()).
+
+        Returns:
+            dict: Forma del documento.
 
+        """
         return {
-            'id': self.id,
-            'calle': street.to_dict_simple(session),
-            'altura': self.door_numbers_dict(),
-            'geometria': json.loads(session.scalar(
-                self.geometria.ST_AsGeoJSON()))
+            'id': cls.id,
+            'calle': SubDocument(Street, cls.calle_id,
+                                 Street.document_shape_simple()),
+            'altura': cls.door_numbers_shape(),
+            'geometria': cls.geometria
         }
 
 
@@ -961,7 +1324,7 @@ class Intersection(Base):
                         nullable=False)
     geometria = Column(Geometry('POINT', srid=SRID), nullable=False)
 
-    def to_dict(self, session):
+    def to_dict(self, session, geometry=True):
         """Retorna una representación de la entidad como diccionario 'dict'.
         Los campos compuestos (que contienen varios valores) se representan
         también como diccionarios de varios valores. El resultado puede ser
@@ -969,18 +1332,35 @@ class Intersection(Base):
 
         Args:
             session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+            geometry (bool, str, GeoJSONSerializer): Geometría a incluir en el
+                campo 'geometria' (ver add_geometry()).
 
         Returns:
             dict: Entidad en forma de diccionario.
 
         """
-        street_a = session.query(Street).get(self.calle_a_id)
-        street_b = session.query(Street).get(self.calle_b_id)
+        entity_dict = {
+            'id': self.id,
+            'calle_a': street_dict_simple(session, self.calle_a_id),
+            'calle_b': street_dict_simple(session, self.calle_b_id)
+        }
+
+        return add_geometry(entity_dict, self, session, geometry)
 
+    @classmethod
+    def document_shape(cls):
+        """Retorna la forma del documento de la entidad (ver
+        EntityMixin.document_shape()).
+
+        Returns:
+            dict: Forma del documento.
+
+        """
         return {
-            'id': self.id,
-            'calle_a': street_a.to_dict_simple(session),
-            'calle_b': street_b.to_dict_simple(session),
-            'geometria': json.loads(session.scalar(
-                self.geometria.ST_AsGeoJSON()))
+            'id': cls.id,
+            'calle_a': SubDocument(Street, cls.calle_a_id,
+                                   Street.document_shape_simple()),
+            'calle_b': SubDocument(Street, cls.calle_b_id,
+                                   Street.document_shape_simple()),
+            'geometria': cls.geometria
         }
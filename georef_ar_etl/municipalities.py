@@ -4,6 +4,8 @@ from .models import Province, Municipality
 from . import extractors, transformers, loaders, geometry, utils, constants
 from . import patch
 
+MUNICIPALITIES_EXTRACTION_STEP_NAME = 'municipalities_extraction'
+
 
 def create_process(config):
     output_path = config.get('etl', 'output_dest_path')
@@ -41,23 +43,23 @@ def create_process(config):
         utils.ValidateTableSizeStep(
             target_size=config.getint('etl', 'municipalities_target_size'),
             op='ge'),
-        CompositeStep([
-            loaders.CreateJSONFileStep(
-                Municipality, constants.ETL_VERSION,
-                constants.MUNICIPALITIES + '.json'),
-            loaders.CreateGeoJSONFileStep(
-                Municipality, constants.ETL_VERSION,
+        loaders.CreateOutputFilesStep(Municipality, [
+            loaders.JSONSink(constants.ETL_VERSION,
+                             constants.MUNICIPALITIES + '.json'),
+            loaders.GeoJSONSink(
+                constants.ETL_VERSION,
                 constants.MUNICIPALITIES + '.geojson',
                 tolerance=config.getfloat("etl", "geojson_tolerance"),
-                caba_tolerance=config.getfloat("etl", "geojson_caba_tolerance")
+                caba_tolerance=config.getfloat("etl",
+                                               "geojson_caba_tolerance")
+                # La capa de municipios no es una cobertura válida (ver
+                # geometry.get_entity_at_point()), por lo que no se utiliza
+                # 'geojson_polygons_simplify_mode'.
             ),
-            loaders.CreateCSVFileStep(
-                Municipality, constants.ETL_VERSION,
-                constants.MUNICIPALITIES + '.csv'),
-            loaders.CreateNDJSONFileStep(
-                Municipality, constants.ETL_VERSION,
-                constants.MUNICIPALITIES + '.ndjson'
-            )
+            loaders.CSVSink(constants.ETL_VERSION,
+                            constants.MUNICIPALITIES + '.csv'),
+            loaders.NDJSONSink(constants.ETL_VERSION,
+                               constants.MUNICIPALITIES + '.ndjson')
         ]),
         CompositeStep([
             utils.CopyFileStep(output_path,
@@ -69,13 +71,15 @@ def create_process(config):
             utils.CopyFileStep(output_path,
                                constants.MUNICIPALITIES + '.ndjson')
         ])
-    ])
+    ] + loaders.optional_output_steps(
+        config, Municipality, constants.MUNICIPALITIES, flatgeobuf=True,
+        extraction_step_name=MUNICIPALITIES_EXTRACTION_STEP_NAME))
 
 
 class MunicipalitiesExtractionStep(transformers.EntitiesExtractionStep):
 
     def __init__(self):
-        super().__init__('municipalities_extraction', Municipality,
+        super().__init__(MUNICIPALITIES_EXTRACTION_STEP_NAME, Municipality,
                          entity_class_pkey='id', tmp_entity_class_pkey='in1')
 
     def _patch_tmp_entities(self, tmp_municipalities, ctx):
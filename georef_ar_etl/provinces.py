@@ -3,6 +3,8 @@ from .models import Province
 from .exceptions import ValidationException
 from . import extractors, transformers, loaders, geometry, utils, constants
 
+PROVINCES_EXTRACTION_STEP_NAME = 'provinces_extraction'
+
 
 def create_process(config):
     output_path = config.get('etl', 'output_dest_path')
@@ -38,20 +40,22 @@ def create_process(config):
         utils.ValidateTableSizeStep(
             target_size=config.getint('etl', 'provinces_target_size')),
 
-        CompositeStep([
-            loaders.CreateJSONFileStep(Province, constants.ETL_VERSION,
-                                       constants.PROVINCES + '.json'),
-            loaders.CreateGeoJSONFileStep(
-                Province,
+        loaders.CreateOutputFilesStep(Province, [
+            loaders.JSONSink(constants.ETL_VERSION,
+                             constants.PROVINCES + '.json'),
+            loaders.GeoJSONSink(
                 constants.ETL_VERSION,
                 constants.PROVINCES + '.geojson',
                 tolerance=config.getfloat("etl", "geojson_tolerance"),
-                caba_tolerance=config.getfloat("etl", "geojson_caba_tolerance")
+                caba_tolerance=config.getfloat("etl",
+                                               "geojson_caba_tolerance"),
+                simplify_mode=config.get('etl',
+                                         'geojson_polygons_simplify_mode')
             ),
-            loaders.CreateCSVFileStep(Province, constants.ETL_VERSION,
-                                      constants.PROVINCES + '.csv'),
-            loaders.CreateNDJSONFileStep(Province, constants.ETL_VERSION,
-                                         constants.PROVINCES + '.ndjson')
+            loaders.CSVSink(constants.ETL_VERSION,
+                            constants.PROVINCES + '.csv'),
+            loaders.NDJSONSink(constants.ETL_VERSION,
+                               constants.PROVINCES + '.ndjson')
         ]),
         CompositeStep([
             utils.CopyFileStep(output_path, constants.PROVINCES + '.json'),
@@ -59,13 +63,15 @@ def create_process(config):
             utils.CopyFileStep(output_path, constants.PROVINCES + '.csv'),
             utils.CopyFileStep(output_path, constants.PROVINCES + '.ndjson')
         ])
-    ])
+    ] + loaders.optional_output_steps(
+        config, Province, constants.PROVINCES, flatgeobuf=True,
+        extraction_step_name=PROVINCES_EXTRACTION_STEP_NAME))
 
 
 class ProvincesExtractionStep(transformers.EntitiesExtractionStep):
 
     def __init__(self):
-        super().__init__('provinces_extraction', Province,
+        super().__init__(PROVINCES_EXTRACTION_STEP_NAME, Province,
                          entity_class_pkey='id', tmp_entity_class_pkey='in1')
         iso_csv = utils.load_data_csv('iso-3166-provincias-arg.csv')
         self._iso_data = {row['id']: row for row in iso_csv}
@@ -0,0 +1,242 @@
+"""Módulo 'publish' de georef-ar-etl.
+
+Define el proceso que publica los archivos de salida del ETL: los archivos
+copiados por cada proceso a 'output_dest_path' se publican juntos en un
+directorio versionado, con un archivo manifest.json, y un enlace simbólico se
+actualiza de forma atómica para apuntar a la nueva versión.
+
+"""
+
+import os
+import json
+import time
+import shutil
+from datetime import datetime, timezone
+from fs.osfs import OSFS
+from .exceptions import ProcessException
+from .process import Process, Step
+from . import constants, compression, utils
+
+MANIFEST_FILENAME = 'manifest.json'
+
+# Nombre (clave de los datos del reporte) del paso de descarga de archivos
+# (ver extractors.DownloadURLStep), que registra el hash MD5 de cada fuente.
+DOWNLOAD_STEP_NAME = 'download_url'
+
+
+def create_process(config):
+    return Process(constants.PUBLISH, [
+        PublishStep(config.get('etl', 'output_dest_path'),
+                    config.get('etl', 'publish_path'),
+                    config.get('etl', 'publish_link'),
+                    keep_versions=config.getint('etl',
+                                                'publish_keep_versions'))
+    ])
+
+
+def link_or_copy(src, dst):
+    """Crea un hardlink de un archivo del sistema operativo. Si no es posible
+    (por ejemplo, si ambas rutas están en sistemas de archivos distintos), se
+    copia el archivo (ver utils.copy_file_fast()).
+
+    Args:
+        src (str): Ruta del archivo de origen.
+        dst (str): Ruta del archivo de destino.
+
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        utils.copy_file_fast(src, dst)
+
+
+class PublishStep(Step):
+    """Publica los archivos de salida de un directorio en un nuevo directorio
+    versionado, y actualiza un enlace simbólico para que apunte al mismo.
+
+    Los archivos se agregan a la nueva versión mediante hardlinks (o copias,
+    si no es posible crearlos). Esto es seguro ya que utils.CopyFileStep
+    nunca modifica los archivos de destino en el lugar: siempre los reemplaza
+    con un archivo nuevo. Por la misma razón, si un archivo es el mismo
+    (mismo inodo) que en la versión anterior, su hash y su cantidad de
+    entidades se toman del manifest anterior en lugar de recalcularse.
+
+    El manifest de cada versión incluye, por cada archivo, su tamaño, hash
+    MD5 y cantidad de entidades (si se conoce, ver
+    utils.copy_output_count()), y los hashes MD5 de los archivos de fuentes
+    descargados. Luego de crear la versión, el enlace se reemplaza
+    atómicamente (os.replace()), por lo que los consumidores nunca ven una
+    versión incompleta. Las versiones más antiguas se eliminan, conservando
+    las últimas 'keep_versions'.
+
+    Si la ruta del enlace es un directorio existente (por ejemplo, el
+    directorio 'latest' escrito directamente por cada proceso en versiones
+    anteriores del ETL), el mismo se migra: se mueve al directorio de
+    versiones como la versión más antigua, y se reemplaza por el enlace.
+
+    Attributes:
+        _src (str): Directorio con los archivos de salida.
+        _versions_path (str): Directorio donde crear las versiones.
+        _link (str): Ruta del enlace simbólico a la versión actual.
+        _keep_versions (int): Cantidad de versiones a conservar.
+
+    """
+
+    def __init__(self, src, versions_path, link, keep_versions=3):
+        super().__init__('publish', reads_input=False)
+        self._src = src
+        self._versions_path = versions_path
+        self._link = link
+        self._keep_versions = keep_versions
+
+    def _syspath(self, path, ctx):
+        return path if os.path.isabs(path) else ctx.fs.getsyspath(path)
+
+    def _new_version_path(self, versions_path, timestamp=None):
+        name = time.strftime('%Y.%m.%d-%H.%M.%S', time.localtime(timestamp))
+        path = os.path.join(versions_path, name)
+
+        i = 1
+        while os.path.exists(path):
+            path = os.path.join(versions_path, '{}-{}'.format(name, i))
+            i += 1
+
+        return path
+
+    def _current_version(self, link_path):
+        if not os.path.islink(link_path):
+            return None, {}
+
+        version_path = os.path.realpath(link_path)
+        manifest_path = os.path.join(version_path, MANIFEST_FILENAME)
+        if not os.path.isfile(manifest_path):
+            return version_path, {}
+
+        with open(manifest_path) as f:
+            return version_path, json.load(f)
+
+    def _file_entry(self, path, version_path, prev_version_path, prev_files,
+                    ctx):
+        file_path = os.path.join(version_path, path)
+        base_path = path
+        for ext in compression.COMPRESSION_EXTENSIONS.values():
+            if path.endswith(ext):
+                base_path = path[:-len(ext)]
+
+        if path in prev_files and prev_version_path:
+            prev_file_path = os.path.join(prev_version_path, path)
+            if os.path.exists(prev_file_path) and \
+               os.path.samefile(file_path, prev_file_path):
+                return prev_files[path]
+
+        return {
+            'archivo': path,
+            'bytes': os.path.getsize(file_path),
+            'md5': utils.file_md5(file_path, OSFS('/')),
+            'cantidad': utils.get_output_count(
+                os.path.join(self._src, base_path), ctx)
+        }
+
+    def _write_manifest(self, version_path, files, prev_manifest, ctx):
+        now = datetime.now(timezone.utc)
+        sources = dict(prev_manifest.get('fuentes', {}))
+        sources.update(ctx.report.get_data(DOWNLOAD_STEP_NAME))
+
+        manifest = {
+            'version': os.path.basename(version_path),
+            'version_etl': constants.ETL_VERSION,
+            'fecha_creacion': str(now),
+            'timestamp': int(now.timestamp()),
+            'archivos': files,
+            'fuentes': sources
+        }
+
+        with open(os.path.join(version_path, MANIFEST_FILENAME), 'w') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+
+    def _check_link(self, src_path, link_path):
+        if os.path.lexists(link_path) and not os.path.islink(link_path) and \
+           not os.path.isdir(link_path):
+            raise ProcessException(
+                'La ruta "{}" existe y no es un enlace simbólico.'.format(
+                    link_path))
+
+        if os.path.normpath(src_path) == os.path.normpath(link_path):
+            raise ProcessException(
+                'El enlace "{}" no puede ser el directorio de archivos de '
+                'salida.'.format(link_path))
+
+    def _migrate_directory(self, versions_path, link_path, ctx):
+        if os.path.islink(link_path) or not os.path.isdir(link_path):
+            return
+
+        legacy_path = self._new_version_path(versions_path,
+                                             os.path.getmtime(link_path))
+        ctx.report.warn('El directorio {} no es un enlace simbólico: se lo '
+                        'mueve a {}.'.format(link_path, legacy_path))
+        os.rename(link_path, legacy_path)
+
+    def _swap_link(self, version_path, link_path):
+        target = os.path.relpath(version_path, os.path.dirname(link_path))
+        tmp_link_path = link_path + '.tmp'
+        if os.path.lexists(tmp_link_path):
+            os.remove(tmp_link_path)
+
+        os.symlink(target, tmp_link_path)
+        os.replace(tmp_link_path, link_path)
+
+    def _remove_old_versions(self, versions_path, current_path, ctx):
+        versions = sorted(os.listdir(versions_path))
+        current = os.path.basename(current_path)
+
+        for name in versions[:-self._keep_versions]:
+            if name != current:
+                ctx.report.info('Eliminando versión {}...'.format(name))
+                shutil.rmtree(os.path.join(versions_path, name))
+
+    def _run_internal(self, data, ctx):
+        src_path = self._syspath(self._src, ctx)
+        versions_path = self._syspath(self._versions_path, ctx)
+        link_path = self._syspath(self._link, ctx)
+
+        if not os.path.isdir(src_path):
+            raise ProcessException(
+                'El directorio "{}" no existe.'.format(src_path))
+
+        self._check_link(src_path, link_path)
+
+        prev_version_path, prev_manifest = self._current_version(link_path)
+        prev_files = {
+            entry['archivo']: entry
+            for entry in prev_manifest.get('archivos', [])
+        }
+
+        version_path = self._new_version_path(versions_path)
+        os.makedirs(version_path, mode=constants.DIR_PERMS)
+        ctx.report.info('Publicando archivos en {}...'.format(version_path))
+
+        files = []
+        for dirpath, dirnames, filenames in os.walk(src_path):
+            dirnames.sort()
+            dst_dirpath = os.path.join(version_path,
+                                       os.path.relpath(dirpath, src_path))
+            os.makedirs(dst_dirpath, mode=constants.DIR_PERMS, exist_ok=True)
+
+            for filename in sorted(filenames):
+                link_or_copy(os.path.join(dirpath, filename),
+                             os.path.join(dst_dirpath, filename))
+
+                path = os.path.normpath(os.path.relpath(
+                    os.path.join(dirpath, filename), src_path))
+                files.append(self._file_entry(path, version_path,
+                                              prev_version_path, prev_files,
+                                              ctx))
+
+        self._write_manifest(version_path, files, prev_manifest, ctx)
+        self._migrate_directory(versions_path, link_path, ctx)
+        self._swap_link(version_path, link_path)
+        ctx.report.info('Enlace {} actualizado ({} archivos).'.format(
+            self._link, len(files)))
+
+        self._remove_old_versions(versions_path, version_path, ctx)
+        return version_path
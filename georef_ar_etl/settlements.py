@@ -5,6 +5,8 @@ from .models import Province, Department, Municipality, CensusLocality,\
 from . import extractors, transformers, loaders, geometry, utils, constants
 from . import patch
 
+SETTLEMENTS_EXTRACTION_STEP_NAME = 'settlements_extraction'
+
 
 def create_process(config):
     output_path = config.get('etl', 'output_dest_path')
@@ -42,15 +44,15 @@ def create_process(config):
         utils.ValidateTableSizeStep(
             target_size=config.getint('etl', 'settlements_target_size'),
             op='ge'),
-        CompositeStep([
-            loaders.CreateJSONFileStep(Settlement, constants.ETL_VERSION,
-                                       constants.SETTLEMENTS + '.json'),
-            loaders.CreateGeoJSONFileStep(Settlement, constants.ETL_VERSION,
-                                          constants.SETTLEMENTS + '.geojson'),
-            loaders.CreateCSVFileStep(Settlement, constants.ETL_VERSION,
-                                      constants.SETTLEMENTS + '.csv'),
-            loaders.CreateNDJSONFileStep(Settlement, constants.ETL_VERSION,
-                                         constants.SETTLEMENTS + '.ndjson')
+        loaders.CreateOutputFilesStep(Settlement, [
+            loaders.JSONSink(constants.ETL_VERSION,
+                             constants.SETTLEMENTS + '.json'),
+            loaders.GeoJSONSink(constants.ETL_VERSION,
+                                constants.SETTLEMENTS + '.geojson'),
+            loaders.CSVSink(constants.ETL_VERSION,
+                            constants.SETTLEMENTS + '.csv'),
+            loaders.NDJSONSink(constants.ETL_VERSION,
+                               constants.SETTLEMENTS + '.ndjson')
         ]),
         CompositeStep([
             utils.CopyFileStep(output_path,
@@ -62,7 +64,9 @@ def create_process(config):
             utils.CopyFileStep(output_path,
                                constants.SETTLEMENTS + '.ndjson')
         ])
-    ])
+    ] + loaders.optional_output_steps(
+        config, Settlement, constants.SETTLEMENTS,
+        extraction_step_name=SETTLEMENTS_EXTRACTION_STEP_NAME))
 
 
 def update_commune_id(row):
@@ -85,7 +89,8 @@ def update_commune_id(row):
 
 
 class SettlementsExtractionStep(transformers.EntitiesExtractionStep):
-    def __init__(self, name='settlements_extraction', entity_class=Settlement):
+    def __init__(self, name=SETTLEMENTS_EXTRACTION_STEP_NAME,
+                 entity_class=Settlement):
         super().__init__(name, entity_class, entity_class_pkey='id',
                          tmp_entity_class_pkey='cod_bahra')
 
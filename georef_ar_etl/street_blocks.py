@@ -1,7 +1,11 @@
+from sqlalchemy.sql import select, func, literal
+from sqlalchemy.sql.sqltypes import Integer, Text
 from .process import Process, Step, CompositeStep
 from .models import Street, StreetBlock
 from . import utils, constants, loaders
 
+STREET_BLOCKS_BACKENDS = ['orm', 'db']
+
 
 def create_process(config):
     output_path = config.get('etl', 'output_dest_path')
@@ -16,26 +20,51 @@ def create_process(config):
                            name='fetch_tmp_blocks_table',
                            reads_input=False),
         CompositeStep([
-            StreetBlocksExtractionStep(),
+            StreetBlocksExtractionStep(
+                backend=config.get('etl', 'street_blocks_backend')),
             utils.DropTableStep()
         ]),
         utils.FirstResultStep,
         utils.ValidateTableSizeStep(
             target_size=config.getint('etl', 'street_blocks_target_size'),
             op='ge'),
-        loaders.CreateNDJSONFileStep(StreetBlock, constants.ETL_VERSION,
-                                     constants.STREET_BLOCKS + '.ndjson'),
+        loaders.CreateShardedNDJSONFileStep(
+            StreetBlock, constants.ETL_VERSION,
+            constants.STREET_BLOCKS + '.ndjson',
+            shards=config.getint('etl', 'ndjson_shards')),
         utils.CopyFileStep(output_path, constants.STREET_BLOCKS + '.ndjson')
-    ])
+    ] + loaders.optional_output_steps(
+        config, StreetBlock, constants.STREET_BLOCKS, flatgeobuf=True))
 
 
 class StreetBlocksExtractionStep(Step):
-    def __init__(self):
+    """Genera las cuadras a partir de la tabla tmp_cuadras y las almacena en
+    la tabla georef_cuadras.
+
+    Con el backend 'orm', cada cuadra se lee y se construye como objeto
+    StreetBlock. Con el backend 'db', todas las cuadras se generan en la base
+    de datos utilizando una única sentencia INSERT ... SELECT.
+
+    Attributes:
+        _backend (str): Backend a utilizar para generar las cuadras.
+
+    """
+
+    def __init__(self, backend='orm'):
         super().__init__('street_blocks_extraction')
+        if backend not in STREET_BLOCKS_BACKENDS:
+            raise ValueError('Invalid backend: {}.'.format(backend))
+
+        self._backend = backend
 
     def _run_internal(self, tmp_blocks, ctx):
         ctx.session.query(StreetBlock).delete()
 
+        if self._backend == 'db':
+            count = self._insert_blocks_db(tmp_blocks, ctx)
+            ctx.report.info('Cuadras procesadas, cantidad: {}.'.format(count))
+            return StreetBlock
+
         bulk_size = ctx.config.getint('etl', 'bulk_size')
         query = ctx.session.query(tmp_blocks, Street).\
             filter(tmp_blocks.tipo != constants.STREET_TYPE_OTHER).\
@@ -46,13 +75,44 @@ class StreetBlocksExtractionStep(Step):
         ctx.report.info('{} cuadras a procesar.'.format(count))
         ctx.report.info('Procesando cuadras...')
 
-        for tmp_block, street in utils.pbar(query, ctx, total=count):
-            block = self._process_block(tmp_block, street)
-            utils.add_maybe_flush(block, ctx, bulk_size)
+        with utils.BulkWriter(StreetBlock, ctx, bulk_size=bulk_size) as writer:
+            for tmp_block, street in utils.pbar(query, ctx, total=count):
+                writer.add(self._process_block(tmp_block, street))
 
         ctx.report.info('Cuadras procesadas.')
         return StreetBlock
 
+    def _door_number(self, column):
+        # Equivalente a 'valor or 0' para columnas numéricas o de texto.
+        return func.coalesce(func.nullif(column.cast(Text), ''),
+                             '0').cast(Integer)
+
+    def _insert_blocks_db(self, tmp_blocks, ctx):
+        ogc_fid = func.right(literal('00000') + tmp_blocks.ogc_fid.cast(Text),
+                             5)
+
+        fields = [
+            (tmp_blocks.nomencla + ogc_fid).label('id'),
+            Street.id.label('calle_id'),
+            self._door_number(tmp_blocks.desded).label('inicio_derecha'),
+            self._door_number(tmp_blocks.hastad).label('fin_derecha'),
+            self._door_number(tmp_blocks.desdei).label('inicio_izquierda'),
+            self._door_number(tmp_blocks.hastai).label('fin_izquierda'),
+            tmp_blocks.geom.label('geometria')
+        ]
+
+        query = select(fields).\
+            select_from(tmp_blocks.__table__.join(
+                Street.__table__, tmp_blocks.nomencla == Street.id)).\
+            where(tmp_blocks.tipo != constants.STREET_TYPE_OTHER)
+
+        ctx.report.info('Generando cuadras en la base de datos...')
+        insert = StreetBlock.__table__.insert().from_select(
+            [field.name for field in fields], query)
+        result = ctx.session.execute(insert)
+
+        return result.rowcount
+
     def _process_block(self, tmp_block, street):
         ogc_fid = str(tmp_block.ogc_fid).rjust(5, '0')
         block_id = tmp_block.nomencla + ogc_fid[-5:]
@@ -1,10 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import MetaData, Table, Column, or_
 from sqlalchemy.sql import select, func
-from sqlalchemy.sql.sqltypes import Integer
+from sqlalchemy.sql.sqltypes import Integer, String
+from geoalchemy2 import Geometry
 from .exceptions import ValidationException
 from .process import Process, CompositeStep, StepSequence
 from .models import Province, Department, CensusLocality, Street
 from . import extractors, loaders, utils, constants, patch, transformers
 
+STREETS_EXTRACTION_STEP_NAME = 'streets_extraction'
+
+UNION_METHODS = ['union', 'collect']
+
 INVALID_BLOCKS_CENSUS_LOCALITIES = [
     '62042450',
     '74056100',
@@ -101,31 +108,59 @@ def create_process(config):
                 })
             ], name='load_tmp_streets')
         ]),
-        StreetsExtractionStep(),
+        StreetsExtractionStep(
+            workers=config.getint('etl', 'streets_union_workers'),
+            union_method=config.get('etl', 'streets_union_method')),
         utils.ValidateTableSizeStep(
             target_size=config.getint('etl', 'streets_target_size'),
             op='ge'),
-        CompositeStep([
-            loaders.CreateJSONFileStep(Street, constants.ETL_VERSION,
-                                       constants.STREETS + '.json'),
-            loaders.CreateCSVFileStep(Street, constants.ETL_VERSION,
-                                      constants.STREETS + '.csv'),
-            loaders.CreateNDJSONFileStep(Street, constants.ETL_VERSION,
-                                         constants.STREETS + '.ndjson')
+        loaders.CreateOutputFilesStep(Street, [
+            loaders.JSONSink(constants.ETL_VERSION,
+                             constants.STREETS + '.json'),
+            loaders.CSVSink(constants.ETL_VERSION,
+                            constants.STREETS + '.csv'),
+            loaders.NDJSONSink(constants.ETL_VERSION,
+                               constants.STREETS + '.ndjson')
         ]),
         CompositeStep([
             utils.CopyFileStep(output_path, constants.STREETS + '.json'),
             utils.CopyFileStep(output_path, constants.STREETS + '.csv'),
             utils.CopyFileStep(output_path, constants.STREETS + '.ndjson')
         ])
-    ])
+    ] + loaders.optional_output_steps(
+        config, Street, constants.STREETS, flatgeobuf=True,
+        extraction_step_name=STREETS_EXTRACTION_STEP_NAME))
 
 
 class StreetsExtractionStep(transformers.EntitiesExtractionStep):
-    def __init__(self):
-        super().__init__('streets_extraction', Street,
+    """Genera las calles a partir de las cuadras de la tabla tmp_cuadras.
+
+    Las cuadras se agrupan por calle (campo 'nomencla') en una tabla temporal
+    (tmp_cuadras_agrupadas), utilizando una consulta por provincia. Las
+    consultas se ejecutan en paralelo, cada una utilizando una conexión
+    propia a la base de datos.
+
+    Attributes:
+        _workers (int): Cantidad de consultas de agrupamiento a ejecutar en
+            paralelo.
+        _union_method (str): Método a utilizar para combinar las geometrías
+            de las cuadras: 'union' (ST_Union) o 'collect' (ST_Collect y
+            ST_LineMerge, más económico pero sin unión topológica).
+        _grouped_blocks (sqlalchemy.schema.Table): Tabla temporal de cuadras
+            agrupadas.
+
+    """
+
+    def __init__(self, workers=1, union_method='union'):
+        super().__init__(STREETS_EXTRACTION_STEP_NAME, Street,
                          entity_class_pkey='id',
                          tmp_entity_class_pkey='nomencla')
+        if union_method not in UNION_METHODS:
+            raise ValueError('Invalid union method: {}.'.format(union_method))
+
+        self._workers = workers
+        self._union_method = union_method
+        self._grouped_blocks = None
 
     def _patch_tmp_entities(self, tmp_blocks, ctx):
         def update_marcos_paz(row):
@@ -154,12 +189,37 @@ class StreetsExtractionStep(transformers.EntitiesExtractionStep):
         ctx.session.commit()
 
     def _entities_query_count(self, tmp_blocks, ctx):
-        return ctx.session.query(tmp_blocks).\
-            filter(tmp_blocks.tipo != constants.STREET_TYPE_OTHER).\
-            distinct(tmp_blocks.nomencla).\
-            count()
+        return ctx.engine.execute(
+            select([func.count()]).select_from(self._grouped_blocks)
+        ).scalar()
 
     def _build_entities_query(self, tmp_blocks, ctx):
+        self._grouped_blocks = self._group_tmp_blocks(tmp_blocks, ctx)
+        return ctx.engine.execute(select([self._grouped_blocks]))
+
+    def _union_geometries(self, tmp_blocks):
+        if self._union_method == 'collect':
+            return func.ST_Multi(func.ST_LineMerge(
+                func.ST_Collect(tmp_blocks.geom)))
+
+        return tmp_blocks.geom.ST_Union()
+
+    def _group_tmp_blocks(self, tmp_blocks, ctx):
+        grouped_blocks = Table(
+            constants.STREET_BLOCKS_GROUPED_TMP_TABLE, MetaData(),
+            Column('ogc_fid', Integer),
+            Column('nomencla', String),
+            Column('nombre', String),
+            Column('tipo', String),
+            Column('desdei', Integer),
+            Column('desded', Integer),
+            Column('hastai', Integer),
+            Column('hastad', Integer),
+            Column('geom', Geometry(srid=Street.geometria.type.srid))
+        )
+        grouped_blocks.drop(ctx.engine, checkfirst=True)
+        grouped_blocks.create(ctx.engine)
+
         fields = [
             func.min(tmp_blocks.ogc_fid).label('ogc_fid'),
             tmp_blocks.nomencla,
@@ -169,14 +229,43 @@ class StreetsExtractionStep(transformers.EntitiesExtractionStep):
             func.min(tmp_blocks.desded.cast(Integer)).label('desded'),
             func.max(tmp_blocks.hastai.cast(Integer)).label('hastai'),
             func.max(tmp_blocks.hastad.cast(Integer)).label('hastad'),
-            tmp_blocks.geom.ST_Union().label('geom')
+            self._union_geometries(tmp_blocks).label('geom')
+        ]
+
+        # Particionar las cuadras por provincia (primeros dígitos de
+        # 'nomencla'). La última partición incluye cualquier cuadra con un
+        # código de provincia inválido, que luego será reportado como error.
+        prefix = func.substr(tmp_blocks.nomencla, 1,
+                             constants.PROVINCE_ID_LEN)
+        partitions = [prefix == prov_id for prov_id in constants.PROVINCE_IDS]
+        partitions.append(or_(prefix.notin_(constants.PROVINCE_IDS),
+                              tmp_blocks.nomencla.is_(None)))
+
+        statements = [
+            grouped_blocks.insert().from_select(
+                [field.name for field in fields],
+                select(fields).
+                where(tmp_blocks.tipo != constants.STREET_TYPE_OTHER).
+                where(partition).
+                group_by(tmp_blocks.nomencla)
+            )
+            for partition in partitions
         ]
 
-        statement = select(fields).\
-            group_by(tmp_blocks.nomencla).\
-            where(tmp_blocks.tipo != constants.STREET_TYPE_OTHER)
+        def execute(statement):
+            with ctx.engine.begin() as connection:
+                connection.execute(statement)
+
+        ctx.report.info('Agrupando cuadras por calle ({} consultas, {} en '
+                        'paralelo)...'.format(len(statements), self._workers))
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = [executor.submit(execute, stmt) for stmt in statements]
+            for future in utils.pbar(as_completed(futures), ctx,
+                                     total=len(futures)):
+                future.result()
 
-        return ctx.engine.execute(statement)
+        return grouped_blocks
 
     def _copy_tmp_streets(self, tmp_blocks, tmp_streets, ctx):
         bulk_size = ctx.config.getint('etl', 'bulk_size')
@@ -218,7 +307,12 @@ class StreetsExtractionStep(transformers.EntitiesExtractionStep):
 
             self._copy_tmp_streets(tmp_blocks, tmp_streets, ctx)
 
-        return super()._run_internal(tmp_blocks, ctx)
+        try:
+            return super()._run_internal(tmp_blocks, ctx)
+        finally:
+            if self._grouped_blocks is not None:
+                self._grouped_blocks.drop(ctx.engine, checkfirst=True)
+                self._grouped_blocks = None
 
     def _process_entity(self, block, cached_session, ctx):
         street_id = block.nomencla
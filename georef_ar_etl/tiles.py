@@ -0,0 +1,361 @@
+"""Módulo 'tiles' de georef-ar-etl.
+
+Define el proceso que genera teselas vectoriales (Mapbox Vector Tiles) de las
+capas de polígonos y líneas (provincias, departamentos, municipios y calles),
+utilizando ST_AsMVT de PostGIS, y las almacena en un archivo MBTiles
+(SQLite).
+
+"""
+
+import os
+import gzip
+import json
+import math
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import Integer, bindparam, func, literal_column, select
+from .process import Process, Step, ProcessException
+from .models import Province, Department, Municipality, Street, SRID
+from . import constants, utils
+
+# Extensión y buffer (en unidades de tesela) de las geometrías de cada
+# tesela.
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+
+# Versión mínima de PostGIS requerida (ST_TileEnvelope con margen).
+MIN_POSTGIS_VERSION = (3, 1)
+
+# Mitad del ancho del mundo en la proyección EPSG:3857, y latitud máxima
+# representable en la misma.
+WEB_MERCATOR_HALF_WIDTH = 20037508.342789244
+WEB_MERCATOR_MAX_LAT = 85.0511287798066
+
+# Modelo y atributos de cada capa de teselas.
+VECTOR_TILES_LAYERS = {
+    constants.PROVINCES: (Province, ['id', 'nombre']),
+    constants.DEPARTMENTS: (Department, ['id', 'nombre', 'provincia_id']),
+    constants.MUNICIPALITIES: (Municipality, ['id', 'nombre',
+                                              'provincia_id']),
+    constants.STREETS: (Street, ['id', 'nombre', 'categoria',
+                                 'provincia_id', 'departamento_id'])
+}
+
+
+def create_process(config):
+    output_path = config.get('etl', 'output_dest_path')
+    filename = constants.VECTOR_TILES + '.mbtiles'
+    layers = parse_layers(config.get('etl', 'vector_tiles_layers'))
+
+    return Process(constants.VECTOR_TILES, [
+        utils.CheckDependenciesStep([
+            VECTOR_TILES_LAYERS[name][0] for name, _, _ in layers
+        ]),
+        VectorTilesCreationStep(
+            layers, filename,
+            workers=config.getint('etl', 'vector_tiles_workers'),
+            block_size=config.getint('etl', 'vector_tiles_block_size')),
+        utils.CopyFileStep(output_path, filename)
+    ])
+
+
+def parse_layers(value):
+    """Interpreta la lista de capas de teselas y sus rangos de zoom, con el
+    formato 'capa:zmin-zmax, capa:zmin-zmax, ...'.
+
+    Args:
+        value (str): Lista de capas.
+
+    Raises:
+        ValueError: Si alguna capa no existe, o su rango de zoom es inválido.
+
+    Returns:
+        list: Lista de tuplas (capa, zoom mínimo, zoom máximo).
+
+    """
+    layers = []
+
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+
+        try:
+            name, zooms = item.split(':')
+            minzoom, maxzoom = (int(zoom) for zoom in zooms.split('-'))
+        except ValueError:
+            raise ValueError('Invalid vector tiles layer: {}.'.format(item))
+
+        if name not in VECTOR_TILES_LAYERS or \
+           not 0 <= minzoom <= maxzoom <= 24:
+            raise ValueError('Invalid vector tiles layer: {}.'.format(item))
+
+        layers.append((name, minzoom, maxzoom))
+
+    return layers
+
+
+def lonlat_to_mercator(lon, lat):
+    """Convierte coordenadas EPSG:4326 a EPSG:3857. Las latitudes fuera del
+    rango representable se recortan.
+
+    Args:
+        lon (float): Longitud.
+        lat (float): Latitud.
+
+    Returns:
+        tuple: Coordenadas (x, y).
+
+    """
+    lat = max(-WEB_MERCATOR_MAX_LAT, min(WEB_MERCATOR_MAX_LAT, lat))
+    x = lon * WEB_MERCATOR_HALF_WIDTH / 180
+    y = math.log(math.tan((90 + lat) * math.pi / 360)) * \
+        WEB_MERCATOR_HALF_WIDTH / math.pi
+
+    return x, y
+
+
+def tiles_for_bounds(bounds, zoom):
+    """Genera las teselas (esquema XYZ) que cubren un rectángulo en
+    coordenadas EPSG:4326.
+
+    Args:
+        bounds (tuple): Rectángulo (lon mín., lat mín., lon máx., lat máx.).
+        zoom (int): Nivel de zoom.
+
+    Yields:
+        tuple: Coordenadas (x, y) de cada tesela.
+
+    """
+    n = 2 ** zoom
+    size = 2 * WEB_MERCATOR_HALF_WIDTH / n
+    xmin, ymin = lonlat_to_mercator(bounds[0], bounds[1])
+    xmax, ymax = lonlat_to_mercator(bounds[2], bounds[3])
+
+    def tile_index(value):
+        return max(0, min(n - 1, int(value // size)))
+
+    for x in range(tile_index(xmin + WEB_MERCATOR_HALF_WIDTH),
+                   tile_index(xmax + WEB_MERCATOR_HALF_WIDTH) + 1):
+        for y in range(tile_index(WEB_MERCATOR_HALF_WIDTH - ymax),
+                       tile_index(WEB_MERCATOR_HALF_WIDTH - ymin) + 1):
+            yield x, y
+
+
+class VectorTilesCreationStep(Step):
+    """Genera las teselas vectoriales de una o más capas y las almacena en un
+    archivo MBTiles.
+
+    Para cada nivel de zoom, solo se generan las teselas que intersectan el
+    rectángulo envolvente de alguna entidad de las capas visibles en ese
+    nivel. Las teselas se agrupan en bloques, que se generan en paralelo
+    utilizando una conexión a la base de datos por thread (por lo que la
+    transacción actual se confirma antes de comenzar). Cada tesela se genera
+    con una única consulta, que concatena las capas visibles en su nivel de
+    zoom. Requiere PostGIS 3.1 o superior (ST_TileEnvelope con margen).
+
+    Attributes:
+        _layers (list): Lista de tuplas (capa, zoom mínimo, zoom máximo).
+        _filename (str): Ruta del archivo MBTiles a crear.
+        _workers (int): Cantidad de bloques a generar en paralelo.
+        _block_size (int): Cantidad de teselas por bloque.
+
+    """
+
+    def __init__(self, layers, filename, workers=1, block_size=256):
+        super().__init__('vector_tiles_creation', reads_input=False)
+        self._layers = layers
+        self._filename = filename
+        self._workers = workers
+        self._block_size = block_size
+
+    def _zoom_layers(self, zoom):
+        return [
+            name for name, minzoom, maxzoom in self._layers
+            if minzoom <= zoom <= maxzoom
+        ]
+
+    def _layer_query(self, name, envelope):
+        model, columns = VECTOR_TILES_LAYERS[name]
+
+        # Recortar las geometrías en EPSG:4326 antes de proyectarlas, ya que
+        # las latitudes extremas no son representables en EPSG:3857.
+        clip_box = func.ST_Transform(func.ST_TileEnvelope(
+            bindparam('z', type_=Integer), bindparam('x', type_=Integer),
+            bindparam('y', type_=Integer),
+            func.ST_MakeEnvelope(-WEB_MERCATOR_HALF_WIDTH,
+                                 -WEB_MERCATOR_HALF_WIDTH,
+                                 WEB_MERCATOR_HALF_WIDTH,
+                                 WEB_MERCATOR_HALF_WIDTH, 3857),
+            MVT_BUFFER / MVT_EXTENT), SRID)
+
+        geom = func.ST_AsMVTGeom(
+            func.ST_Transform(func.ST_ClipByBox2D(model.geometria, clip_box),
+                              3857),
+            envelope, MVT_EXTENT, MVT_BUFFER, True)
+
+        rows = select(
+            [getattr(model, column).label(column) for column in columns] +
+            [geom.label('geom')]
+        ).where(model.geometria.op('&&')(clip_box)).alias('q_' + name)
+
+        return select([
+            func.ST_AsMVT(literal_column(rows.name), name, MVT_EXTENT, 'geom')
+        ]).select_from(rows).as_scalar()
+
+    def _tile_query(self, zoom):
+        envelope = func.ST_TileEnvelope(bindparam('z', type_=Integer),
+                                        bindparam('x', type_=Integer),
+                                        bindparam('y', type_=Integer))
+        queries = [
+            self._layer_query(name, envelope)
+            for name in self._zoom_layers(zoom)
+        ]
+
+        tile = queries[0]
+        for query in queries[1:]:
+            tile = tile.op('||')(query)
+
+        return select([tile])
+
+    def _layer_bounds(self, name, ctx):
+        model = VECTOR_TILES_LAYERS[name][0]
+        query = select([
+            func.ST_XMin(model.geometria), func.ST_YMin(model.geometria),
+            func.ST_XMax(model.geometria), func.ST_YMax(model.geometria)
+        ])
+
+        return ctx.session.connection().execute(query).fetchall()
+
+    def _tile_blocks(self, ctx):
+        zooms = {}
+        extent = [180, 90, -180, -90]
+
+        for name, minzoom, maxzoom in self._layers:
+            ctx.report.info('Calculando teselas de la capa "{}"...'.format(
+                name))
+
+            for bounds in self._layer_bounds(name, ctx):
+                extent = [min(extent[0], bounds[0]),
+                          min(extent[1], bounds[1]),
+                          max(extent[2], bounds[2]),
+                          max(extent[3], bounds[3])]
+
+                for zoom in range(minzoom, maxzoom + 1):
+                    zooms.setdefault(zoom, set()).update(
+                        tiles_for_bounds(bounds, zoom))
+
+        blocks = []
+        for zoom, tiles in sorted(zooms.items()):
+            tiles = sorted(tiles)
+            blocks.extend(
+                (zoom, tiles[i:i + self._block_size])
+                for i in range(0, len(tiles), self._block_size)
+            )
+
+        return blocks, extent
+
+    def _create_mbtiles(self, filepath, bounds):
+        connection = sqlite3.connect(filepath)
+        connection.executescript("""
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER,
+                                tile_row INTEGER, tile_data BLOB);
+            CREATE UNIQUE INDEX tile_index
+                ON tiles (zoom_level, tile_column, tile_row);
+        """)
+
+        vector_layers = [
+            {
+                'id': name,
+                'fields': {
+                    column: 'String'
+                    for column in VECTOR_TILES_LAYERS[name][1]
+                },
+                'minzoom': minzoom,
+                'maxzoom': maxzoom
+            }
+            for name, minzoom, maxzoom in self._layers
+        ]
+
+        metadata = {
+            'name': constants.VECTOR_TILES,
+            'format': 'pbf',
+            'version': constants.ETL_VERSION,
+            'minzoom': min(layer[1] for layer in self._layers),
+            'maxzoom': max(layer[2] for layer in self._layers),
+            'bounds': ','.join(str(value) for value in [
+                bounds[0], max(bounds[1], -WEB_MERCATOR_MAX_LAT),
+                bounds[2], min(bounds[3], WEB_MERCATOR_MAX_LAT)
+            ]),
+            'json': json.dumps({'vector_layers': vector_layers})
+        }
+
+        connection.executemany('INSERT INTO metadata VALUES (?, ?)',
+                               [(k, str(v)) for k, v in metadata.items()])
+        return connection
+
+    def _run_internal(self, data, ctx):
+        if utils.postgis_version(ctx.session) < MIN_POSTGIS_VERSION:
+            raise ProcessException(
+                'Se requiere PostGIS {}.{} o superior.'.format(
+                    *MIN_POSTGIS_VERSION))
+
+        ctx.session.commit()
+
+        dirname = os.path.dirname(self._filename)
+        if dirname:
+            utils.ensure_dir(dirname, ctx.fs)
+
+        if ctx.fs.exists(self._filename):
+            ctx.fs.remove(self._filename)
+
+        blocks, bounds = self._tile_blocks(ctx)
+        queries = {
+            zoom: self._tile_query(zoom)
+            for zoom in set(zoom for zoom, _ in blocks)
+        }
+
+        def generate(zoom, tiles):
+            results = []
+            with ctx.engine.connect() as connection:
+                for x, y in tiles:
+                    tile = connection.execute(queries[zoom], z=zoom, x=x,
+                                              y=y).scalar()
+                    if tile:
+                        results.append((zoom, x, y, bytes(tile)))
+
+            return results
+
+        ctx.report.info('Generando teselas ({} bloques, {} en '
+                        'paralelo)...'.format(len(blocks), self._workers))
+
+        connection = self._create_mbtiles(ctx.fs.getsyspath(self._filename),
+                                          bounds)
+        count = 0
+
+        try:
+            with ThreadPoolExecutor(max_workers=self._workers) as executor:
+                futures = [
+                    executor.submit(generate, zoom, tiles)
+                    for zoom, tiles in blocks
+                ]
+
+                for future in utils.pbar(as_completed(futures), ctx,
+                                         total=len(futures)):
+                    # MBTiles utiliza el esquema TMS (filas invertidas), y
+                    # teselas comprimidas con gzip.
+                    rows = [
+                        (zoom, x, 2 ** zoom - 1 - y, gzip.compress(tile))
+                        for zoom, x, y, tile in future.result()
+                    ]
+                    connection.executemany(
+                        'INSERT INTO tiles VALUES (?, ?, ?, ?)', rows)
+                    count += len(rows)
+
+            connection.commit()
+        finally:
+            connection.close()
+
+        ctx.report.info('Teselas generadas: {}.'.format(count))
+        return self._filename
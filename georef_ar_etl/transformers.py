@@ -75,6 +75,7 @@ class EntitiesExtractionStep(Step):
         cached_session = ctx.cached_session()
         deleted = []
         updated = set()
+        changed = set()
         added = set()
         errors = []
 
@@ -101,7 +102,8 @@ class EntitiesExtractionStep(Step):
                 continue
 
             if prev_entity:
-                utils.update_entity(new_entity, prev_entity)
+                if utils.update_entity(new_entity, prev_entity):
+                    changed.add(entity_id)
                 updated.add(entity_id)
             else:
                 entities.append(new_entity)
@@ -137,6 +139,8 @@ class EntitiesExtractionStep(Step):
 
         ctx.report.info('Entidades nuevas: %s', len(added))
         ctx.report.info('Entidades actualizadas: %s', len(updated))
+        ctx.report.info('Entidades actualizadas (con cambios): %s',
+                        len(changed))
         ctx.report.info('Entidades eliminadas: %s', len(deleted))
 
         if errors:
@@ -145,8 +149,10 @@ class EntitiesExtractionStep(Step):
         report_data = ctx.report.get_data(self.name)
         report_data['new_entities_ids'] = list(added)
         report_data['updated_entities_count'] = len(updated)
+        report_data['changed_entities_ids'] = list(changed)
         report_data['deleted_entities_ids'] = deleted
         report_data['errors'] = errors
+        cached_session.report_stats(ctx.report, self.name)
 
         return self._entity_class
 
@@ -4,20 +4,43 @@ Define funciones y clases de utilidades varias.
 
 """
 
+import io
 import os
+import json
 import sys
 import csv
+import time
+import fcntl
+import shutil
+import hashlib
 import operator
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, func
 from sqlalchemy.ext.automap import automap_base
 from sqlalchemy.sql import sqltypes
 from sqlalchemy.dialects.postgresql import base as pgtypes
 from geoalchemy2 import types as geotypes
+from geoalchemy2.elements import WKBElement
+from psycopg2.extras import execute_values
 import fs
 from tqdm import tqdm
 from .exceptions import ProcessException
 from .process import Step
-from . import constants
+from . import constants, compression
+
+# Operación ioctl FICLONE de Linux, utilizada para copiar archivos por
+# reflink (btrfs, XFS, etc.).
+FICLONE = 0x40049409
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Clave de los datos del reporte donde se almacena la cantidad de entidades
+# de cada archivo de salida generado (ver set_output_count()).
+OUTPUT_COUNTS_DATA = 'output_counts'
+
+# Archivo (relativo a 'files_dir') donde se persiste la cantidad de entidades
+# de cada archivo copiado a 'output_dest_path' (ver copy_output_count()), para
+# que pueda ser leída por ejecuciones posteriores del ETL.
+OUTPUT_COUNTS_FILENAME = 'output_counts.json'
 
 _SQL_TYPES = {
     'varchar': sqltypes.VARCHAR,
@@ -135,11 +158,162 @@ FirstResultStep = FunctionStep(fn=lambda results: results[0],
                                name='first_result')
 
 
+def postgis_version(session):
+    """Retorna la versión de la biblioteca PostGIS de la base de datos.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): Sesión de base de datos.
+
+    Returns:
+        tuple: Versión mayor y menor (por ejemplo, (3, 1)).
+
+    """
+    version = session.scalar(func.postgis_lib_version())
+    return tuple(int(part) for part in version.split('.')[:2])
+
+
+def file_md5(path, filesystem):
+    """Calcula el hash MD5 de un archivo.
+
+    Args:
+        path (str): Ruta del archivo.
+        filesystem (fs.base.FS): Sistema de archivos del archivo.
+
+    Returns:
+        str: Hash MD5 (hexadecimal).
+
+    """
+    md5 = hashlib.md5()
+    with filesystem.open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            md5.update(chunk)
+
+    return md5.hexdigest()
+
+
+def files_equal(src_path, src_fs, dst_path, dst_fs):
+    """Compara dos archivos, primero por tamaño y luego por hash MD5.
+
+    Args:
+        src_path (str): Ruta del primer archivo.
+        src_fs (fs.base.FS): Sistema de archivos del primer archivo.
+        dst_path (str): Ruta del segundo archivo.
+        dst_fs (fs.base.FS): Sistema de archivos del segundo archivo.
+
+    Returns:
+        bool: True si ambos archivos existen y tienen el mismo contenido.
+
+    """
+    if not dst_fs.isfile(dst_path) or \
+       src_fs.getsize(src_path) != dst_fs.getsize(dst_path):
+        return False
+
+    return file_md5(src_path, src_fs) == file_md5(dst_path, dst_fs)
+
+
+def copy_file_fast(src, dst):
+    """Copia un archivo del sistema operativo, evitando pasar sus contenidos
+    por Python cuando sea posible: se intenta primero una copia por reflink
+    (ioctl FICLONE), luego os.copy_file_range() y os.sendfile(), y por último
+    una copia convencional.
+
+    Args:
+        src (str): Ruta del archivo de origen.
+        dst (str): Ruta del archivo de destino.
+
+    Returns:
+        str: Método utilizado para copiar el archivo.
+
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return 'reflink'
+        except OSError:
+            pass
+
+        size = os.fstat(fsrc.fileno()).st_size
+        methods = [
+            ('copy_file_range', lambda offset: os.copy_file_range(
+                fsrc.fileno(), fdst.fileno(), size - offset, offset, offset)),
+            ('sendfile', lambda offset: os.sendfile(
+                fdst.fileno(), fsrc.fileno(), offset, size - offset))
+        ]
+
+        for name, copy_fn in methods:
+            offset = 0
+            try:
+                while offset < size:
+                    copied = copy_fn(offset)
+                    if not copied:
+                        break
+
+                    offset += copied
+            except (AttributeError, OSError):
+                continue
+
+            if offset == size:
+                return name
+
+        fsrc.seek(0)
+        fdst.seek(0)
+        fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+
+    return 'copy'
+
+
 class CopyFileStep(Step):
+    """Copia un archivo (y sus versiones comprimidas) a una ruta de destino.
+
+    Si el destino ya tiene el mismo contenido que el origen (mismo tamaño y
+    hash MD5), no se copia. De lo contrario, el archivo se copia a un archivo
+    temporal junto al destino (ver copy_file_fast()), que luego se renombra
+    de forma atómica, para que el destino nunca quede parcialmente escrito.
+    No se utilizan hardlinks, ya que los archivos de salida se reescriben en
+    el lugar en cada ejecución del ETL: el destino cambiaría junto con el
+    origen.
+
+    Attributes:
+        _dst (str): Ruta del archivo de destino.
+
+    """
+
     def __init__(self, *dst_parts):
         super().__init__('copy_file')
         self._dst = os.path.join(*dst_parts)
 
+    def _copy(self, src, src_fs, dst, dst_fs, ctx):
+        if files_equal(src, src_fs, dst, dst_fs):
+            ctx.report.info('-> {} (sin cambios)'.format(dst))
+            return False
+
+        ctx.report.info('-> {}'.format(dst))
+        tmp_dst = dst + '.tmp'
+
+        try:
+            if src_fs.hassyspath(src) and dst_fs.hassyspath(tmp_dst):
+                copy_file_fast(src_fs.getsyspath(src),
+                               dst_fs.getsyspath(tmp_dst))
+                os.replace(dst_fs.getsyspath(tmp_dst),
+                           dst_fs.getsyspath(dst))
+            else:
+                fs.copy.copy_file(
+                    dst_path=tmp_dst,
+                    dst_fs=dst_fs,
+                    src_path=src,
+                    src_fs=src_fs
+                )
+                dst_fs.move(tmp_dst, dst, overwrite=True)
+        except Exception:
+            # No dejar el archivo temporal en el destino (por ejemplo, para
+            # que no sea publicado o copiado por pasos posteriores).
+            if dst_fs.exists(tmp_dst):
+                dst_fs.remove(tmp_dst)
+            raise
+
+        return True
+
     def _run_internal(self, src, ctx):
         if os.path.isabs(self._dst):
             dst_fs = fs.osfs.OSFS('/')
@@ -158,18 +332,143 @@ class CopyFileStep(Step):
         ctx.report.info('Copiando desde:')
         ctx.report.info('-> {}'.format(src))
         ctx.report.info('A:')
+        copied = self._copy(src, src_fs, self._dst, dst_fs, ctx)
+        copy_output_count(src, self._dst, ctx, copied)
+
+        # Copiar también las versiones comprimidas del archivo (ver
+        # compression.open_output_file()), y eliminar las versiones
+        # comprimidas obsoletas del destino.
+        for src_path, dst_path in zip(compression.compressed_filenames(src),
+                                      compression.compressed_filenames(
+                                          self._dst)):
+            if src_fs.exists(src_path):
+                self._copy(src_path, src_fs, dst_path, dst_fs, ctx)
+            elif dst_fs.exists(dst_path):
+                dst_fs.remove(dst_path)
+
+        return self._dst
+
+
+class CopyDirectoryStep(Step):
+    """Copia un directorio y sus contenidos. Si el directorio de destino ya
+    existe, es reemplazado.
+
+    Attributes:
+        _dst (str): Ruta del directorio de destino.
+
+    """
+
+    def __init__(self, *dst_parts):
+        super().__init__('copy_directory')
+        self._dst = os.path.join(*dst_parts)
+
+    def _run_internal(self, src, ctx):
+        if os.path.isabs(self._dst):
+            dst_fs = fs.osfs.OSFS('/')
+        else:
+            dst_fs = ctx.fs
+
+        if os.path.isabs(src):
+            src_fs = fs.osfs.OSFS('/')
+        else:
+            src_fs = ctx.fs
+
+        ctx.report.info('Copiando directorio desde:')
+        ctx.report.info('-> {}'.format(src))
+        ctx.report.info('A:')
         ctx.report.info('-> {}'.format(self._dst))
 
-        fs.copy.copy_file(
-            dst_path=self._dst,
-            dst_fs=dst_fs,
-            src_path=src,
-            src_fs=src_fs
-        )
+        if dst_fs.exists(self._dst):
+            dst_fs.removetree(self._dst)
+
+        ensure_dir(self._dst, dst_fs)
+        fs.copy.copy_dir(src_fs, src, dst_fs, self._dst)
+        copy_output_count(src, self._dst, ctx)
 
         return self._dst
 
 
+def set_output_count(filename, count, ctx):
+    """Registra en el reporte la cantidad de entidades de un archivo (o
+    directorio) de salida.
+
+    Args:
+        filename (str): Ruta del archivo.
+        count (int): Cantidad de entidades.
+        ctx (Context): Contexto de ejecución.
+
+    """
+    ctx.report.get_data(OUTPUT_COUNTS_DATA)[os.path.normpath(filename)] = \
+        count
+
+
+def _read_output_counts(ctx):
+    if not ctx.fs.exists(OUTPUT_COUNTS_FILENAME):
+        return {}
+
+    with ctx.fs.open(OUTPUT_COUNTS_FILENAME) as f:
+        return json.load(f)
+
+
+def _write_output_counts(counts, ctx):
+    tmp_filename = OUTPUT_COUNTS_FILENAME + '.tmp'
+    with ctx.fs.open(tmp_filename, 'w') as f:
+        json.dump(counts, f, indent=4, sort_keys=True)
+
+    ctx.fs.move(tmp_filename, OUTPUT_COUNTS_FILENAME, overwrite=True)
+
+
+def get_output_count(filename, ctx):
+    """Retorna la cantidad de entidades de un archivo (o directorio) de
+    salida registrada en el reporte o, si no fue registrada, la persistida
+    por una ejecución anterior (ver copy_output_count()).
+
+    Args:
+        filename (str): Ruta del archivo.
+        ctx (Context): Contexto de ejecución.
+
+    Returns:
+        int: Cantidad de entidades, o None.
+
+    """
+    filename = os.path.normpath(filename)
+    count = ctx.report.get_data(OUTPUT_COUNTS_DATA).get(filename)
+    if count is None:
+        count = _read_output_counts(ctx).get(filename)
+
+    return count
+
+
+def copy_output_count(src, dst, ctx, copied=True):
+    """Registra la cantidad de entidades de un archivo de salida copiado,
+    tomándola del archivo de origen, y la persiste en OUTPUT_COUNTS_FILENAME.
+
+    Args:
+        src (str): Ruta del archivo de origen.
+        dst (str): Ruta del archivo de destino.
+        ctx (Context): Contexto de ejecución.
+        copied (bool): Falso si el destino no fue modificado. Si la cantidad
+            del origen no es conocida y el destino fue modificado, se elimina
+            la cantidad persistida del destino.
+
+    """
+    count = ctx.report.get_data(OUTPUT_COUNTS_DATA).get(
+        os.path.normpath(src))
+    if count is not None:
+        set_output_count(dst, count, ctx)
+    elif not copied:
+        # El destino no fue modificado: conservar la cantidad persistida.
+        return
+
+    counts = _read_output_counts(ctx)
+    if count is None:
+        counts.pop(os.path.normpath(dst), None)
+    else:
+        counts[os.path.normpath(dst)] = count
+
+    _write_output_counts(counts, ctx)
+
+
 def automap_table(table_name, ctx, metadata=None):
     if not metadata:
         metadata = MetaData()
@@ -182,10 +481,26 @@ def automap_table(table_name, ctx, metadata=None):
 
 
 def update_entity(new_entity, prev_entity):
+    changed = False
     for attribute, val in vars(new_entity).items():
         if not attribute.startswith('_'):
+            if not values_equal(getattr(prev_entity, attribute), val):
+                changed = True
+
             setattr(prev_entity, attribute, val)
 
+    # Retornar verdadero si algún valor de la entidad anterior fue modificado
+    return changed
+
+
+def values_equal(val_a, val_b):
+    if isinstance(val_a, WKBElement) and isinstance(val_b, WKBElement):
+        # Los objetos WKBElement no implementan __eq__, comparar sus
+        # representaciones EWKB.
+        return val_a.desc == val_b.desc
+
+    return val_a == val_b
+
 
 def clean_string(s):
     # Si hay más de una línea, tomar la primera
@@ -195,13 +510,152 @@ def clean_string(s):
     return s
 
 
-def add_maybe_flush(obj, ctx, bulk_size=None):
-    bulk_size = bulk_size or ctx.config.getint('etl', 'bulk_size')
+BULK_WRITER_METHODS = ['orm', 'values', 'copy']
+
+
+class BulkWriter:
+    """Inserta filas en una tabla en lotes de tamaño fijo.
+
+    Las filas pueden ser diccionarios o instancias del modelo. Cada lote se
+    inserta utilizando uno de los siguientes métodos:
+
+        - 'orm': Session.bulk_insert_mappings().
+        - 'values': psycopg2.extras.execute_values().
+        - 'copy': COPY ... FROM STDIN.
+
+    Los métodos 'values' y 'copy' utilizan la conexión de la sesión actual,
+    por lo que las filas insertadas forman parte de la misma transacción.
+
+    Attributes:
+        _model (type): Modelo (tabla) donde insertar filas.
+        _columns (list): Nombres de las columnas a insertar.
+        _method (str): Método de inserción.
+        _bulk_size (int): Cantidad de filas por lote.
+        _ctx (Context): Contexto de ejecución.
+        _rows (list): Filas pendientes de inserción.
+        _count (int): Cantidad de filas insertadas.
+        _start (float): Momento de inicio de la escritura.
+
+    """
+
+    def __init__(self, model, ctx, method=None, bulk_size=None,
+                 columns=None):
+        method = method or ctx.config.get('etl', 'bulk_writer_method')
+        if method not in BULK_WRITER_METHODS:
+            raise ValueError('Invalid bulk writer method: {}.'.format(method))
+
+        self._model = model
+        self._columns = columns or [
+            column.name for column in model.__table__.columns
+        ]
+        self._method = method
+        self._bulk_size = bulk_size or ctx.config.getint('etl', 'bulk_size')
+        self._ctx = ctx
+        self._rows = []
+        self._count = 0
+        self._start = None
+
+    @property
+    def count(self):
+        return self._count
+
+    def add(self, row):
+        if not isinstance(row, dict):
+            row = {column: getattr(row, column) for column in self._columns}
+
+        self._rows.append(row)
+        if len(self._rows) >= self._bulk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+
+        if self._method == 'orm':
+            self._ctx.session.bulk_insert_mappings(self._model, self._rows)
+        elif self._method == 'values':
+            self._insert_values()
+        else:
+            self._insert_copy()
+
+        self._count += len(self._rows)
+        self._rows.clear()
+
+    def _insert_values(self):
+        statement = 'INSERT INTO {} ({}) VALUES %s'.format(
+            self._model.__tablename__, ', '.join(self._columns))
+        values = [
+            [raw_value(row.get(column)) for column in self._columns]
+            for row in self._rows
+        ]
+
+        cursor = self._ctx.session.connection().connection.cursor()
+        execute_values(cursor, statement, values, page_size=self._bulk_size)
+        cursor.close()
+
+    def _insert_copy(self):
+        data = io.StringIO()
+        for row in self._rows:
+            data.write('\t'.join(
+                copy_value(row.get(column)) for column in self._columns
+            ))
+            data.write('\n')
+
+        data.seek(0)
+        cursor = self._ctx.session.connection().connection.cursor()
+        cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(
+            self._model.__tablename__, ', '.join(self._columns)), data)
+        cursor.close()
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is not None:
+            return
+
+        self.flush()
+        elapsed = time.monotonic() - self._start
+        self._ctx.report.info(
+            'Filas insertadas en {}: {} ({:.0f} filas/s).'.format(
+                self._model.__tablename__, self._count,
+                self._count / elapsed if elapsed else 0))
+
+
+def raw_value(value):
+    """Convierte un valor a un tipo aceptado directamente por psycopg2. Las
+    geometrías se convierten a EWKB hexadecimal.
+
+    Args:
+        value (object): Valor a convertir.
+
+    Returns:
+        object: Valor convertido.
+
+    """
+    if isinstance(value, WKBElement):
+        return value.desc
+
+    return value
+
+
+def copy_value(value):
+    """Convierte un valor al formato de texto utilizado por COPY.
+
+    Args:
+        value (object): Valor a convertir.
+
+    Returns:
+        str: Valor convertido.
+
+    """
+    if value is None:
+        return '\\N'
 
-    ctx.session.add(obj)
-    if len(ctx.session.new) >= bulk_size:
-        ctx.session.flush()
-        ctx.session.expunge_all()
+    value = str(raw_value(value))
+    return value.replace('\\', '\\\\').replace('\t', '\\t').\
+        replace('\n', '\\n').replace('\r', '\\r')
 
 
 def pbar(iterator, ctx, total=None):
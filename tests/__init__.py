@@ -13,12 +13,22 @@ from georef_ar_etl.departments import DepartmentsExtractionStep
 from georef_ar_etl.municipalities import MunicipalitiesExtractionStep
 from georef_ar_etl.census_localities import CensusLocalitiesExtractionStep
 from georef_ar_etl.streets import StreetsExtractionStep
-from georef_ar_etl.utils import CopyFileStep
+from georef_ar_etl.utils import CopyFileStep, postgis_version
 from georef_ar_etl import read_config, create_engine, models
+from georef_ar_etl.geometry import require_shapely_2
 
 TEST_FILES_DIR = 'tests/test_files'
 
 
+def shapely_2_installed():
+    try:
+        require_shapely_2()
+    except RuntimeError:
+        return False
+
+    return True
+
+
 class ETLTestCase(TestCase):
     _uses_db = True
 
@@ -64,6 +74,14 @@ class ETLTestCase(TestCase):
         self._ctx.fs.removetree('.')
         self._ctx.report.reset()
 
+    def require_shapely_2(self):
+        if not shapely_2_installed():
+            self.skipTest('Shapely >= 2.0 is not installed.')
+
+    def require_postgis(self, version):
+        if postgis_version(self._ctx.session) < version:
+            self.skipTest('PostGIS {}.{} is not installed.'.format(*version))
+
     @classmethod
     def create_table(cls, name, columns_data, pkey):
         columns = [
@@ -0,0 +1,67 @@
+from georef_ar_etl.context import CachedSession, CachedQuery
+from georef_ar_etl.models import Province
+from . import ETLTestCase
+
+
+class DictQuery:
+    def __init__(self, entities):
+        self.entities = entities
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        return self.entities.get(key)
+
+
+class TestCachedQuery(ETLTestCase):
+    _uses_db = False
+
+    def test_lookups_after_eviction(self):
+        """Las búsquedas deberían retornar la entidad correcta aunque la
+        misma haya sido descartada de la cache previamente."""
+        entities = {i: 'entidad-{}'.format(i) for i in range(10)}
+        query = DictQuery(entities)
+        cached_query = CachedQuery(query, max_size=2)
+        keys = [0, 1, 0, 2, 3, 1, 0, 99, 3, 3, 9, 0]
+
+        results = [cached_query.get(key) for key in keys]
+
+        self.assertListEqual(results, [entities.get(key) for key in keys])
+        self.assertEqual(query.calls, cached_query.misses)
+        self.assertEqual(cached_query.hits, 2)
+        self.assertEqual(cached_query.stats()['size'], 2)
+
+
+class TestCachedSession(ETLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_test_provinces(extract=True)
+
+    def test_warm_cache(self):
+        """Luego de cargar una tabla completa a la cache, las búsquedas de
+        entidades existentes no deberían contarse como fallos."""
+        cached_session = CachedSession(self._ctx.session)
+        cached_session.warm(Province)
+
+        province = cached_session.query(Province).get('70')
+        stats = cached_session.stats()[Province.__tablename__]
+
+        self.assertEqual(province.id, '70')
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 0)
+
+    def test_max_entities(self):
+        """La cache debería descartar las entidades usadas menos
+        recientemente al superar su tamaño máximo."""
+        cached_session = CachedSession(
+            self._ctx.session, max_sizes={Province.__tablename__: 1})
+        query = cached_session.query(Province)
+        query.get('70')
+        self.assertIsNone(query.get('99'))
+        province = query.get('70')
+
+        stats = cached_session.stats()[Province.__tablename__]
+        self.assertEqual(province.id, '70')
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['evictions'], 2)
+        self.assertEqual(stats['size'], 1)
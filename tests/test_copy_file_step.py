@@ -1,4 +1,7 @@
+import gzip
+from unittest import mock
 from georef_ar_etl.utils import CopyFileStep
+from georef_ar_etl.compression import open_output_file
 from . import ETLTestCase
 
 
@@ -21,3 +24,69 @@ class TestCopyFileStep(ETLTestCase):
             text2 = f.read()
 
         self.assertEqual(text1, text2)
+
+    def test_copy_compressed_files(self):
+        """El paso debería copiar también las versiones comprimidas del
+        archivo, y eliminar las versiones obsoletas del destino."""
+        filename = 'test.json'
+        dst = 'test2.json'
+        self._ctx.fs.writetext(dst + '.zst', 'old')
+
+        compression = self._ctx.config.get('etl', 'output_compression')
+        self._ctx.config.set('etl', 'output_compression', 'gzip')
+        try:
+            with open_output_file(filename, self._ctx) as f:
+                f.write('{"a":"ñ"}\n')
+        finally:
+            self._ctx.config.set('etl', 'output_compression', compression)
+
+        step = CopyFileStep(dst)
+        step.run(filename, self._ctx)
+
+        with self._ctx.fs.open(dst + '.gz', 'rb') as f:
+            text = gzip.decompress(f.read()).decode('utf-8')
+
+        self.assertEqual(text, self._ctx.fs.readtext(filename))
+        self.assertFalse(self._ctx.fs.exists(dst + '.zst'))
+
+    def test_copy_unchanged_file(self):
+        """El paso no debería reemplazar el archivo de destino si su contenido
+        es igual al del origen, y debería reemplazarlo si cambió."""
+        filename = 'test.txt'
+        dst = 'test2.txt'
+        self._ctx.fs.writetext(filename, 'abc')
+
+        step = CopyFileStep(dst)
+        step.run(filename, self._ctx)
+        inode = self._ctx.fs.getinfo(dst, namespaces=['stat']).raw['stat'][
+            'st_ino']
+        step.run(filename, self._ctx)
+
+        self.assertEqual(self._ctx.fs.getinfo(
+            dst, namespaces=['stat']).raw['stat']['st_ino'], inode)
+
+        self._ctx.fs.writetext(filename, 'abd')
+        step.run(filename, self._ctx)
+
+        self.assertEqual(self._ctx.fs.readtext(dst), 'abd')
+        self.assertFalse(self._ctx.fs.exists(dst + '.tmp'))
+
+    def test_copy_failure_removes_tmp_file(self):
+        """Si la copia falla, no debería quedar el archivo temporal en el
+        destino."""
+        filename = 'test.txt'
+        dst = 'test2.txt'
+        self._ctx.fs.writetext(filename, 'abc')
+
+        def failing_copy(_src, dst_path):
+            with open(dst_path, 'w') as f:
+                f.write('a')
+            raise OSError()
+
+        step = CopyFileStep(dst)
+        with mock.patch('georef_ar_etl.utils.copy_file_fast', failing_copy):
+            with self.assertRaises(OSError):
+                step.run(filename, self._ctx)
+
+        self.assertFalse(self._ctx.fs.exists(dst + '.tmp'))
+        self.assertFalse(self._ctx.fs.exists(dst))
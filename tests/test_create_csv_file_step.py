@@ -1,7 +1,7 @@
 import csv
 import random
 from georef_ar_etl.models import Department
-from georef_ar_etl.loaders import CreateCSVFileStep
+from georef_ar_etl.loaders import CreateCSVFileStep, row_flattener
 from . import ETLTestCase
 from .test_departments_extraction_step import SAN_JUAN_DEPT_COUNT
 
@@ -27,3 +27,23 @@ class TestCreateGeoJSONFileStep(ETLTestCase):
         row = random.choice(rows)
 
         self.assertFalse('geometria' in row)
+
+    def test_create_csv_file_fields(self):
+        """Los campos y valores del archivo CSV deberían ser iguales a los del
+        resultado de to_dict() aplanado."""
+        filename = 'test.csv'
+        step = CreateCSVFileStep(Department, filename)
+        step.run(None, self._ctx)
+
+        with self._ctx.fs.open(filename, newline='') as f:
+            reader = csv.DictReader(f, quoting=csv.QUOTE_NONNUMERIC)
+            rows = {row['id']: row for row in reader}
+            fields = reader.fieldnames
+
+        entity = self._ctx.session.query(Department).first()
+        flattener = row_flattener(Department)
+        flat = dict(zip(flattener.fields, flattener.flatten(
+            entity.to_dict(self._ctx.session, geometry=False))))
+
+        self.assertListEqual(fields, sorted(flat))
+        self.assertDictEqual(rows[entity.id], flat)
@@ -0,0 +1,41 @@
+import json
+from georef_ar_etl.models import Department
+from georef_ar_etl.loaders import CreateDeltaNDJSONFileStep
+from . import ETLTestCase
+
+
+class TestCreateDeltaNDJSONFileStep(ETLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_test_provinces(extract=True)
+        self.create_test_departments(extract=True)
+
+    def test_create_delta_ndjson_file(self):
+        """El paso debería crear un archivo NDJSON con las entidades nuevas y
+        modificadas, y las entidades eliminadas, registradas por el paso de
+        extracción."""
+        entity_ids = [
+            row.id for row in self._ctx.session.query(Department.id).
+            order_by(Department.id).limit(2)
+        ]
+        report_data = self._ctx.report.get_data('test_extraction')
+        report_data['new_entities_ids'] = entity_ids[:1]
+        report_data['changed_entities_ids'] = entity_ids[1:]
+        report_data['deleted_entities_ids'] = ['99999']
+
+        filename = 'departamentos.delta.ndjson'
+        step = CreateDeltaNDJSONFileStep(Department, 'test_extraction',
+                                         filename)
+        step.run(None, self._ctx)
+
+        with self._ctx.fs.open(filename) as f:
+            metadata = json.loads(next(f))
+            lines = [json.loads(line) for line in f]
+
+        self.assertEqual(metadata['cantidad'], 2)
+        self.assertEqual(metadata['cantidad_eliminadas'], 1)
+        self.assertListEqual(
+            sorted(line['id'] for line in lines[:2]), entity_ids)
+        self.assertEqual(lines[0]['documento']['id'], lines[0]['id'])
+        self.assertDictEqual(lines[2], {'operacion': 'delete',
+                                        'id': '99999'})
@@ -0,0 +1,43 @@
+import json
+from georef_ar_etl.models import Department
+from georef_ar_etl.loaders import CreateESBulkFileStep
+from . import ETLTestCase
+
+
+class TestCreateESBulkFileStep(ETLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_test_provinces(extract=True)
+        self.create_test_departments(extract=True)
+
+    def test_create_es_bulk_file(self):
+        """El paso debería crear archivos bulk de Elasticsearch, de tamaño
+        máximo 'es_bulk_chunk_bytes', con un par acción/documento por
+        entidad."""
+        dirname = 'departamentos_bulk'
+        chunk_bytes = self._ctx.config.get('etl', 'es_bulk_chunk_bytes')
+        self._ctx.config.set('etl', 'es_bulk_chunk_bytes', '4096')
+        try:
+            step = CreateESBulkFileStep(Department, dirname,
+                                        index='departamentos')
+            step.run(None, self._ctx)
+        finally:
+            self._ctx.config.set('etl', 'es_bulk_chunk_bytes', chunk_bytes)
+
+        filenames = sorted(name for name in self._ctx.fs.listdir(dirname)
+                           if name.endswith('.ndjson'))
+        lines = []
+
+        for filename in filenames:
+            with self._ctx.fs.open(dirname + '/' + filename) as f:
+                lines.extend(json.loads(line) for line in f)
+
+        actions, docs = lines[::2], lines[1::2]
+        count = self._ctx.session.query(Department).count()
+
+        self.assertGreater(len(filenames), 1)
+        self.assertEqual(len(docs), count)
+        self.assertTrue(all(action['index']['_id'] == doc['id']
+                            for action, doc in zip(actions, docs)))
+        self.assertEqual(actions[0]['index']['_index'], 'departamentos')
+        self.assertIn('geometria', docs[0])
@@ -0,0 +1,35 @@
+import unittest
+from georef_ar_etl.models import Department
+from georef_ar_etl.loaders import CreateFlatGeobufFileStep, Ogr2ogrStep, \
+    flatgeobuf_supported
+from . import ETLTestCase
+
+
+@unittest.skipUnless(flatgeobuf_supported(),
+                     'ogr2ogr FlatGeobuf driver is not installed.')
+class TestCreateFlatGeobufFileStep(ETLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_test_provinces(extract=True)
+        self.create_test_departments(extract=True)
+
+    def test_create_flatgeobuf_file(self):
+        """El paso debería crear un archivo FlatGeobuf con los contenidos de
+        la tabla especificada, con campos aplanados."""
+        filename = 'departamentos.fgb'
+        step = CreateFlatGeobufFileStep(Department, filename,
+                                        db_config=self._ctx.config['test_db'])
+        step.run(None, self._ctx)
+
+        # Cargar el archivo generado nuevamente a la base de datos.
+        table = Ogr2ogrStep(table_name='t1', geom_type='MultiPolygon',
+                            metadata=self._metadata,
+                            db_config=self._ctx.config['test_db']).run(
+                                filename, self._ctx)
+
+        count = self._ctx.session.query(Department).count()
+        entity = self._ctx.session.query(table).\
+            filter(table.provincia_id == '70').first()
+
+        self.assertEqual(self._ctx.session.query(table).count(), count)
+        self.assertIsNotNone(entity.provincia_nombre)
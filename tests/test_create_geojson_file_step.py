@@ -1,7 +1,10 @@
 import json
+from shapely.geometry import shape
 from georef_ar_etl.models import Province
 from georef_ar_etl.loaders import CreateGeoJSONFileStep
-from . import ETLTestCase
+from georef_ar_etl.geometry import COVERAGE_CACHE_DIR, \
+    COVERAGE_MIN_POSTGIS_VERSION
+from . import ETLTestCase, shapely_2_installed
 
 
 class TestCreateGeoJSONFileStep(ETLTestCase):
@@ -22,3 +25,45 @@ class TestCreateGeoJSONFileStep(ETLTestCase):
 
         self.assertEqual(data['type'], 'FeatureCollection')
         self.assertEqual(data['features'][0]['properties']['id'], '70')
+
+    def test_simplify_modes(self):
+        """Los modos de simplificación 'batch' y 'db' deberían generar las
+        mismas geometrías que el modo 'local'."""
+        features = {}
+        modes = ['batch', 'db'] if shapely_2_installed() else ['db']
+
+        for mode in ['local'] + modes:
+            filename = 'test_{}.geojson'.format(mode)
+            step = CreateGeoJSONFileStep(Province, filename,
+                                         simplify_mode=mode)
+            step.run(None, self._ctx)
+
+            with self._ctx.fs.open(filename) as f:
+                features[mode] = json.load(f)['features']
+
+        for mode in modes:
+            self.assertEqual(len(features[mode]), len(features['local']))
+
+            for feature, local_feature in zip(features[mode],
+                                              features['local']):
+                self.assertDictEqual(feature['properties'],
+                                     local_feature['properties'])
+                self.assertTrue(shape(feature['geometry']).equals_exact(
+                    shape(local_feature['geometry']), 1e-6))
+
+    def test_simplify_coverage_cache(self):
+        """El modo de simplificación 'coverage' debería reutilizar la
+        cobertura simplificada mientras la capa no sea modificada."""
+        self.require_postgis(COVERAGE_MIN_POSTGIS_VERSION)
+        contents = []
+
+        for _ in range(2):
+            step = CreateGeoJSONFileStep(Province, 'test.geojson',
+                                         simplify_mode='coverage')
+            step.run(None, self._ctx)
+            self.assertEqual(len(self._ctx.fs.listdir(COVERAGE_CACHE_DIR)), 1)
+
+            with self._ctx.fs.open('test.geojson') as f:
+                contents.append(f.read())
+
+        self.assertEqual(contents[0], contents[1])
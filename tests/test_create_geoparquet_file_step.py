@@ -0,0 +1,35 @@
+import json
+import unittest
+from georef_ar_etl.models import Department
+from georef_ar_etl.loaders import CreateGeoParquetFileStep, pyarrow
+from . import ETLTestCase
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed.')
+class TestCreateGeoParquetFileStep(ETLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_test_provinces(extract=True)
+        self.create_test_departments(extract=True)
+
+    def test_create_geoparquet_file(self):
+        """El paso debería crear un archivo GeoParquet con los contenidos de
+        la tabla especificada, con campos aplanados y geometría en WKB."""
+        filename = 'departamentos.parquet'
+        step = CreateGeoParquetFileStep(Department, filename)
+        step.run(None, self._ctx)
+
+        with self._ctx.fs.open(filename, 'rb') as f:
+            table = pyarrow.parquet.read_table(f)
+
+        geo = json.loads(table.schema.metadata[b'geo'])
+        rows = table.to_pylist()
+
+        count = self._ctx.session.query(Department).count()
+
+        self.assertEqual(len(rows), count)
+        self.assertEqual(geo['primary_column'], 'geometria')
+        self.assertEqual(table.schema.field('centroide_lat').type,
+                         pyarrow.float64())
+        self.assertEqual(rows[0]['provincia_id'], '70')
+        self.assertTrue(all(row['geometria'] for row in rows))
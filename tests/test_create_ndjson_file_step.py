@@ -1,7 +1,10 @@
 import json
+from unittest import mock
 from georef_ar_etl.models import Department
 from georef_ar_etl.constants import ETL_VERSION
-from georef_ar_etl.loaders import CreateNDJSONFileStep
+from georef_ar_etl.loaders import CreateNDJSONFileStep, \
+    CreateShardedNDJSONFileStep
+from georef_ar_etl.exceptions import ProcessException
 from . import ETLTestCase
 
 
@@ -36,3 +39,59 @@ class TestCreateNDJSONFileStep(ETLTestCase):
 
         entity = entities[0]
         self.assertEqual(entity['provincia']['id'], '70')
+
+    def test_create_ndjson_file_db_documents(self):
+        """Los documentos generados en la base de datos deberían ser iguales a
+        los generados por to_dict()."""
+        filename = 'departamentos.json'
+        lines = {}
+
+        for backend in ['orm', 'db']:
+            self._ctx.config.set('etl', 'documents_backend', backend)
+            try:
+                step = CreateNDJSONFileStep(Department, filename)
+                step.run(None, self._ctx)
+            finally:
+                self._ctx.config.set('etl', 'documents_backend', 'orm')
+
+            with self._ctx.fs.open(filename) as f:
+                next(f)
+                lines[backend] = sorted((json.loads(line) for line in f),
+                                        key=lambda doc: doc['id'])
+
+        self.assertListEqual(lines['orm'], lines['db'])
+
+    def test_create_sharded_ndjson_file(self):
+        """El archivo generado en paralelo debería contener las mismas
+        entidades que el generado por un único proceso."""
+        lines = {}
+
+        for shards in [1, 3]:
+            filename = 'departamentos_{}.json'.format(shards)
+            step = CreateShardedNDJSONFileStep(Department, filename,
+                                               shards=shards)
+            step.run(None, self._ctx)
+
+            with self._ctx.fs.open(filename) as f:
+                metadata = json.loads(next(f))
+                lines[shards] = sorted(f)
+
+            self.assertEqual(metadata['cantidad'], len(lines[shards]))
+
+        self.assertListEqual(lines[1], lines[3])
+        self.assertFalse(any('.part' in name
+                             for name in self._ctx.fs.listdir('.')))
+
+    def test_create_sharded_ndjson_file_failure(self):
+        """Si la concatenación de los archivos parciales falla, los mismos
+        deberían ser eliminados."""
+        step = CreateShardedNDJSONFileStep(Department, 'departamentos.json',
+                                           shards=3)
+
+        with mock.patch.object(CreateShardedNDJSONFileStep, '_concat_shards',
+                               side_effect=ProcessException('failure')):
+            with self.assertRaises(ProcessException):
+                step.run(None, self._ctx)
+
+        self.assertFalse(any('.part' in name
+                             for name in self._ctx.fs.listdir('.')))
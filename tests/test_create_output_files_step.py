@@ -0,0 +1,57 @@
+import json
+from georef_ar_etl.models import Department
+from georef_ar_etl.loaders import CreateOutputFilesStep, CreateJSONFileStep, \
+    CreateGeoJSONFileStep, CreateCSVFileStep, JSONSink, GeoJSONSink, CSVSink
+from . import ETLTestCase
+
+
+class TestCreateOutputFilesStep(ETLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_test_provinces(extract=True)
+        self.create_test_departments(extract=True)
+
+    def test_create_output_files(self):
+        """El paso debería crear los mismos archivos que los pasos
+        individuales de cada formato, y retornar sus rutas."""
+        single_steps = [
+            CreateJSONFileStep(Department, 'single', 'test.json'),
+            CreateGeoJSONFileStep(Department, 'single', 'test.geojson'),
+            CreateCSVFileStep(Department, 'single', 'test.csv')
+        ]
+
+        for step in single_steps:
+            step.run(None, self._ctx)
+
+        step = CreateOutputFilesStep(Department, [
+            JSONSink('multi', 'test.json'),
+            GeoJSONSink('multi', 'test.geojson'),
+            CSVSink('multi', 'test.csv')
+        ])
+        filenames = step.run(None, self._ctx)
+
+        self.assertListEqual(filenames, ['multi/test.json',
+                                         'multi/test.geojson',
+                                         'multi/test.csv'])
+
+        for filename in ['test.json', 'test.geojson', 'test.csv']:
+            with self._ctx.fs.open('single/' + filename) as f:
+                single = f.read()
+
+            with self._ctx.fs.open('multi/' + filename) as f:
+                multi = f.read()
+
+            self.assertEqual(single, multi)
+
+    def test_json_only_sinks(self):
+        """El paso debería poder generar archivos con sinks que no utilizan
+        geometrías ni columnas adicionales."""
+        step = CreateOutputFilesStep(Department, [JSONSink('test.json')])
+        step.run(None, self._ctx)
+
+        with self._ctx.fs.open('test.json') as f:
+            data = json.load(f)
+
+        count = self._ctx.session.query(Department).count()
+        self.assertEqual(data['cantidad'], count)
+        self.assertEqual(len(data['test']), count)
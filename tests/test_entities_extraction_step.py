@@ -27,3 +27,19 @@ class TestEntitiesExtractionStep(ETLTestCase):
 
         with self.assertRaisesRegex(ProcessException, 'Clave primaria'):
             step.run(self._tmp_provinces, self._ctx)
+
+    def test_changed_entities(self):
+        """Al re-ejecutar la extracción, solo las entidades cuyos valores
+        cambiaron deberían ser reportadas como modificadas."""
+        step = ProvincesExtractionStep()
+        step.run(self._tmp_provinces, self._ctx)
+
+        step.run(self._tmp_provinces, self._ctx)
+        report_data = self._ctx.report.get_data(step.name)
+        self.assertListEqual(report_data['changed_entities_ids'], [])
+
+        self._ctx.session.query(self._tmp_provinces).\
+            update({'nam': 'Nuevo Nombre'})
+        step.run(self._tmp_provinces, self._ctx)
+        report_data = self._ctx.report.get_data(step.name)
+        self.assertListEqual(report_data['changed_entities_ids'], ['70'])
@@ -30,6 +30,46 @@ class TestGeometry(ETLTestCase):
         self.assertAlmostEqual(centroid[0], 5)
         self.assertAlmostEqual(centroid[1], 5)
 
+    def test_geojson_serializer_local(self):
+        """El modo 'local' de GeoJSONSerializer debería generar el mismo
+        GeoJSON que el modo 'db'."""
+        tbl = self.create_table('tbl', {
+            'id': sqltypes.Integer,
+            'geom': Geometry('MULTIPOLYGON')
+        }, pkey='id')
+
+        entity = tbl(id=0, geom=TEST_MULTIPOLYGON)
+        self._ctx.session.add(entity)
+        self._ctx.session.commit()
+
+        db_serializer = geometry.GeoJSONSerializer('db', precision=9)
+        local_serializer = geometry.GeoJSONSerializer('local', precision=9)
+
+        self.assertDictEqual(
+            local_serializer.serialize(entity.geom, self._ctx.session),
+            db_serializer.serialize(entity.geom, self._ctx.session))
+
+    def test_geojson_serializer_local_default_precision(self):
+        """Con la precisión por defecto, el modo 'local' de
+        GeoJSONSerializer debería generar el mismo GeoJSON que el modo 'db'
+        (incluyendo coordenadas con más de 9 decimales)."""
+        tbl = self.create_table('tbl', {
+            'id': sqltypes.Integer,
+            'geom': Geometry('POINT')
+        }, pkey='id')
+
+        entity = tbl(id=0, geom='SRID=4326;POINT(-68.5364412345678 '
+                                 '-31.5375123456789)')
+        self._ctx.session.add(entity)
+        self._ctx.session.commit()
+
+        db_serializer = geometry.GeoJSONSerializer('db')
+        local_serializer = geometry.GeoJSONSerializer('local')
+
+        self.assertDictEqual(
+            local_serializer.serialize(entity.geom, self._ctx.session),
+            db_serializer.serialize(entity.geom, self._ctx.session))
+
     def test_streets_intersections_single(self):
         """La función get_streets_intersections debería retornar una sola
         intersección si las dos calles solo interseccionan en un punto."""
@@ -88,6 +128,31 @@ class TestGeometry(ETLTestCase):
                                                     cluster_distance_m=100)
         self.assertEqual(len(points), 1)
 
+    def test_streets_intersections_multiple_shapely(self):
+        """La función get_streets_intersections debería retornar los mismos
+        resultados al utilizar el backend 'shapely'."""
+        self.require_shapely_2()
+        tbl = self.create_table('tbl', {
+            'id': sqltypes.Integer,
+            'geom': Geometry('MULTILINESTRING')
+        }, pkey='id')
+
+        entity = tbl(id=0, geom=TEST_MULTILINESTRING_B)
+        entity_b = tbl(id=1, geom=TEST_MULTILINESTRING_C)
+        self._ctx.session.add_all([entity, entity_b])
+        self._ctx.session.commit()
+
+        points = geometry.get_streets_intersections(entity.geom, entity_b.geom,
+                                                    self._ctx,
+                                                    backend='shapely')
+        self.assertEqual(len(points), 2)
+
+        points = geometry.get_streets_intersections(entity.geom, entity_b.geom,
+                                                    self._ctx,
+                                                    cluster_distance_m=100,
+                                                    backend='shapely')
+        self.assertEqual(len(points), 1)
+
     def test_streets_intersections_overlap(self):
         """Si dos calles se solapan entre sí (puede suceder con los datos
         actuales de INDEC), se debería calcular la intersección
@@ -1,5 +1,10 @@
+from unittest import mock
+from georef_ar_etl.context import NameLookup
 from georef_ar_etl.models import Intersection, Street
-from georef_ar_etl.intersections import IntersectionsCreationStep
+from georef_ar_etl.intersections import IntersectionsCreationStep, \
+    ClearPendingStreetsStep
+from georef_ar_etl.streets import STREETS_EXTRACTION_STEP_NAME
+from georef_ar_etl import geometry
 from . import ETLTestCase
 
 SAN_JUAN_INTERSECTIONS_COUNT = 1578
@@ -25,6 +30,16 @@ class TestIntersectionsCreationStep(ETLTestCase):
         self.assertEqual(self._ctx.session.query(Intersection).count(),
                          SAN_JUAN_INTERSECTIONS_COUNT)
 
+    def test_to_dict_name_lookup(self):
+        """Utilizar un NameLookup en lugar de la sesión en to_dict() debería
+        generar el mismo resultado."""
+        intersection = self._ctx.session.query(Intersection).first()
+
+        self.assertDictEqual(
+            intersection.to_dict(NameLookup(self._ctx.session),
+                                 geometry=False),
+            intersection.to_dict(self._ctx.session, geometry=False))
+
     def test_intersections_duplicates(self):
         """Por cada par de calle (X, Y) que se crucen, se debería crear la
         intersección (X, Y) o (Y, X), pero no ambas."""
@@ -36,6 +51,100 @@ class TestIntersectionsCreationStep(ETLTestCase):
         self.assertEqual(self._ctx.session.query(Intersection).filter(
             Intersection.id in reversed_ids).count(), 0)
 
+    def test_incremental_intersections(self):
+        """Si se especifican calles modificadas en los datos del reporte, se
+        deberían recalcular solo sus intersecciones, obteniendo el mismo
+        resultado que un recálculo total."""
+        street_id = '7003501000045'
+        self._ctx.session.query(Intersection).\
+            filter_by(calle_a_id=street_id).\
+            delete()
+
+        report_data = self._ctx.report.get_data(STREETS_EXTRACTION_STEP_NAME)
+        report_data['new_entities_ids'] = []
+        report_data['changed_entities_ids'] = [street_id]
+        report_data['deleted_entities_ids'] = []
+
+        step = IntersectionsCreationStep(incremental_threshold=1)
+        step.run(None, self._ctx)
+
+        self.assertEqual(self._ctx.session.query(Intersection).count(),
+                         SAN_JUAN_INTERSECTIONS_COUNT)
+
+    def test_incremental_intersections_after_failure(self):
+        """Si una ejecución incremental falla, la siguiente debería recalcular
+        las intersecciones de las calles pendientes, aunque sus calles no hayan
+        sido modificadas nuevamente."""
+        street_id = '7003501000045'
+        step = IntersectionsCreationStep(incremental_threshold=1)
+        report_data = self._ctx.report.get_data(STREETS_EXTRACTION_STEP_NAME)
+        report_data['new_entities_ids'] = []
+        report_data['changed_entities_ids'] = [street_id]
+        report_data['deleted_entities_ids'] = []
+
+        with mock.patch.object(IntersectionsCreationStep,
+                               '_insert_province_intersections',
+                               side_effect=RuntimeError('failure')):
+            with self.assertRaises(RuntimeError):
+                step.run(None, self._ctx)
+
+        # Simular una falla posterior al commit de la tabla
+        self._ctx.session.commit()
+        self.assertLess(self._ctx.session.query(Intersection).count(),
+                        SAN_JUAN_INTERSECTIONS_COUNT)
+
+        report_data['changed_entities_ids'] = []
+        step.run(None, self._ctx)
+        ClearPendingStreetsStep().run(None, self._ctx)
+
+        self.assertEqual(self._ctx.session.query(Intersection).count(),
+                         SAN_JUAN_INTERSECTIONS_COUNT)
+
+    def _intersections_points(self):
+        return {
+            isct.id: geometry.get_centroid_coordinates(isct.geometria,
+                                                       self._ctx)
+            for isct in self._ctx.session.query(Intersection)
+        }
+
+    def test_shapely_backend(self):
+        """El backend 'shapely' debería generar las mismas intersecciones
+        (IDs y puntos) que el backend 'db'."""
+        self.require_shapely_2()
+        points = self._intersections_points()
+
+        step = IntersectionsCreationStep(backend='shapely')
+        step.run(None, self._ctx)
+
+        shapely_points = self._intersections_points()
+        self.assertSetEqual(set(shapely_points), set(points))
+        for isct_id, (lon, lat) in points.items():
+            self.assertAlmostEqual(shapely_points[isct_id][0], lon, places=7)
+            self.assertAlmostEqual(shapely_points[isct_id][1], lat, places=7)
+
+    def test_shapely_backend_clusters_order(self):
+        """Ambos backends deberían retornar los puntos de intersección de dos
+        calles en el mismo orden (del cual dependen los sufijos de los
+        IDs)."""
+        self.require_shapely_2()
+        street_a = self._ctx.session.query(Street).get('7003501000045')
+        street_b = self._ctx.session.query(Street).get('7003501001120')
+
+        points = [
+            [
+                geometry.get_centroid_coordinates(point, self._ctx)
+                for point in geometry.get_streets_intersections(
+                    street_a.geometria, street_b.geometria, self._ctx,
+                    backend=backend)
+            ]
+            for backend in geometry.INTERSECTIONS_BACKENDS
+        ]
+
+        self.assertEqual(len(points[0]), 2)
+        for (lon_a, lat_a), (lon_b, lat_b) in zip(*points):
+            self.assertAlmostEqual(lon_a, lon_b, places=7)
+            self.assertAlmostEqual(lat_a, lat_b, places=7)
+
     def test_multiple_intersections(self):
         """Algunas intersecciones de calles deberían estar representadas por
         varios puntos, con el ID de cada uno siendo una secuencia 1, 2, etc."""
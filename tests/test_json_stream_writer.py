@@ -1,6 +1,7 @@
+import io
 import json
 from georef_ar_etl.json_stream_writer import JSONStreamWriter, \
-    JSONArrayPlaceholder
+    JSONArrayPlaceholder, JSONEncoder
 from . import ETLTestCase
 
 
@@ -52,6 +53,71 @@ class TestJSONStreamWriter(ETLTestCase):
         }
         self.assert_json_file(data, values, template)
 
+    def test_append_raw(self):
+        """El JSONStreamWriter debería escribir sin modificaciones los valores
+        ya serializados, junto con los demás valores."""
+        filename = 'test.json'
+        with self._ctx.fs.open(filename, 'w') as f:
+            with JSONStreamWriter(f, bufsize=2) as w:
+                w.append({'foo': 1})
+                w.append_raw('{"bar":2}')
+                w.append_raw('[3]')
+
+        with self._ctx.fs.open(filename) as f:
+            self.assertListEqual(json.load(f), [{'foo': 1}, {'bar': 2}, [3]])
+
+    def test_buffer_chars(self):
+        """El JSONStreamWriter debería escribir los elementos en lotes, al
+        alcanzar la cantidad de caracteres máxima del buffer."""
+        writes = []
+
+        class RecordingIO(io.StringIO):
+            def write(self, s):
+                writes.append(s)
+                return super().write(s)
+
+        f = RecordingIO()
+        with JSONStreamWriter(f, bufsize=100, buffer_chars=10) as w:
+            for _ in range(6):
+                w.append_raw('"abcd"')
+
+        self.assertListEqual(writes, ['', '[', '"abcd","abcd"', ',',
+                                      '"abcd","abcd"', ',', '"abcd","abcd"',
+                                      ']', ''])
+        self.assertListEqual(json.loads(f.getvalue()), ['abcd'] * 6)
+
+    def test_encoder_output(self):
+        """El JSONEncoder debería generar el mismo texto que json.dumps(),
+        sin importar el codificador utilizado."""
+        kwargs = {'ensure_ascii': False, 'separators': (',', ':')}
+        encoder = JSONEncoder(**kwargs)
+        values = [
+            {'nombre': 'Córdoba', 'id': '14', 'fuente': 'IGN/"INDEC"\\'},
+            [1e-05, 0.0001, 1e16, 1.5e+300, -0.0, 5.0, 0.1, -64.123456789],
+            {'control': '\x1f\u2028', 'entero': 2 ** 70, 1: None},
+            (True, False, None, 123456789.12345679)
+        ]
+
+        for value in values:
+            self.assertEqual(encoder.dumps(value), json.dumps(value, **kwargs))
+
+    def test_encoder_non_finite(self):
+        """Ambos codificadores (orjson y json) deberían codificar los valores
+        NaN e Infinity de la misma forma que json.dumps()."""
+        values = [
+            {'lat': float('nan'), 'nombre': None},
+            [None, [1.5, float('inf')]],
+            -float('inf')
+        ]
+
+        for separators in [(',', ':'), (',', ': ')]:
+            kwargs = {'ensure_ascii': False, 'separators': separators}
+            encoder = JSONEncoder(**kwargs)
+
+            for value in values:
+                self.assertEqual(encoder.dumps(value),
+                                 json.dumps(value, **kwargs))
+
     def assert_json_file(self, full_data, items, template=None):
         filename = 'test.json'
         with self._ctx.fs.open(filename, 'w') as f:
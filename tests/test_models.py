@@ -1,3 +1,4 @@
+from georef_ar_etl.context import NameLookup
 from georef_ar_etl.models import Province, Department
 from . import ETLTestCase
 from .test_departments_extraction_step import SAN_JUAN_DEPT_COUNT
@@ -32,3 +33,28 @@ class TestModels(ETLTestCase):
         self.create_test_provinces(extract=True)
         self.assertEqual(self._ctx.session.query(Department).count(),
                          SAN_JUAN_DEPT_COUNT)
+
+    def test_to_dict_geometry(self):
+        """El parámetro 'geometry' de to_dict() debería permitir omitir la
+        geometría, o utilizar un GeoJSON ya calculado."""
+        self.create_test_provinces(extract=True)
+        province = self._ctx.session.query(Province).first()
+        geojson = self._ctx.session.scalar(province.geometria.ST_AsGeoJSON())
+
+        self.assertNotIn('geometria',
+                         province.to_dict(self._ctx.session, geometry=False))
+        self.assertDictEqual(
+            province.to_dict(self._ctx.session, geometry=geojson),
+            province.to_dict(self._ctx.session))
+
+    def test_to_dict_name_lookup(self):
+        """Utilizar un NameLookup en lugar de la sesión en to_dict() debería
+        generar el mismo resultado."""
+        self.create_test_provinces(extract=True)
+        self.create_test_departments(extract=True)
+        department = self._ctx.session.query(Department).first()
+
+        self.assertDictEqual(
+            department.to_dict(NameLookup(self._ctx.session),
+                               geometry=False),
+            department.to_dict(self._ctx.session, geometry=False))
@@ -0,0 +1,81 @@
+import os
+import json
+from georef_ar_etl.exceptions import ProcessException
+from georef_ar_etl.publish import PublishStep, MANIFEST_FILENAME
+from georef_ar_etl.utils import CopyFileStep, set_output_count
+from . import ETLTestCase
+
+
+class TestPublishStep(ETLTestCase):
+    _uses_db = False
+
+    def test_publish_versions(self):
+        """El paso debería publicar los archivos en un nuevo directorio
+        versionado con un manifest, actualizar el enlace a la versión actual,
+        y conservar solo las últimas versiones."""
+        self._ctx.fs.makedirs('staging/bulk')
+        self._ctx.fs.writetext('staging/bulk/0000.ndjson', '{}\n')
+        self._ctx.fs.writetext('provincias.json', '{"a":1}')
+        set_output_count('provincias.json', 24, self._ctx)
+        CopyFileStep('staging', 'provincias.json').run('provincias.json',
+                                                       self._ctx)
+        # Simular la publicación en una ejecución posterior del ETL.
+        self._ctx.report.reset()
+
+        step = PublishStep('staging', 'versions', 'publicado',
+                           keep_versions=2)
+        versions = [step.run(None, self._ctx) for _ in range(3)]
+
+        link_path = self._ctx.fs.getsyspath('publicado')
+        with open(os.path.join(link_path, MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+
+        files = {entry['archivo']: entry for entry in manifest['archivos']}
+        current = os.path.realpath(link_path)
+        os.remove(link_path)
+
+        self.assertEqual(current, versions[-1])
+        self.assertListEqual(sorted(files), ['bulk/0000.ndjson',
+                                             'provincias.json'])
+        self.assertEqual(files['provincias.json']['bytes'], 7)
+        self.assertEqual(files['provincias.json']['cantidad'], 24)
+        self.assertFalse(os.path.exists(versions[0]))
+        self.assertEqual(len(self._ctx.fs.listdir('versions')), 2)
+
+    def test_publish_existing_directory(self):
+        """Si la ruta del enlace es un directorio existente, el paso debería
+        moverlo al directorio de versiones y reemplazarlo por el enlace."""
+        self._ctx.fs.makedirs('staging')
+        self._ctx.fs.writetext('staging/provincias.json', '{"a":1}')
+        self._ctx.fs.makedirs('latest')
+        self._ctx.fs.writetext('latest/provincias.json', '{}')
+        self._ctx.fs.makedirs('versions')
+
+        step = PublishStep('staging', 'versions', 'latest')
+        version_path = step.run(None, self._ctx)
+
+        link_path = self._ctx.fs.getsyspath('latest')
+        is_link = os.path.islink(link_path)
+        current = os.path.realpath(link_path)
+        os.remove(link_path)
+
+        versions = self._ctx.fs.listdir('versions')
+        versions.remove(os.path.basename(version_path))
+        self.assertTrue(is_link)
+        self.assertEqual(current, version_path)
+        self.assertEqual(len(versions), 1)
+        self.assertEqual(self._ctx.fs.readtext(
+            'versions/{}/provincias.json'.format(versions[0])), '{}')
+
+    def test_publish_existing_file(self):
+        """El paso debería fallar sin crear una versión si la ruta del enlace
+        es un archivo existente."""
+        self._ctx.fs.makedirs('staging')
+        self._ctx.fs.writetext('latest', '{}')
+        self._ctx.fs.makedirs('versions')
+
+        step = PublishStep('staging', 'versions', 'latest')
+        with self.assertRaises(ProcessException):
+            step.run(None, self._ctx)
+
+        self.assertListEqual(self._ctx.fs.listdir('versions'), [])
@@ -1,5 +1,6 @@
 import random
-from georef_ar_etl import constants
+from georef_ar_etl import constants, utils
+from georef_ar_etl.context import NameLookup
 from georef_ar_etl.models import StreetBlock, Street
 from georef_ar_etl.street_blocks import StreetBlocksExtractionStep
 from . import ETLTestCase
@@ -37,6 +38,17 @@ class TestStreetBlocksExtractionStep(ETLTestCase):
         self.assertEqual(self._ctx.session.query(blocks).count(),
                          SAN_JUAN_BLOCKS_COUNT)
 
+    def test_to_dict_name_lookup(self):
+        """Utilizar un NameLookup en lugar de la sesión en to_dict() debería
+        generar el mismo resultado."""
+        step = StreetBlocksExtractionStep()
+        step.run(self._tmp_blocks, self._ctx)
+        block = self._ctx.session.query(StreetBlock).first()
+
+        self.assertDictEqual(
+            block.to_dict(NameLookup(self._ctx.session), geometry=False),
+            block.to_dict(self._ctx.session, geometry=False))
+
     def test_id(self):
         """El ID de cada cuadra debería ser igual a el ID de su calle, más los
         últimos 5 dígitos de su ogc_fid."""
@@ -52,3 +64,43 @@ class TestStreetBlocksExtractionStep(ETLTestCase):
         blocks = step.run(self._tmp_blocks, self._ctx)
 
         self.assertTrue(bool(self._ctx.session.query(blocks).get(block_id)))
+
+    def test_db_backend(self):
+        """El backend 'db' debería generar las mismas cuadras que el backend
+        'orm'."""
+        step = StreetBlocksExtractionStep()
+        step.run(self._tmp_blocks, self._ctx)
+        orm_blocks = {
+            block.id: (block.calle_id, block.inicio_derecha,
+                       block.fin_derecha, block.inicio_izquierda,
+                       block.fin_izquierda)
+            for block in self._ctx.session.query(StreetBlock)
+        }
+
+        step = StreetBlocksExtractionStep(backend='db')
+        step.run(self._tmp_blocks, self._ctx)
+        db_blocks = {
+            block.id: (block.calle_id, block.inicio_derecha,
+                       block.fin_derecha, block.inicio_izquierda,
+                       block.fin_izquierda)
+            for block in self._ctx.session.query(StreetBlock)
+        }
+
+        self.assertEqual(len(db_blocks), SAN_JUAN_BLOCKS_COUNT)
+        self.assertDictEqual(orm_blocks, db_blocks)
+
+    def test_bulk_writer_methods(self):
+        """Todos los métodos de inserción de utils.BulkWriter deberían generar
+        la misma cantidad de cuadras."""
+        default_method = self._ctx.config.get('etl', 'bulk_writer_method')
+
+        try:
+            for method in utils.BULK_WRITER_METHODS:
+                self._ctx.config.set('etl', 'bulk_writer_method', method)
+                step = StreetBlocksExtractionStep()
+                blocks = step.run(self._tmp_blocks, self._ctx)
+
+                self.assertEqual(self._ctx.session.query(blocks).count(),
+                                 SAN_JUAN_BLOCKS_COUNT)
+        finally:
+            self._ctx.config.set('etl', 'bulk_writer_method', default_method)
@@ -40,6 +40,17 @@ class TestStreetsExtractionStep(ETLTestCase):
         report_data = self._ctx.report.get_data('streets_extraction')
         self.assertListEqual(report_data['errors'], [])
 
+    def test_parallel_collect(self):
+        """Agrupar cuadras en paralelo, utilizando ST_Collect, debería generar
+        la misma cantidad de calles que el método por defecto."""
+        step = StreetsExtractionStep(workers=4, union_method='collect')
+        streets = step.run((self._tmp_blocks, None), self._ctx)
+
+        self.assertEqual(self._ctx.session.query(streets).count(),
+                         SAN_JUAN_STREETS_COUNT)
+        self.assertFalse(self._ctx.engine.has_table(
+            constants.STREET_BLOCKS_GROUPED_TMP_TABLE))
+
     def test_clean_string(self):
         """Los campos de texto deberían ser normalizados en el proceso de
         normalización."""
@@ -0,0 +1,36 @@
+import json
+import sqlite3
+from georef_ar_etl.tiles import VectorTilesCreationStep, MIN_POSTGIS_VERSION
+from . import ETLTestCase
+
+
+class TestVectorTilesCreationStep(ETLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.require_postgis(MIN_POSTGIS_VERSION)
+        self.create_test_provinces(extract=True)
+        self.create_test_departments(extract=True)
+
+    def test_create_vector_tiles(self):
+        """El paso debería crear un archivo MBTiles con teselas de cada nivel
+        de zoom configurado, y los metadatos de sus capas."""
+        filename = 'teselas.mbtiles'
+        step = VectorTilesCreationStep([('provincias', 0, 3),
+                                        ('departamentos', 2, 4)], filename,
+                                       workers=2, block_size=4)
+        step.run(None, self._ctx)
+
+        connection = sqlite3.connect(self._ctx.fs.getsyspath(filename))
+        zooms = [
+            row[0] for row in connection.execute(
+                'SELECT DISTINCT zoom_level FROM tiles ORDER BY zoom_level')
+        ]
+        metadata = dict(connection.execute('SELECT * FROM metadata'))
+        connection.close()
+
+        layers = json.loads(metadata['json'])['vector_layers']
+
+        self.assertListEqual(zooms, [0, 1, 2, 3, 4])
+        self.assertEqual(metadata['format'], 'pbf')
+        self.assertListEqual([layer['id'] for layer in layers],
+                             ['provincias', 'departamentos'])